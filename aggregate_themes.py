@@ -9,12 +9,55 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 from app import build_theme_map, DATA_PATH_DEFAULT
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from mf_processor import find_latest_pivot_file
+from pivot_store import load_pivot_summary
+from snapshot_cache import read_sheet
+from spans import profiled, timed
 
+OUTPUT_DIR = Path("/Users/raviaranke/Desktop/themes")
 
-def tv_to_bb(tv):
+
+# Band edges for tv -> bb bucketing. Bands are left-closed ([edge, next_edge)),
+# except that exact zero is its own band and (0, first positive edge) is +1.
+BB_BAND_EDGES = (-1000, -100, -50, -10, 0, 10, 50, 100, 1000)
+
+
+def tv_to_bb_array(tv, edges=BB_BAND_EDGES):
+    """
+    Vectorized tv -> bb bucketing over a scalar, array, Series or whole DataFrame block
+
+    With the default edges this is the -5..5 scale documented in tv_to_bb.
+    Alternative edges must be strictly increasing and include 0; with k negative
+    edges the scale runs from -(k+1) to +(number of positive edges + 1).
+    NaN stays NaN; the result is float so it can carry NaN.
+    """
+    edges = np.asarray(edges, dtype="float64")
+    if np.any(np.diff(edges) <= 0) or not np.any(edges == 0):
+        raise ValueError(f"bb band edges must be strictly increasing and include 0: {edges.tolist()}")
+
+    if isinstance(tv, (pd.DataFrame, pd.Series)):
+        values = tv.to_numpy(dtype="float64", na_value=np.nan)
+    else:
+        values = np.asarray(tv, dtype="float64")
+
+    n_neg = int(np.sum(edges < 0))
+    idx = np.searchsorted(edges, values, side="right")
+    bb = np.where(values < 0, idx - (n_neg + 1), idx - n_neg).astype("float64")
+    bb[values == 0] = 0
+    bb[np.isnan(values)] = np.nan
+
+    if isinstance(tv, pd.DataFrame):
+        return pd.DataFrame(bb, index=tv.index, columns=tv.columns)
+    if isinstance(tv, pd.Series):
+        return pd.Series(bb, index=tv.index, name=tv.name)
+    return bb
+
+
+def tv_to_bb(tv, edges=BB_BAND_EDGES):
     """
     Convert total value (tv) to bucket band (bb)
 
@@ -33,228 +76,163 @@ def tv_to_bb(tv):
     """
     if pd.isna(tv):
         return np.nan
+    return int(tv_to_bb_array(float(tv), edges))
 
-    if tv >= 1000:
-        return 5
-    elif tv >= 100:
-        return 4
-    elif tv >= 50:
-        return 3
-    elif tv >= 10:
-        return 2
-    elif tv > 0:
-        return 1
-    elif tv == 0:
-        return 0
-    elif tv >= -10:
-        return -1
-    elif tv >= -50:
-        return -2
-    elif tv >= -100:
-        return -3
-    elif tv >= -1000:
-        return -4
-    else:
-        return -5
-
-
-def format_aggregated_sheet(ws, df, portfolio_themes):
-    """Apply formatting to Aggregated sheet with alternating colors per theme"""
-
-    # Define styles
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=11)
 
-    # Alternating theme colors
-    theme_fill_1 = PatternFill(start_color="E7F3FF", end_color="E7F3FF", fill_type="solid")  # Light blue
-    theme_fill_2 = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")  # White
+THIN_BORDER = Border(
+    left=Side(style='thin', color='D0D0D0'),
+    right=Side(style='thin', color='D0D0D0'),
+    top=Side(style='thin', color='D0D0D0'),
+    bottom=Side(style='thin', color='D0D0D0')
+)
 
-    # Portfolio theme highlight (light yellow)
-    portfolio_fill_1 = PatternFill(start_color="FFF3CD", end_color="FFF3CD", fill_type="solid")
-    portfolio_fill_2 = PatternFill(start_color="FFFAEB", end_color="FFFAEB", fill_type="solid")
+# Row fills shared by both sheets
+PORTFOLIO_FILL_1 = "FFF3CD"  # Light yellow
+PORTFOLIO_FILL_2 = "FFFAEB"
+WHITE_FILL = "FFFFFF"
 
-    # TOTAL row highlight
-    total_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    total_font = Font(bold=True, size=11)
 
-    # Borders
-    thin_border = Border(
-        left=Side(style='thin', color='D0D0D0'),
-        right=Side(style='thin', color='D0D0D0'),
-        top=Side(style='thin', color='D0D0D0'),
-        bottom=Side(style='thin', color='D0D0D0')
-    )
+def _named_style(name, fill_color, font, horizontal):
+    """One shared workbook style: fill + font + thin border + alignment"""
+    style = NamedStyle(name=name)
+    style.fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
+    style.font = font
+    style.border = THIN_BORDER
+    style.alignment = Alignment(horizontal=horizontal, vertical='center')
+    return style
 
-    # Format header row
-    for col_num, column_title in enumerate(df.columns, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = thin_border
-
-    # Track current theme for alternating colors
-    current_theme = None
-    theme_color_index = 0
-
-    # Format data rows
-    for row_num, row_data in enumerate(df.itertuples(index=False), 2):
-        theme = row_data[0]  # Theme column
-        fund_family = row_data[1]  # FundFamily column
-
-        # Change color when theme changes
-        if theme != current_theme:
-            current_theme = theme
-            theme_color_index = 1 - theme_color_index  # Toggle between 0 and 1
-
-        # Determine fill color
-        is_total_row = fund_family == "TOTAL"
-        is_portfolio_theme = theme in portfolio_themes
-
-        if is_total_row:
-            fill = total_fill
-            font = total_font
-        elif is_portfolio_theme:
-            fill = portfolio_fill_1 if theme_color_index == 0 else portfolio_fill_2
-            font = Font(size=10)
-        else:
-            fill = theme_fill_1 if theme_color_index == 0 else theme_fill_2
-            font = Font(size=10)
-
-        # Apply formatting to all cells in the row
-        for col_num in range(1, len(df.columns) + 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.fill = fill
-            cell.font = font
-            cell.border = thin_border
-
-            # Align numbers to the right
-            if col_num > 2:  # Skip Theme and FundFamily columns
-                cell.alignment = Alignment(horizontal='right', vertical='center')
-            else:
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-
-    # Set column widths
-    ws.column_dimensions['A'].width = 18  # Theme
-    ws.column_dimensions['B'].width = 15  # FundFamily
-
-    # Set widths for tv_ and bb_ columns differently
-    # Columns 3 onwards: tv_MonYY, tv_MonYY, ..., bb_MonYY, bb_MonYY, ...
-    num_tv_cols = (len(df.columns) - 2) // 2  # Number of tv_ columns
-
-    for col_num in range(3, len(df.columns) + 1):
-        col_letter = get_column_letter(col_num)
-        if col_num <= 2 + num_tv_cols:
-            # tv_ columns - standard width
-            ws.column_dimensions[col_letter].width = 12
-        else:
-            # bb_ columns - narrower width for visual separation
-            ws.column_dimensions[col_letter].width = 6
 
-    # Freeze header row and first two columns
-    ws.freeze_panes = 'C2'
+def _row_styles(wb, prefix, fills, font):
+    """
+    Register a left (text) and right (numeric) aligned style per row kind
+    Returns: {kind: (left_style_name, right_style_name)}
+    """
+    names = {}
+    for kind, fill_color in fills.items():
+        kind_font = font[kind] if isinstance(font, dict) else font
+        pair = []
+        for horizontal in ('left', 'right'):
+            name = f"{prefix} {kind} {horizontal}"
+            wb.add_named_style(_named_style(name, fill_color, kind_font, horizontal))
+            pair.append(name)
+        names[kind] = tuple(pair)
+    return names
 
 
-def format_debug_sheet(ws, df):
-    """Apply formatting to Debug sheet with alternating colors per symbol"""
+def _alternating_index(keys: pd.Series) -> np.ndarray:
+    """1 for the first group of equal consecutive keys, then 0, 1, 0, ... per change"""
+    changed = keys.ne(keys.shift()).to_numpy()
+    return changed.cumsum() % 2
 
-    # Define styles
-    header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=11)
 
-    # Alternating symbol colors
-    symbol_fill_1 = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")  # Light green
-    symbol_fill_2 = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")  # White
+def _write_styled_sheet(wb, title, df, header_style, row_kinds, row_styles, n_text_cols, widths, freeze):
+    """
+    Stream df into a write-only sheet
 
-    # Portfolio symbol highlight
-    portfolio_fill_1 = PatternFill(start_color="FFF3CD", end_color="FFF3CD", fill_type="solid")
-    portfolio_fill_2 = PatternFill(start_color="FFFAEB", end_color="FFFAEB", fill_type="solid")
+    Every cell points at one of a handful of named styles, so styling allocates
+    nothing per cell and rows are flushed to disk as they are appended.
+    """
+    ws = wb.create_sheet(title)
+    for col_num, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
+    ws.freeze_panes = freeze
+
+    header = []
+    for column_title in df.columns:
+        cell = WriteOnlyCell(ws, value=column_title)
+        cell.style = header_style
+        header.append(cell)
+    ws.append(header)
+
+    # Missing values (pd.NA) become empty cells, as with DataFrame.to_excel
+    values = df.astype(object).where(df.notna(), None)
+    for kind, row_data in zip(row_kinds, values.itertuples(index=False)):
+        left, right = row_styles[kind]
+        row = []
+        for col_num, value in enumerate(row_data):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = left if col_num < n_text_cols else right
+            row.append(cell)
+        ws.append(row)
+
+
+def _column_widths(text_widths, n_cols):
+    """Text columns, then tv_ columns (12) and the narrower bb_ columns (6)"""
+    num_tv_cols = (n_cols - len(text_widths)) // 2
+    num_bb_cols = n_cols - len(text_widths) - num_tv_cols
+    return list(text_widths) + [12] * num_tv_cols + [6] * num_bb_cols
+
+
+@timed
+def write_aggregated_workbook(output_file, result_df, debug_df, portfolio_themes):
+    """
+    Write the Aggregated and Debug tabs with their formatting in one streaming pass
 
-    # Borders
-    thin_border = Border(
-        left=Side(style='thin', color='D0D0D0'),
-        right=Side(style='thin', color='D0D0D0'),
-        top=Side(style='thin', color='D0D0D0'),
-        bottom=Side(style='thin', color='D0D0D0')
+    Aggregated: alternating colors per theme, portfolio themes in yellow, TOTAL rows bold
+    Debug: alternating colors per symbol, portfolio symbols in yellow
+    """
+    wb = Workbook(write_only=True)
+
+    # Aggregated sheet
+    header = _named_style("Aggregated Header", "4472C4", Font(bold=True, color="FFFFFF", size=11), 'center')
+    wb.add_named_style(header)
+    agg_styles = _row_styles(
+        wb, "Aggregated",
+        {'theme_1': "E7F3FF", 'theme_2': WHITE_FILL,  # Light blue / white
+         'portfolio_1': PORTFOLIO_FILL_1, 'portfolio_2': PORTFOLIO_FILL_2,
+         'total': "D9E1F2"},
+        {'theme_1': Font(size=10), 'theme_2': Font(size=10),
+         'portfolio_1': Font(size=10), 'portfolio_2': Font(size=10),
+         'total': Font(bold=True, size=11)},
+    )
+    # Change color when theme changes
+    color = np.where(_alternating_index(result_df['Theme']) == 0, '_1', '_2')
+    group = np.where(result_df['Theme'].isin(portfolio_themes), 'portfolio', 'theme')
+    agg_kinds = np.where(result_df['FundFamily'].eq('TOTAL'), 'total', np.char.add(group, color))
+    _write_styled_sheet(
+        wb, "Aggregated", result_df, header.name, agg_kinds, agg_styles,
+        n_text_cols=2,
+        widths=_column_widths([18, 15], len(result_df.columns)),  # Theme, FundFamily
+        freeze='C2',  # Freeze header row and first two columns
     )
 
-    # Format header row
-    for col_num, column_title in enumerate(df.columns, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = thin_border
-
-    # Track current symbol for alternating colors
-    current_symbol = None
-    symbol_color_index = 0
-
-    # Format data rows
-    for row_num, row_data in enumerate(df.itertuples(index=False), 2):
-        symbol = row_data[1]  # Symbol column
-        is_portfolio = row_data[3]  # IsPortfolio column
-
-        # Change color when symbol changes
-        if symbol != current_symbol:
-            current_symbol = symbol
-            symbol_color_index = 1 - symbol_color_index  # Toggle between 0 and 1
-
-        # Determine fill color
-        if is_portfolio:
-            fill = portfolio_fill_1 if symbol_color_index == 0 else portfolio_fill_2
-        else:
-            fill = symbol_fill_1 if symbol_color_index == 0 else symbol_fill_2
-
-        # Apply formatting to all cells in the row
-        for col_num in range(1, len(df.columns) + 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.fill = fill
-            cell.font = Font(size=10)
-            cell.border = thin_border
-
-            # Align numbers to the right, text to the left
-            if col_num > 4:  # Numeric columns
-                cell.alignment = Alignment(horizontal='right', vertical='center')
-            else:
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-
-    # Set column widths
-    ws.column_dimensions['A'].width = 18  # Theme
-    ws.column_dimensions['B'].width = 15  # Symbol
-    ws.column_dimensions['C'].width = 15  # FundFamily
-    ws.column_dimensions['D'].width = 12  # IsPortfolio
-
-    # Set widths for tv_ and bb_ columns differently
-    # Columns 5 onwards: tv_MonYY, ..., bb_MonYY, ...
-    num_tv_cols = (len(df.columns) - 4) // 2  # Number of tv_ columns
-
-    for col_num in range(5, len(df.columns) + 1):
-        col_letter = get_column_letter(col_num)
-        if col_num <= 4 + num_tv_cols:
-            # tv_ columns - standard width
-            ws.column_dimensions[col_letter].width = 12
-        else:
-            # bb_ columns - narrower width for visual separation
-            ws.column_dimensions[col_letter].width = 6
+    # Debug sheet
+    header = _named_style("Debug Header", "70AD47", Font(bold=True, color="FFFFFF", size=11), 'center')
+    wb.add_named_style(header)
+    debug_styles = _row_styles(
+        wb, "Debug",
+        {'symbol_1': "E2EFDA", 'symbol_2': WHITE_FILL,  # Light green / white
+         'portfolio_1': PORTFOLIO_FILL_1, 'portfolio_2': PORTFOLIO_FILL_2},
+        Font(size=10),
+    )
+    # Change color when symbol changes
+    color = np.where(_alternating_index(debug_df['Symbol']) == 0, '_1', '_2')
+    group = np.where(debug_df['IsPortfolio'].astype(bool), 'portfolio', 'symbol')
+    _write_styled_sheet(
+        wb, "Debug", debug_df, header.name, np.char.add(group, color), debug_styles,
+        n_text_cols=4,
+        widths=_column_widths([18, 15, 15, 12], len(debug_df.columns)),  # Theme, Symbol, FundFamily, IsPortfolio
+        freeze='E2',  # Freeze header row and first four columns
+    )
 
-    # Freeze header row and first four columns
-    ws.freeze_panes = 'E2'
+    wb.save(output_file)
 
 
-def aggregate_by_theme_and_fund():
+@timed
+def aggregate_by_theme_and_fund(bb_edges=BB_BAND_EDGES):
     """
     Aggregate MF data by Theme + FundFamily
+    bb_edges: band edges used when bucketing tv_ into bb_ (see tv_to_bb_array)
     Returns: (aggregated_df, debug_df)
     """
 
     # Load theme mapping
     print("Loading theme map...")
-    th = pd.read_excel(DATA_PATH_DEFAULT, sheet_name="theme_park")
+    th = read_sheet(DATA_PATH_DEFAULT, "theme_park")
     theme_map = build_theme_map(th)
 
     # Load portfolio symbols to identify portfolio themes
-    pf = pd.read_excel(DATA_PATH_DEFAULT, sheet_name="PF_Ranks")
+    pf = read_sheet(DATA_PATH_DEFAULT, "PF_Ranks")
     pf = pf.rename(columns={"Symbol / Rank": "Symbol"})
     pf["Symbol"] = pf["Symbol"].astype(str).str.strip()
     portfolio_symbols = set(pf["Symbol"].dropna())
@@ -266,7 +244,7 @@ def aggregate_by_theme_and_fund():
     print("Loading MF data...")
     mf_file, mf_date_label = find_latest_pivot_file()
     print(f"Using pivot file: {mf_file.name} ({mf_date_label})")
-    mf_df = pd.read_excel(mf_file, sheet_name="Summary Data")
+    mf_df = load_pivot_summary(mf_file)
 
     # Merge with theme map
     print("Merging with theme map...")
@@ -295,14 +273,16 @@ def aggregate_by_theme_and_fund():
     # Calculate bb_ columns for debug tab (per-symbol, from original MF data)
     # BB values are per-symbol (same across all fund families), so we get them from the input
     print("Adding bb_ columns from source data (per-symbol)...")
+    missing_bb = [tv_col for tv_col in tv_cols if tv_col.replace('tv_', 'bb_') not in mf_with_theme.columns]
+    # Fallback if bb_ columns don't exist: bucket every missing month in one shot
+    fallback_bb = tv_to_bb_array(debug_df[missing_bb], bb_edges) if missing_bb else None
     for tv_col in tv_cols:
         bb_col = tv_col.replace('tv_', 'bb_')
         # Get bb_ directly from the original MF data (already calculated per-symbol)
         if bb_col in mf_with_theme.columns:
             debug_df[bb_col] = mf_with_theme[bb_col].astype('Int64')
         else:
-            # Fallback if bb_ column doesn't exist
-            debug_df[bb_col] = debug_df[tv_col].apply(tv_to_bb).astype('Int64')
+            debug_df[bb_col] = fallback_bb[tv_col].astype('Int64')
 
     # Sort debug df: Portfolio themes first, then by Theme, Symbol, FundFamily
     debug_df = debug_df.sort_values(
@@ -319,7 +299,7 @@ def aggregate_by_theme_and_fund():
     print("Aggregating by Theme + FundFamily...")
     agg_dict = {col: 'sum' for col in tv_cols}
 
-    theme_fund_agg = mf_with_theme.groupby(['Theme', 'FundFamily'], as_index=False).agg(agg_dict)
+    theme_fund_agg = mf_with_theme.groupby(['Theme', 'FundFamily'], as_index=False, observed=True).agg(agg_dict)
 
     # Sort: Portfolio themes first, then others (alphabetically within each group)
     print("Sorting themes (portfolio first)...")
@@ -332,82 +312,69 @@ def aggregate_by_theme_and_fund():
     # Add Total rows for each theme and sort fund families by latest TV
     print("Adding Total rows for each theme...")
     print("Sorting fund families by latest TV (highest first)...")
-    result_rows = []
 
     # Get the latest tv_ column (last one chronologically)
     latest_tv_col = tv_cols[-1]  # e.g., tv_Jan26
 
-    for theme in theme_fund_agg['Theme'].unique():
-        theme_data = theme_fund_agg[theme_fund_agg['Theme'] == theme]
-
-        # Sort fund families by latest TV value (descending - highest first)
-        theme_data_sorted = theme_data.sort_values(by=latest_tv_col, ascending=False)
-
-        # Add all fund family rows for this theme
-        for _, row in theme_data_sorted.iterrows():
-            result_rows.append(row.to_dict())
-
-        # Add Total row at the end
-        total_row = {'Theme': theme, 'FundFamily': 'TOTAL', 'IsPortfolio': theme in portfolio_themes}
-        for col in tv_cols:
-            total_row[col] = theme_data[col].sum()
-        result_rows.append(total_row)
-
-    # Create final dataframe
-    result_df = pd.DataFrame(result_rows)
-
-    # Drop IsPortfolio helper column
-    result_df = result_df.drop(columns=['IsPortfolio'])
+    theme_fund_agg['FundFamily'] = theme_fund_agg['FundFamily'].astype(object)
+    theme_fund_agg['_IsTotal'] = False
+
+    # One TOTAL row per theme: each column summed with np.sum over the theme's
+    # fund family rows in the order above, as Series.sum() did per theme, so
+    # totals that land on .5 round exactly as before (groupby().sum() adds in
+    # a different order and can tip them the other way)
+    themes_sorted = theme_fund_agg['Theme'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, themes_sorted[1:] != themes_sorted[:-1]])
+    ends = np.r_[starts[1:], len(themes_sorted)]
+    tv_by_col = theme_fund_agg[tv_cols].to_numpy(dtype='float64').T.copy()
+    total_rows = pd.DataFrame(
+        [[col[a:b].sum() for col in tv_by_col] for a, b in zip(starts, ends)],
+        columns=tv_cols,
+    )
+    total_rows.insert(0, 'Theme', theme_fund_agg['Theme'].iloc[starts].to_numpy())
+    total_rows['FundFamily'] = 'TOTAL'
+    total_rows['IsPortfolio'] = total_rows['Theme'].isin(portfolio_themes)
+    total_rows['_IsTotal'] = True
+
+    # Same theme order as before (portfolio first, then alphabetical); within a theme,
+    # fund families by latest TV (highest first) with TOTAL last. The sort is stable,
+    # so fund families tied on latest TV stay alphabetical.
+    result_df = pd.concat([theme_fund_agg, total_rows], ignore_index=True)
+    result_df = result_df.sort_values(
+        by=['IsPortfolio', 'Theme', '_IsTotal', latest_tv_col],
+        ascending=[False, True, True, False],
+        kind='stable'
+    ).reset_index(drop=True)
+
+    # Drop helper columns
+    result_df = result_df.drop(columns=['IsPortfolio', '_IsTotal'])
 
     # Round tv_ columns to integers
     print("Rounding tv_ values to integers...")
-    for tv_col in tv_cols:
-        result_df[tv_col] = result_df[tv_col].round(0).astype('Int64')
+    result_df[tv_cols] = result_df[tv_cols].round(0).astype('Int64')
 
     # Calculate bb_ columns from TOTAL tv_ values (theme-level)
     print("Calculating bb_ (bucket bands) from TOTAL tv_ values per theme...")
 
-    # First, get TOTAL rows only to calculate bb_ values
-    total_rows = result_df[result_df['FundFamily'] == 'TOTAL'].copy()
-
-    # Calculate bb_ for each theme based on TOTAL tv_
-    theme_bb_map = {}
-    for _, row in total_rows.iterrows():
-        theme = row['Theme']
-        theme_bb_map[theme] = {}
-        for tv_col in tv_cols:
-            bb_col = tv_col.replace('tv_', 'bb_')
-            theme_bb_map[theme][bb_col] = tv_to_bb(row[tv_col])
+    # bb_ for each theme based on its rounded TOTAL tv_ (all months at once)
+    total_tv = total_rows.set_index('Theme')[tv_cols].round(0)
+    bb_cols = [tv_col.replace('tv_', 'bb_') for tv_col in tv_cols]
+    theme_bb = tv_to_bb_array(total_tv, bb_edges).astype('Int64')
+    theme_bb.columns = bb_cols
 
     # Apply bb_ values to all rows of each theme
-    bb_cols = []
-    for tv_col in tv_cols:
-        bb_col = tv_col.replace('tv_', 'bb_')
-        result_df[bb_col] = result_df.apply(
-            lambda row: theme_bb_map[row['Theme']][bb_col], axis=1
-        )
-        result_df[bb_col] = result_df[bb_col].astype('Int64')
-        bb_cols.append(bb_col)
+    result_df = result_df.merge(theme_bb, left_on='Theme', right_index=True, how='left')
 
     # Reorder columns: Theme, FundFamily, all tv_ columns, then all bb_ columns
     cols = ['Theme', 'FundFamily'] + tv_cols + bb_cols
     result_df = result_df[cols]
 
     # Save to Excel with 2 tabs
-    output_file = Path(f"/Users/raviaranke/Desktop/themes/{mf_date_label}_theme_aggregated.xlsx")
+    output_file = OUTPUT_DIR / f"{mf_date_label}_theme_aggregated.xlsx"
     print(f"\nSaving to {output_file}...")
 
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # Tab 1: Aggregated output
-        result_df.to_excel(writer, sheet_name="Aggregated", index=False)
-
-        # Tab 2: Debug/Audit trail
-        debug_df.to_excel(writer, sheet_name="Debug", index=False)
-
-        # Apply formatting
-        print("Applying Excel formatting...")
-        format_aggregated_sheet(writer.sheets["Aggregated"], result_df, portfolio_themes)
-        format_debug_sheet(writer.sheets["Debug"], debug_df)
+    # Tab 1: Aggregated output, Tab 2: Debug/Audit trail (formatted as they are written)
+    write_aggregated_workbook(output_file, result_df, debug_df, portfolio_themes)
 
     print(f"✅ Done! Created {output_file}")
     print(f"\n📊 Tab 1 (Aggregated):")
@@ -428,7 +395,8 @@ def aggregate_by_theme_and_fund():
 
 
 if __name__ == "__main__":
-    agg_df, debug_df = aggregate_by_theme_and_fund()
+    with profiled("aggregate_themes"):
+        agg_df, debug_df = aggregate_by_theme_and_fund()
 
     # Show sample from aggregated tab
     print("\n" + "="*80)
@@ -1,10 +1,15 @@
 import datetime as dt
+import os
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
 from mf_processor import (
+    find_latest_pivot_file,
     load_mf_data,
     get_latest_prev_bb_cols,
     build_mf_theme_table,
@@ -16,10 +21,22 @@ from combined_processor import (
     render_combined_table,
 )
 
+from fragment_cache import cached_fragment, fingerprint
+from snapshot_cache import file_hash, read_sheet
+from spans import timed
+from theme_index import build_theme_index, themes_with_symbols
+
 DATA_PATH_DEFAULT = Path("/Users/raviaranke/Downloads/PF_Ranks.xlsx")
 if not DATA_PATH_DEFAULT.exists():
     DATA_PATH_DEFAULT = Path("/Users/raviaranke/Desktop/themes/PF_Ranks.xlsx")
 
+# Sources the Ranks rows and body are built from (sheet parsing, theme
+# normalization, theme lookups), part of their fragment cache keys
+RANKS_SOURCES = tuple(Path(__file__).with_name(name) for name in ("app.py", "theme_index.py", "snapshot_cache.py"))
+
+# Build only the visible tab on each rerun (THEMES_LAZY_TABS=0 restores st.tabs)
+LAZY_TABS = os.getenv("THEMES_LAZY_TABS", "1") != "0"
+
 
 def normalize_theme_name(value) -> str:
     s = str(value).strip()
@@ -41,6 +58,27 @@ def normalize_theme_name(value) -> str:
     return " ".join(norm_token(p) for p in parts)
 
 
+# Distinct theme labels number in the hundreds; bound the memo anyway since
+# custom workbooks can carry arbitrary text in the Theme column
+THEME_NAME_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=THEME_NAME_CACHE_SIZE)
+def _normalize_theme_cached(value: str) -> str:
+    return normalize_theme_name(value)
+
+
+def normalize_theme_series(values: pd.Series) -> pd.Series:
+    """
+    Normalize a theme column by its distinct values (factorize -> normalize uniques -> take)
+    Missing values stay missing, matching .apply(normalize_theme_name if notna).
+    """
+    codes, uniques = pd.factorize(values)
+    normalized = np.array([_normalize_theme_cached(str(u)) for u in uniques] + [np.nan], dtype=object)
+    # factorize marks missing values with -1, which picks the trailing NaN
+    return pd.Series(normalized[codes], index=values.index, name=values.name)
+
+
 def _date_cols(df: pd.DataFrame) -> list:
     return [
         c
@@ -49,45 +87,48 @@ def _date_cols(df: pd.DataFrame) -> list:
     ]
 
 
+# workbook_hash only keys the cache, so an edited workbook is re-read
 @st.cache_data
-def load_data(path: str):
-    pf = pd.read_excel(path, sheet_name="PF_Ranks")
-    th = pd.read_excel(path, sheet_name="theme_park")
+def load_data(path: str, workbook_hash: str = None):
+    pf = read_sheet(path, "PF_Ranks")
+    th = read_sheet(path, "theme_park")
     return pf, th
 
 
 @st.cache_data
-def load_data_codex(path: str):
-    pf = pd.read_excel(path, sheet_name="PF_Ranks")
-    th_codex = pd.read_excel(path, sheet_name="tpark_codex")
+def load_data_codex(path: str, workbook_hash: str = None):
+    pf = read_sheet(path, "PF_Ranks")
+    th_codex = read_sheet(path, "tpark_codex")
     return pf, th_codex
 
 
+@timed
 def build_theme_map(th: pd.DataFrame) -> pd.DataFrame:
     th = th.rename(columns={"Symbol / Rank": "Symbol"})
-    th["Symbol"] = th["Symbol"].astype(str).str.strip()
+    sym = th["Symbol"].astype(str).str.strip()
+    theme_cell = th["Theme"]
 
-    current_theme = None
-    rows = []
-    for _, row in th.iterrows():
-        sym = str(row["Symbol"]).strip() if pd.notna(row["Symbol"]) else None
-        theme_cell = row["Theme"]
-        if pd.isna(theme_cell) and sym:
-            current_theme = normalize_theme_name(sym)
-            continue
-        if pd.notna(theme_cell):
-            current_theme = normalize_theme_name(str(theme_cell).strip())
-        if sym and current_theme and sym.lower() != "nan":
-            rows.append((sym.upper(), current_theme))
-    return pd.DataFrame(rows, columns=["Symbol", "Theme"])
+    # Rows with an empty Theme cell are theme headers (the theme name sits in the
+    # Symbol column); member rows carry their own Theme label, so only they emit.
+    member = theme_cell.notna() & sym.notna() & (sym != "") & (sym.str.lower() != "nan")
+    sym = sym[member]
+    labels = theme_cell[member].astype(str).str.strip()
 
+    themes = normalize_theme_series(labels)
 
+    keep = themes != ""
+    return pd.DataFrame(
+        {"Symbol": sym[keep].str.upper(), "Theme": themes[keep]}
+    ).reset_index(drop=True)
+
+
+@timed
 def build_theme_map_codex(th_codex: pd.DataFrame) -> pd.DataFrame:
     """Build theme map from tpark_codex format (Symbol, Theme columns directly)"""
     df = th_codex[["Symbol", "Theme"]].copy()
     df = df[df["Symbol"].notna() & df["Theme"].notna()]
     df["Symbol"] = df["Symbol"].astype(str).str.strip().str.upper()
-    df["Theme"] = df["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
+    df["Theme"] = normalize_theme_series(df["Theme"])
     return df
 
 
@@ -100,10 +141,11 @@ def get_latest_prev_dates(pf: pd.DataFrame, th: pd.DataFrame):
     return latest, prev
 
 
+@timed
 def theme_medians(th: pd.DataFrame, date_col) -> pd.Series:
     th = th.rename(columns={"Symbol / Rank": "Symbol"})
     th = th[["Symbol", "Theme", date_col]].copy()
-    th["Theme"] = th["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
+    th["Theme"] = normalize_theme_series(th["Theme"])
     th = th[th["Theme"].notna()].rename(columns={date_col: "Rank"})
     th["Rank"] = pd.to_numeric(th["Rank"], errors="coerce")
     return th.groupby("Theme", dropna=True)["Rank"].median()
@@ -112,7 +154,7 @@ def theme_medians(th: pd.DataFrame, date_col) -> pd.Series:
 def theme_counts(th: pd.DataFrame, date_col) -> pd.Series:
     th = th.rename(columns={"Symbol / Rank": "Symbol"})
     th = th[["Symbol", "Theme", date_col]].copy()
-    th["Theme"] = th["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
+    th["Theme"] = normalize_theme_series(th["Theme"])
     th = th[th["Theme"].notna()].rename(columns={date_col: "Rank"})
     th["Rank"] = pd.to_numeric(th["Rank"], errors="coerce")
     return th.dropna(subset=["Rank"])["Theme"].value_counts()
@@ -122,7 +164,7 @@ def portfolio_themes(pf: pd.DataFrame, theme_map: pd.DataFrame):
     pf = pf.rename(columns={"Symbol / Rank": "Symbol"})
     pf["Symbol"] = pf["Symbol"].astype(str).str.strip()
     symbols = set(pf["Symbol"].dropna())
-    return sorted(theme_map[theme_map["Symbol"].isin(symbols)]["Theme"].unique())
+    return themes_with_symbols(build_theme_index(theme_map), symbols)
 
 
 def _rank_delta_text(prev_val, latest_val):
@@ -134,6 +176,18 @@ def _rank_delta_text(prev_val, latest_val):
     return f"{arrow}{abs(delta):.0f}"
 
 
+def _theme_ranks(th: pd.DataFrame, date_col) -> pd.DataFrame:
+    """Symbol / Theme / Rank frame for one date column (rows without a theme dropped)"""
+    ranks = th.rename(columns={"Symbol / Rank": "Symbol"})
+    ranks = ranks[["Symbol", "Theme", date_col]].copy()
+    ranks["Theme"] = normalize_theme_series(ranks["Theme"])
+    ranks = ranks[ranks["Theme"].notna()].rename(columns={date_col: "Rank"})
+    ranks["Rank"] = pd.to_numeric(ranks["Rank"], errors="coerce")
+    ranks["Symbol"] = ranks["Symbol"].astype(str).str.strip()
+    return ranks
+
+
+@timed
 def build_theme_table(
     th: pd.DataFrame,
     latest,
@@ -143,52 +197,63 @@ def build_theme_table(
     latest_median,
     show_non_portfolio: bool,
 ):
-    th_latest = th.rename(columns={"Symbol / Rank": "Symbol"})
-    th_latest = th_latest[["Symbol", "Theme", latest]].copy()
-    th_latest["Theme"] = th_latest["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
-    th_latest = th_latest[th_latest["Theme"].notna()].rename(columns={latest: "Rank"})
-    th_latest["Rank"] = pd.to_numeric(th_latest["Rank"], errors="coerce")
-    th_latest["Symbol"] = th_latest["Symbol"].astype(str).str.strip()
-
-    prev_ranks = None
-    if prev is not None:
-        prev_ranks = th.rename(columns={"Symbol / Rank": "Symbol"})
-        prev_ranks = prev_ranks[["Symbol", "Theme", prev]].copy()
-        prev_ranks["Theme"] = prev_ranks["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
-        prev_ranks = prev_ranks[prev_ranks["Theme"].notna()].rename(columns={prev: "Rank"})
-        prev_ranks["Rank"] = pd.to_numeric(prev_ranks["Rank"], errors="coerce")
-        prev_ranks["Symbol"] = prev_ranks["Symbol"].astype(str).str.strip()
+    th_latest = _theme_ranks(th, latest)
+    selected = th_latest["Theme"].isin(set(selected_themes))
+    ranked = th_latest[selected].dropna(subset=["Rank"])
 
-    prev_median = theme_medians(th, prev) if prev is not None else pd.Series(dtype=float)
+    if prev is not None:
+        prev_ranks = _theme_ranks(th, prev)
+        prev_median = prev_ranks.groupby("Theme")["Rank"].median()
+        # Per-theme lookup of the previous rank; a repeated symbol keeps its last row
+        prev_lookup = (
+            prev_ranks.dropna(subset=["Rank"])
+            .drop_duplicates(["Theme", "Symbol"], keep="last")
+            .rename(columns={"Rank": "PrevRank"})
+        )
+        ranked = ranked.merge(prev_lookup, on=["Theme", "Symbol"], how="left")
+    else:
+        prev_median = pd.Series(dtype=float)
+        ranked = ranked.assign(PrevRank=np.nan)
+
+    # One sort for every theme: rank order within theme, ties keep sheet order
+    ranked = ranked.sort_values(["Theme", "Rank"], kind="stable")
+
+    latest_rank = ranked["Rank"].astype("int64")
+    has_prev = ranked["PrevRank"].notna()
+    delta = latest_rank - ranked["PrevRank"].fillna(0).astype("int64")
+    arrow = pd.Series(np.select([delta < 0, delta > 0], ["▲", "▼"], "•"), index=ranked.index)
+    klass = pd.Series(
+        np.select([delta < 0, delta > 0], ["delta-up", "delta-down"], "delta-flat"), index=ranked.index
+    )
+    delta_text = ("<span class='" + klass + "'>(" + arrow + delta.abs().astype(str) + ")</span>").where(
+        has_prev, "<span class='delta-unk'>(?)</span>"
+    )
+    ranked = ranked.assign(
+        LatestRank=latest_rank,
+        Delta=delta.where(has_prev).astype("Int64"),
+        Label=ranked["Symbol"] + " " + latest_rank.astype(str) + " " + delta_text,
+        IsPortfolio=ranked["Symbol"].isin(portfolio_symbol_set),
+    )
+    cells = ranked.groupby(["Theme", "IsPortfolio"], sort=False)["Label"].agg("<br/>".join).to_dict()
+
+    # Per-symbol records in display order, for the combined view to join on
+    if not show_non_portfolio:
+        ranked = ranked[ranked["IsPortfolio"]]
+    records = {}
+    for theme, symbol, rank, d, is_pf, label in zip(
+        ranked["Theme"], ranked["Symbol"], ranked["LatestRank"], ranked["Delta"],
+        ranked["IsPortfolio"], ranked["Label"],
+    ):
+        records.setdefault(theme, []).append({
+            "symbol": symbol,
+            "rank": int(rank),
+            "delta": None if pd.isna(d) else int(d),
+            "portfolio": bool(is_pf),
+            "html": label,
+        })
 
     rows = []
     for theme in selected_themes:
-        latest_rows = th_latest[th_latest["Theme"] == theme].dropna(subset=["Rank"])
-        latest_rows = latest_rows.sort_values("Rank", ascending=True)
-        prev_rows = None
-        if prev_ranks is not None:
-            prev_rows = prev_ranks[prev_ranks["Theme"] == theme].dropna(subset=["Rank"])
-            prev_rows = prev_rows.set_index("Symbol")["Rank"].to_dict()
-
-        portfolio_cells = []
-        other_cells = []
-        for _, r in latest_rows.iterrows():
-            sym = r["Symbol"]
-            latest_rank = int(r["Rank"])
-            prev_rank = None if prev_rows is None else prev_rows.get(sym)
-            if pd.notna(prev_rank):
-                delta = latest_rank - int(prev_rank)
-                arrow = "▲" if delta < 0 else "▼" if delta > 0 else "•"
-                klass = "delta-up" if delta < 0 else "delta-down" if delta > 0 else "delta-flat"
-                delta_text = f"<span class='{klass}'>({arrow}{abs(delta)})</span>"
-            else:
-                delta_text = "<span class='delta-unk'>(?)</span>"
-            label = f"{sym} {latest_rank} {delta_text}"
-            if sym in portfolio_symbol_set:
-                portfolio_cells.append(label)
-            else:
-                other_cells.append(label)
-
         latest_med = float(latest_median.get(theme, float("nan")))
         prev_med = float(prev_median.get(theme, float("nan"))) if prev is not None else float("nan")
         delta_text = _rank_delta_text(prev_med, latest_med)
@@ -201,126 +266,361 @@ def build_theme_table(
         row = {
             "Theme": theme,
             "Median (Latest Δ)": med_cell,
-            "Portfolio": "<br/>".join(portfolio_cells),
+            "Portfolio": cells.get((theme, True), ""),
         }
         if show_non_portfolio:
-            row["Others"] = "<br/>".join(other_cells)
+            row["Others"] = cells.get((theme, False), "")
+        row["Records"] = records.get(theme, [])
         rows.append(row)
     return rows
 
 
-def render_table(rows, show_non_portfolio: bool, latest_date, font_size=14, date_font_size=13) -> str:
+_TABLE_STYLE = (
+    "<style>"
+    ".tp-date{{margin:4px 0 8px 0;color:#666;font-size:{date_font_size}px;}}"
+    ".tp-table{{width:100%;table-layout:fixed;border-collapse:collapse;font-size:{font_size}px;line-height:1.35;}}"
+    ".tp-table th{{text-align:left;padding:8px 10px;border-bottom:1px solid #e6e6e6;font-weight:600;color:#333;}}"
+    ".tp-table td{{vertical-align:top;padding:8px 10px;border-bottom:1px solid #f0f0f0;}}"
+    ".tp-table .col-median{{text-align:right;white-space:nowrap;color:#222;}}"
+    ".tp-table .col-theme{{font-weight:500;color:#222;}}"
+    ".tp-table .col-list{{color:#222;font-weight:400;white-space:normal;word-break:break-word;}}"
+    ".delta-up{{color:#28a745;font-weight:700;}}"
+    ".delta-down{{color:#dc3545;font-weight:700;}}"
+    ".delta-flat{{color:#6c757d;font-weight:600;}}"
+    ".delta-unk{{color:#6c757d;font-weight:400;}}"
+    "</style>"
+)
+_TABLE_COLGROUP = "<colgroup><col style='width:14%'><col style='width:8%'><col style='width:78%'></colgroup>"
+_TABLE_COLGROUP_OTHERS = (
+    "<colgroup><col style='width:14%'><col style='width:8%'><col style='width:39%'><col style='width:39%'></colgroup>"
+)
+_TABLE_ROW = "<tr><td class='col-theme'>{}</td><td class='col-median'>{}</td><td class='col-list'>{}</td></tr>"
+_TABLE_ROW_OTHERS = (
+    "<tr><td class='col-theme'>{}</td><td class='col-median'>{}</td>"
+    "<td class='col-list'>{}</td><td class='col-list'>{}</td></tr>"
+)
+
+
+def table_style(font_size=14, date_font_size=13) -> str:
+    """CSS header for a table body; the only part that differs between display and download"""
+    return _TABLE_STYLE.format(font_size=font_size, date_font_size=date_font_size)
+
+
+def iter_table_body(rows, show_non_portfolio: bool, latest_date):
+    """The Ranks table without its CSS, as fragments (one per row)"""
     cols = ["Theme", "Median (Latest Δ)", "Portfolio"]
     if show_non_portfolio:
         cols.append("Others")
+    head_cells = "".join(f"<th>{c}</th>" for c in cols)
 
-    colgroup = (
-        "<colgroup>"
-        "<col style='width:14%'>"
-        "<col style='width:8%'>"
-        "<col style='width:78%'>"
-        "</colgroup>"
+    yield (
+        f"<div class='tp-date'>As of {latest_date:%Y-%m-%d}</div>"
+        + "<table class='tp-table'>"
+        + (_TABLE_COLGROUP_OTHERS if show_non_portfolio else _TABLE_COLGROUP)
+        + f"<thead><tr>{head_cells}</tr></thead><tbody>"
     )
     if show_non_portfolio:
-        colgroup = (
-            "<colgroup>"
-            "<col style='width:14%'>"
-            "<col style='width:8%'>"
-            "<col style='width:39%'>"
-            "<col style='width:39%'>"
-            "</colgroup>"
-        )
+        for r in rows:
+            yield _TABLE_ROW_OTHERS.format(
+                r.get("Theme", ""), r.get("Median (Latest Δ)", ""), r.get("Portfolio", ""), r.get("Others", "")
+            )
+    else:
+        for r in rows:
+            yield _TABLE_ROW.format(r.get("Theme", ""), r.get("Median (Latest Δ)", ""), r.get("Portfolio", ""))
+    yield "</tbody></table>"
 
-    head_cells = "".join(f"<th>{c}</th>" for c in cols)
-    body_rows = []
-    for r in rows:
-        t = r.get("Theme", "")
-        med = r.get("Median (Latest Δ)", "")
-        port = r.get("Portfolio", "")
-        oth = r.get("Others", "")
-        cells = [
-            f"<td class='col-theme'>{t}</td>",
-            f"<td class='col-median'>{med}</td>",
-            f"<td class='col-list'>{port}</td>",
-        ]
-        if show_non_portfolio:
-            cells.append(f"<td class='col-list'>{oth}</td>")
-        body_rows.append("<tr>" + "".join(cells) + "</tr>")
-
-    html = (
-        "<style>"
-        f".tp-table{{width:100%;table-layout:fixed;border-collapse:collapse;font-size:{font_size}px;line-height:1.35;}}"
-        ".tp-table th{text-align:left;padding:8px 10px;border-bottom:1px solid #e6e6e6;font-weight:600;color:#333;}"
-        ".tp-table td{vertical-align:top;padding:8px 10px;border-bottom:1px solid #f0f0f0;}"
-        ".tp-table .col-median{text-align:right;white-space:nowrap;color:#222;}"
-        ".tp-table .col-theme{font-weight:500;color:#222;}"
-        ".tp-table .col-list{color:#222;font-weight:400;white-space:normal;word-break:break-word;}"
-        ".delta-up{color:#28a745;font-weight:700;}"
-        ".delta-down{color:#dc3545;font-weight:700;}"
-        ".delta-flat{color:#6c757d;font-weight:600;}"
-        ".delta-unk{color:#6c757d;font-weight:400;}"
-        "</style>"
-        f"<div style='margin:4px 0 8px 0;color:#666;font-size:{date_font_size}px;'>As of {latest_date:%Y-%m-%d}</div>"
-        "<table class='tp-table'>"
-        f"{colgroup}"
-        f"<thead><tr>{head_cells}</tr></thead>"
-        f"<tbody>{''.join(body_rows)}</tbody>"
-        "</table>"
-    )
-    return html
 
+def iter_table(rows, show_non_portfolio: bool, latest_date, font_size=14, date_font_size=13):
+    """render_table as fragments, for html_stream.write_fragments"""
+    yield table_style(font_size, date_font_size)
+    yield from iter_table_body(rows, show_non_portfolio, latest_date)
 
-def main():
-    st.set_page_config(page_title="Investment Dashboard", layout="wide")
-    st.title("📊 Investment Dashboard")
 
-    with st.expander("Data source", expanded=False):
-        data_path = st.text_input("Excel path", str(DATA_PATH_DEFAULT))
-        st.caption("Uses PF_Ranks and theme_park tabs.")
+@timed
+def render_table(rows, show_non_portfolio: bool, latest_date, font_size=14, date_font_size=13) -> str:
+    return "".join(iter_table(rows, show_non_portfolio, latest_date, font_size, date_font_size))
 
-    pf, th = load_data(data_path)
+
+def ranks_body_key(workbook_hash: str, selected, show_non_portfolio: bool) -> str:
+    """Fragment cache key of the Ranks body (theme_park sheet of the workbook)"""
+    return fingerprint("ranks", workbook_hash, list(selected), show_non_portfolio, code=RANKS_SOURCES)
+
+
+@timed
+def ranks_body(key: str, rows, show_non_portfolio: bool, latest_date) -> str:
+    """
+    Ranks table body, rendered once per key (see ranks_body_key); rows may be
+    a callable so they are only built on a miss
+    """
+    def build():
+        table_rows = rows() if callable(rows) else rows
+        return "".join(iter_table_body(table_rows, show_non_portfolio, latest_date))
+    return cached_fragment(key, build)
+
+
+# Ignore non-portfolio summary rows
+def is_real_symbol(val: str) -> bool:
+    s = str(val).strip()
+    if not s or s.lower() == "nan":
+        return False
+    s_lower = s.lower()
+    if s_lower in {"average rank", "avg rank", "kpi avg rank", "kpi average rank"}:
+        return False
+    if "avg rank" in s_lower or "average rank" in s_lower:
+        return False
+    if "kpi" in s_lower and "rank" in s_lower:
+        return False
+    return True
+
+
+class WorkbookContext(NamedTuple):
+    """Everything main() derives from PF_Ranks.xlsx alone, independent of widget state"""
+    pf: pd.DataFrame
+    th: pd.DataFrame
+    latest: object
+    prev: object
+    theme_map: pd.DataFrame
+    pf_symbols: set
+    missing_in_theme: list
+    pf_themes: list
+    latest_median: pd.Series
+
+
+class ViewKey(NamedTuple):
+    """Cache key for the tab view model: workbook, pivot file and theme selection"""
+    data_path: str
+    workbook_hash: str
+    pivot_path: str  # "" when no pivot file is available
+    pivot_mtime_ns: int
+    mode: str
+    selected: tuple
+    show_non_portfolio: bool
+
+
+@st.cache_data(show_spinner=False)
+def load_context(data_path: str, workbook_hash: str) -> WorkbookContext:
+    pf, th = load_data(data_path, workbook_hash)
     latest, prev = get_latest_prev_dates(pf, th)
 
     theme_map = build_theme_map(th)
     pf = pf.rename(columns={"Symbol / Rank": "Symbol"})
     pf["Symbol"] = pf["Symbol"].astype(str).str.strip()
 
-    # Ignore non-portfolio summary rows
-    def is_real_symbol(val: str) -> bool:
-        s = str(val).strip()
-        if not s or s.lower() == "nan":
-            return False
-        s_lower = s.lower()
-        if s_lower in {"average rank", "avg rank", "kpi avg rank", "kpi average rank"}:
-            return False
-        if "avg rank" in s_lower or "average rank" in s_lower:
-            return False
-        if "kpi" in s_lower and "rank" in s_lower:
-            return False
-        return True
-
     pf_symbols = {s for s in pf["Symbol"].dropna() if is_real_symbol(s)}
     mapped_symbols = set(theme_map["Symbol"].dropna())
     missing_in_theme = sorted(s for s in pf_symbols if s not in mapped_symbols)
-    if missing_in_theme:
-        msg = "Portfolio symbols missing in theme_park: " + ", ".join(missing_in_theme)
-        print("WARNING:", msg)
-        st.warning(msg, icon="⚠️")
-    pf_themes = portfolio_themes(pf, theme_map)
-    pf_theme_set = set(pf_themes)
 
-    latest_median = theme_medians(th, latest).sort_values()
-    counts = theme_counts(th, latest)
+    return WorkbookContext(
+        pf=pf,
+        th=th,
+        latest=latest,
+        prev=prev,
+        theme_map=theme_map,
+        pf_symbols=pf_symbols,
+        missing_in_theme=missing_in_theme,
+        pf_themes=portfolio_themes(pf, theme_map),
+        latest_median=theme_medians(th, latest).sort_values(),
+    )
+
+
+@st.cache_data(show_spinner=False)
+def load_mf_view_data(pivot_path: str, pivot_mtime_ns: int):
+    """Pivot frame plus its latest / previous bb_ columns"""
+    mf_df, _ = load_mf_data(Path(pivot_path))
+    latest_bb, prev_bb = get_latest_prev_bb_cols(mf_df)
+    return mf_df, latest_bb, prev_bb
+
+
+@st.cache_data(show_spinner=False)
+def ranks_view(key: ViewKey):
+    ctx = load_context(key.data_path, key.workbook_hash)
+    return build_theme_table(
+        ctx.th,
+        ctx.latest,
+        ctx.prev,
+        list(key.selected),
+        ctx.pf_symbols,
+        ctx.latest_median,
+        key.show_non_portfolio,
+    )
 
-    top20 = latest_median.head(20).index.tolist()
-    bottom20 = latest_median.tail(20).index.tolist()
+
+@st.cache_data(show_spinner=False)
+def mf_view(key: ViewKey):
+    """(mf_rows, latest_bb); mf_rows is None when the pivot has no bb_ columns"""
+    ctx = load_context(key.data_path, key.workbook_hash)
+    mf_df, latest_bb, prev_bb = load_mf_view_data(key.pivot_path, key.pivot_mtime_ns)
+    if not latest_bb:
+        return None, None
+    mf_rows = build_mf_theme_table(
+        mf_df,
+        latest_bb,
+        prev_bb,
+        list(key.selected),
+        ctx.theme_map,
+        ctx.pf_symbols
+    )
+    return mf_rows, latest_bb
+
+
+@st.cache_data(show_spinner=False)
+def combined_view(key: ViewKey):
+    mf_rows, _ = mf_view(key)
+    if mf_rows is None:
+        return None
+    return build_combined_theme_table(ranks_view(key), mf_rows, list(key.selected))
+
+
+@st.cache_data(show_spinner=False)
+def codex_view(key: ViewKey):
+    """(combined_rows, latest_codex) for the Codex tab; combined_rows is None without MF data"""
+    ctx = load_context(key.data_path, key.workbook_hash)
+    _, th_codex = load_data_codex(key.data_path, key.workbook_hash)
+    theme_map_codex = build_theme_map_codex(th_codex)
+
+    # Get codex latest median and selected themes
+    latest_codex, prev_codex = get_latest_prev_dates(ctx.pf, th_codex)
+    latest_median_codex = theme_medians(th_codex, latest_codex).sort_values()
+    all_themes_codex = latest_median_codex.index.tolist()
+    pf_themes_codex = portfolio_themes(ctx.pf, theme_map_codex)
+
+    # Use same selection mode
+    if key.mode == "Portfolio themes":
+        selected_codex = pf_themes_codex
+    elif key.mode == "All themes":
+        selected_codex = all_themes_codex
+    else:
+        selected_codex = [t for t in key.selected if t in all_themes_codex]
+
+    # Sort by median rank
+    selected_series_codex = pd.Series(selected_codex).drop_duplicates()
+    sort_key_codex = latest_median_codex.reindex(selected_series_codex).astype(float)
+    selected_codex = (
+        pd.DataFrame({"Theme": selected_series_codex, "Median": sort_key_codex.values})
+        .sort_values(by="Median", ascending=True, na_position="last")
+        ["Theme"]
+        .tolist()
+    )
+
+    mf_df, latest_bb, prev_bb = load_mf_view_data(key.pivot_path, key.pivot_mtime_ns)
+    if not latest_bb:
+        return None, latest_codex
+
+    # Build tables using codex
+    rows_codex = build_theme_table(
+        th_codex,
+        latest_codex,
+        prev_codex,
+        selected_codex,
+        ctx.pf_symbols,
+        latest_median_codex,
+        key.show_non_portfolio,
+    )
+
+    mf_rows_codex = build_mf_theme_table(
+        mf_df,
+        latest_bb,
+        prev_bb,
+        selected_codex,
+        theme_map_codex,
+        ctx.pf_symbols
+    )
+
+    return build_combined_theme_table(rows_codex, mf_rows_codex, selected_codex), latest_codex
+
+
+def render_ranks_tab(key: ViewKey, latest):
+    """Tab 1: Ranks"""
+    st.subheader("Theme Constituents (Compact)")
+    # One body for both copies; only the CSS header differs
+    body = ranks_body(
+        ranks_body_key(key.workbook_hash, key.selected, key.show_non_portfolio),
+        lambda: ranks_view(key),
+        key.show_non_portfolio,
+        latest,
+    )
+    html_display = table_style(font_size=14, date_font_size=13) + body
+    html_download = table_style(font_size=12, date_font_size=12) + body
+    st.download_button(
+        label="Download HTML",
+        data=html_download,
+        file_name=f"theme_constituents_{latest:%Y-%m-%d}.html",
+        mime="text/html",
+    )
+    st.markdown(html_display, unsafe_allow_html=True)
+
+
+def render_mf_tab(key: ViewKey):
+    """Tab 2: MF Moves"""
+    if not key.pivot_path:
+        st.warning("MF data not available")
+        return
+    mf_rows, latest_bb = mf_view(key)
+    if mf_rows is not None:
+        st.subheader("Mutual Fund Movement by Theme")
+        mf_html = render_mf_theme_table(mf_rows, latest_date_str=latest_bb.replace("bb_", "").replace("25", " 2025").replace("26", " 2026"))
+        st.markdown(mf_html, unsafe_allow_html=True)
+    else:
+        st.warning("No MF data columns found")
+
+
+def render_combined_tab(key: ViewKey, latest):
+    """Tab 3: Combined"""
+    if not key.pivot_path:
+        st.warning("MF data not available for combined view")
+        return
+    combined_rows = combined_view(key)
+    if combined_rows is not None:
+        st.subheader("Combined View: Ranks + MF Moves")
+        combined_html = render_combined_table(combined_rows, latest_date_str=f"{latest:%Y-%m-%d}")
+        st.markdown(combined_html, unsafe_allow_html=True)
+    else:
+        st.warning("No MF data available for combined view")
+
+
+def render_codex_tab(key: ViewKey):
+    """Tab 4: Combined (Codex)"""
+    if not key.pivot_path:
+        st.warning("MF data not available for codex combined view")
+        return
+    combined_rows_codex, latest_codex = codex_view(key)
+    if combined_rows_codex is not None:
+        st.subheader("Combined View (Codex): Ranks + MF Moves")
+        combined_html_codex = render_combined_table(combined_rows_codex, latest_date_str=f"{latest_codex:%Y-%m-%d}")
+        st.markdown(combined_html_codex, unsafe_allow_html=True)
+    else:
+        st.warning("No MF data available for codex combined view")
+
+
+def main():
+    st.set_page_config(page_title="Investment Dashboard", layout="wide")
+    st.title("📊 Investment Dashboard")
+
+    with st.expander("Data source", expanded=False):
+        data_path = st.text_input("Excel path", str(DATA_PATH_DEFAULT))
+        st.caption("Uses PF_Ranks and theme_park tabs.")
+
+    # Content hash of the workbook (one stat() when unchanged) keys every cached view
+    workbook_hash = file_hash(data_path)
+    ctx = load_context(data_path, workbook_hash)
+    latest, prev = ctx.latest, ctx.prev
+
+    if ctx.missing_in_theme:
+        msg = "Portfolio symbols missing in theme_park: " + ", ".join(ctx.missing_in_theme)
+        print("WARNING:", msg)
+        st.warning(msg, icon="⚠️")
+    pf_themes = ctx.pf_themes
+    latest_median = ctx.latest_median
     all_themes = latest_median.index.tolist()
 
     # Load MF data
-    mf_pivot_date = None
-    mf_df = None
+    pivot_path = ""
+    pivot_mtime_ns = 0
     try:
-        mf_df, mf_pivot_date = load_mf_data()
+        pivot_file, mf_pivot_date = find_latest_pivot_file()
+        load_mf_view_data(str(pivot_file), pivot_file.stat().st_mtime_ns)
+        pivot_path = str(pivot_file)
+        pivot_mtime_ns = pivot_file.stat().st_mtime_ns
         st.info(f"📊 Using Pivot File: {mf_pivot_date}")
     except Exception as e:
         st.warning(f"Could not load MF data: {e}")
@@ -362,145 +662,44 @@ def main():
     if show_non_portfolio and mode == "Portfolio themes":
         selected = all_themes
 
-    # Load codex data
+    key = ViewKey(
+        data_path=data_path,
+        workbook_hash=workbook_hash,
+        pivot_path=pivot_path,
+        pivot_mtime_ns=pivot_mtime_ns,
+        mode=mode,
+        selected=tuple(selected),
+        show_non_portfolio=show_non_portfolio,
+    )
+
+    # Check codex data
     try:
-        _, th_codex = load_data_codex(data_path)
-        theme_map_codex = build_theme_map_codex(th_codex)
+        load_data_codex(data_path, workbook_hash)
         has_codex = True
     except Exception as e:
         print(f"Could not load codex data: {e}")
         has_codex = False
 
-    # Create tabs
+    tab_names = ["📈 Ranks", "🏦 MF Moves", "🔀 Combined"]
+    renderers = [
+        lambda: render_ranks_tab(key, latest),
+        lambda: render_mf_tab(key),
+        lambda: render_combined_tab(key, latest),
+    ]
     if has_codex:
-        tab1, tab2, tab3, tab4 = st.tabs(["📈 Ranks", "🏦 MF Moves", "🔀 Combined", "🎯 Combined (Codex)"])
+        tab_names.append("🎯 Combined (Codex)")
+        renderers.append(lambda: render_codex_tab(key))
+
+    if LAZY_TABS:
+        # Only the picked view is built; the others are built (and cached) on first view
+        if st.session_state.get("active_tab") not in tab_names:
+            st.session_state["active_tab"] = tab_names[0]
+        active = st.radio("View", tab_names, horizontal=True, key="active_tab", label_visibility="collapsed")
+        renderers[tab_names.index(active)]()
     else:
-        tab1, tab2, tab3 = st.tabs(["📈 Ranks", "🏦 MF Moves", "🔀 Combined"])
-
-    # TAB 1: RANKS
-    with tab1:
-        st.subheader("Theme Constituents (Compact)")
-        rows = build_theme_table(
-            th,
-            latest,
-            prev,
-            selected,
-            pf_symbols,
-            latest_median,
-            show_non_portfolio,
-        )
-        html_display = render_table(rows, show_non_portfolio, latest, font_size=14, date_font_size=13)
-        html_download = render_table(rows, show_non_portfolio, latest, font_size=12, date_font_size=12)
-        st.download_button(
-            label="Download HTML",
-            data=html_download,
-            file_name=f"theme_constituents_{latest:%Y-%m-%d}.html",
-            mime="text/html",
-        )
-        st.markdown(html_display, unsafe_allow_html=True)
-
-    # TAB 2: MF MOVES
-    with tab2:
-        if mf_df is not None:
-            latest_bb, prev_bb = get_latest_prev_bb_cols(mf_df)
-            if latest_bb:
-                st.subheader("Mutual Fund Movement by Theme")
-                mf_rows = build_mf_theme_table(
-                    mf_df,
-                    latest_bb,
-                    prev_bb,
-                    selected,
-                    theme_map,
-                    pf_symbols
-                )
-                mf_html = render_mf_theme_table(mf_rows, latest_date_str=latest_bb.replace("bb_", "").replace("25", " 2025").replace("26", " 2026"))
-                st.markdown(mf_html, unsafe_allow_html=True)
-            else:
-                st.warning("No MF data columns found")
-        else:
-            st.warning("MF data not available")
-
-    # TAB 3: COMBINED
-    with tab3:
-        if mf_df is not None:
-            latest_bb, prev_bb = get_latest_prev_bb_cols(mf_df)
-            if latest_bb:
-                st.subheader("Combined View: Ranks + MF Moves")
-                mf_rows = build_mf_theme_table(
-                    mf_df,
-                    latest_bb,
-                    prev_bb,
-                    selected,
-                    theme_map,
-                    pf_symbols
-                )
-                combined_rows = build_combined_theme_table(rows, mf_rows, selected)
-                combined_html = render_combined_table(combined_rows, latest_date_str=f"{latest:%Y-%m-%d}")
-                st.markdown(combined_html, unsafe_allow_html=True)
-            else:
-                st.warning("No MF data available for combined view")
-        else:
-            st.warning("MF data not available for combined view")
-
-    # TAB 4: COMBINED (CODEX)
-    if has_codex:
-        with tab4:
-            if mf_df is not None:
-                latest_bb, prev_bb = get_latest_prev_bb_cols(mf_df)
-                if latest_bb:
-                    st.subheader("Combined View (Codex): Ranks + MF Moves")
-
-                    # Get codex latest median and selected themes
-                    latest_codex, prev_codex = get_latest_prev_dates(pf, th_codex)
-                    latest_median_codex = theme_medians(th_codex, latest_codex).sort_values()
-                    all_themes_codex = latest_median_codex.index.tolist()
-                    pf_themes_codex = portfolio_themes(pf, theme_map_codex)
-
-                    # Use same selection mode
-                    if mode == "Portfolio themes":
-                        selected_codex = pf_themes_codex
-                    elif mode == "All themes":
-                        selected_codex = all_themes_codex
-                    else:
-                        selected_codex = [t for t in selected if t in all_themes_codex]
-
-                    # Sort by median rank
-                    selected_series_codex = pd.Series(selected_codex).drop_duplicates()
-                    sort_key_codex = latest_median_codex.reindex(selected_series_codex).astype(float)
-                    selected_codex = (
-                        pd.DataFrame({"Theme": selected_series_codex, "Median": sort_key_codex.values})
-                        .sort_values(by="Median", ascending=True, na_position="last")
-                        ["Theme"]
-                        .tolist()
-                    )
-
-                    # Build tables using codex
-                    rows_codex = build_theme_table(
-                        th_codex,
-                        latest_codex,
-                        prev_codex,
-                        selected_codex,
-                        pf_symbols,
-                        latest_median_codex,
-                        show_non_portfolio,
-                    )
-
-                    mf_rows_codex = build_mf_theme_table(
-                        mf_df,
-                        latest_bb,
-                        prev_bb,
-                        selected_codex,
-                        theme_map_codex,
-                        pf_symbols
-                    )
-
-                    combined_rows_codex = build_combined_theme_table(rows_codex, mf_rows_codex, selected_codex)
-                    combined_html_codex = render_combined_table(combined_rows_codex, latest_date_str=f"{latest_codex:%Y-%m-%d}")
-                    st.markdown(combined_html_codex, unsafe_allow_html=True)
-                else:
-                    st.warning("No MF data available for codex combined view")
-            else:
-                st.warning("MF data not available for codex combined view")
+        for tab, render in zip(st.tabs(tab_names), renderers):
+            with tab:
+                render()
 
 
 if __name__ == "__main__":
@@ -10,8 +10,12 @@ import re
 
 from app import build_theme_map_codex, normalize_theme_name
 from export_static import is_real_symbol
-from mf_processor import get_all_bb_cols_sorted, get_symbol_bb_last_3
+from mf_processor import build_bb_index, build_mf_rows
 from combined_processor import build_combined_theme_table, render_combined_table
+from snapshot_cache import read_sheet
+from pivot_store import load_pivot_summary
+from rank_history import load_rank_history, rank_file_date, rank_records
+from theme_index import build_theme_index, symbols_of_theme
 
 # Configure page
 st.set_page_config(
@@ -40,19 +44,8 @@ if not PF_RANKS_PATH.exists():
 
 
 def parse_rank_date(filename: str):
-    """Parse date from rank filename"""
-    match = re.match(r'out_(\d+)-([A-Za-z]+)-(\d+)\.csv', filename)
-    if match:
-        day = int(match.group(1))
-        month_str = match.group(2)
-        year = int('20' + match.group(3))
-        month_map = {
-            'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-            'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-        }
-        month = month_map.get(month_str, 1)
-        return (year, month, day)
-    return (0, 0, 0)
+    """Parse date from rank filename; (0, 0, 0) when not recognised (same parser as the rank history cube)"""
+    return rank_file_date(filename) or (0, 0, 0)
 
 
 def parse_pivot_date(filename: str):
@@ -105,8 +98,8 @@ def match_pivot_to_rank(rank_date_tuple, available_pivots_dict):
 @st.cache_data
 def load_theme_data():
     """Load theme definitions and portfolio symbols"""
-    pf = pd.read_excel(PF_RANKS_PATH, sheet_name="PF_Ranks")
-    th_codex = pd.read_excel(PF_RANKS_PATH, sheet_name="tpark_codex")
+    pf = read_sheet(PF_RANKS_PATH, "PF_Ranks")
+    th_codex = read_sheet(PF_RANKS_PATH, "tpark_codex")
 
     theme_map = build_theme_map_codex(th_codex)
 
@@ -143,28 +136,21 @@ def get_available_files():
 
 @st.cache_data
 def load_rank_data(rank_filename):
-    """Load rank data from CSV"""
-    df = pd.read_csv(RANK_DIR / rank_filename)
-    df['symbol'] = df['symbol'].str.strip().str.upper()
-
-    rank_dict = {}
-    for _, row in df.iterrows():
-        symbol = row['symbol']
-        rank_dict[symbol] = {
-            'ptile': int(row['ptile']) if pd.notna(row['ptile']) else None
-        }
-    return rank_dict
+    """Load rank data for one snapshot (a column of the rank history cube)"""
+    return rank_records(load_rank_history(RANK_DIR), rank_filename)
 
 
 def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selected_themes):
     """Build theme table using rank data"""
+    theme_index = build_theme_index(theme_map)
     rows = []
 
     for theme in selected_themes:
-        theme_symbols = theme_map[theme_map['Theme'] == theme]['Symbol'].unique()
+        theme_symbols = symbols_of_theme(theme_index, theme)
 
         portfolio_cells = []
         other_cells = []
+        records = []
 
         # Calculate median
         theme_ranks = [rank_current[s]['ptile'] for s in theme_symbols
@@ -199,11 +185,11 @@ def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selec
                 continue
 
             prev_rank = rank_prev.get(symbol, {}).get('ptile')
+            delta = curr_rank - prev_rank if prev_rank is not None else None
 
             rank_str = f"{symbol} {curr_rank}"
 
-            if prev_rank is not None:
-                delta = curr_rank - prev_rank
+            if delta is not None:
                 if delta < 0:
                     rank_str += f" <span class='delta-up'>(▲{abs(delta)})</span>"
                 elif delta > 0:
@@ -211,16 +197,20 @@ def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selec
                 else:
                     rank_str += f" <span class='delta-flat'>(—)</span>"
 
-            if symbol in pf_symbols:
+            is_portfolio = symbol in pf_symbols
+            if is_portfolio:
                 portfolio_cells.append(rank_str)
             else:
                 other_cells.append(rank_str)
+            records.append({"symbol": symbol, "rank": curr_rank, "delta": delta,
+                            "portfolio": is_portfolio, "html": rank_str})
 
         row = {
             "Theme": theme,
             "Median (Latest Δ)": median_str,
             "Portfolio": "<br/>".join(portfolio_cells),
-            "Others": "<br/>".join(other_cells)
+            "Others": "<br/>".join(other_cells),
+            "Records": records,
         }
         rows.append(row)
 
@@ -230,37 +220,11 @@ def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selec
 @st.cache_data
 def build_mf_theme_table_from_pivot(pivot_filename, theme_map, pf_symbols, selected_themes):
     """Build MF theme table from pivot file"""
-    df = pd.read_excel(PIVOT_DIR / pivot_filename, sheet_name="Summary Data")
+    df = load_pivot_summary(PIVOT_DIR / pivot_filename)
     df['Symbol'] = df['Symbol'].str.strip().str.upper()
 
-    bb_cols_sorted = get_all_bb_cols_sorted(df)
-
-    rows = []
-    for theme in selected_themes:
-        theme_symbols = theme_map[theme_map['Theme'] == theme]['Symbol'].unique()
-
-        portfolio_cells = []
-        other_cells = []
-
-        for symbol in theme_symbols:
-            bb_last_3 = get_symbol_bb_last_3(df, symbol, bb_cols_sorted)
-
-            if bb_last_3:
-                bb_text = f"{symbol} ({', '.join(map(str, bb_last_3))})"
-
-                if symbol in pf_symbols:
-                    portfolio_cells.append(bb_text)
-                else:
-                    other_cells.append(bb_text)
-
-        row = {
-            "Theme": theme,
-            "Portfolio": "<br/>".join(portfolio_cells),
-            "Others": "<br/>".join(other_cells)
-        }
-        rows.append(row)
-
-    return rows
+    bb_index = build_bb_index(df)
+    return build_mf_rows(bb_index, selected_themes, theme_map, pf_symbols)
 
 
 # Main app
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Generates a synthetic universe (PF_Ranks workbook, out_*.csv rank files,
+*_pivot_features.xlsx pivots) at a configurable scale and times the hot paths
+on it, saving the results as JSON so runs can be compared across versions
+
+Usage: python benchmark.py [--scale small|medium|large] [--repeat N] [--only a,b]
+                           [--keep DIR] [--compare baseline.json]
+"""
+
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+RESULTS_DIR = Path(__file__).parent / "benchmark_results"
+
+MONTH_ABBR = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+class Scale(NamedTuple):
+    themes: int
+    symbols: int
+    fund_families: int
+    months: int           # month-end snapshots: rank files, sheet date columns, pivot tv_/bb_ months
+    portfolio: int        # symbols in PF_Ranks
+    holding_rate: float   # share of (symbol, fund family) pairs present in a pivot
+    seed: int = 7
+
+
+SCALES = {
+    "small": Scale(themes=30, symbols=300, fund_families=8, months=6, portfolio=40, holding_rate=0.5),
+    "medium": Scale(themes=150, symbols=1200, fund_families=14, months=12, portfolio=90, holding_rate=0.6),
+    "large": Scale(themes=400, symbols=4000, fund_families=30, months=24, portfolio=200, holding_rate=0.6),
+}
+
+
+class Universe(NamedTuple):
+    root: Path
+    pf_ranks_path: Path
+    rank_dir: Path
+    pivot_dir: Path
+    docs_dir: Path
+
+
+# ---------------------------------------------------------------- generator
+
+def _month_ends(n: int, last=dt.date(2026, 1, 31)) -> list:
+    ends = pd.date_range(end=pd.Timestamp(last), periods=n, freq="ME")
+    return [d.to_pydatetime() for d in ends]
+
+
+def generate_universe(root: Path, scale: Scale) -> Universe:
+    """Write a deterministic synthetic universe for scale under root"""
+    rng = np.random.default_rng(scale.seed)
+    root = Path(root)
+    rank_dir, pivot_dir, docs_dir = root / "eom_price", root / "final", root / "docs"
+    for d in (rank_dir, pivot_dir, docs_dir):
+        d.mkdir(parents=True, exist_ok=True)
+
+    symbols = np.array([f"SYM{i:05d}" for i in range(scale.symbols)])
+    themes = np.array([f"Theme {i:03d}" for i in range(scale.themes)])
+    families = np.array([f"Fund Family {i:02d}" for i in range(scale.fund_families)])
+    dates = _month_ends(scale.months)
+
+    # Every symbol has a primary theme; a fifth get a secondary one too
+    primary = rng.integers(0, scale.themes, scale.symbols)
+    secondary_syms = rng.choice(scale.symbols, scale.symbols // 5, replace=False)
+    secondary = (primary[secondary_syms] + rng.integers(1, scale.themes, len(secondary_syms))) % scale.themes
+    ranks = rng.integers(1, 101, (scale.symbols, scale.months)).astype(float)
+    ranks[rng.random(ranks.shape) < 0.05] = np.nan
+    portfolio = rng.choice(scale.symbols, scale.portfolio, replace=False)
+
+    # PF_Ranks workbook
+    pf = pd.DataFrame(ranks[portfolio], columns=dates)
+    pf.insert(0, "Symbol / Rank", symbols[portfolio])
+
+    theme_park = []
+    for t, theme in enumerate(themes):
+        members = np.flatnonzero(primary == t)
+        theme_park.append({"Symbol / Rank": theme, "Theme": None})
+        for i in members:
+            theme_park.append({"Symbol / Rank": symbols[i], "Theme": theme, **dict(zip(dates, ranks[i]))})
+        theme_park.append({"Symbol / Rank": "Average Rank", "Theme": None})
+    theme_park = pd.DataFrame(theme_park, columns=["Symbol / Rank", "Theme"] + dates)
+
+    codex_rows = np.concatenate([np.arange(scale.symbols), secondary_syms])
+    codex = pd.DataFrame(ranks[codex_rows], columns=dates)
+    codex.insert(0, "Theme", themes[np.concatenate([primary, secondary])])
+    codex.insert(0, "Symbol", symbols[codex_rows])
+    codex = codex.sort_values("Theme", kind="stable")
+
+    pf_ranks_path = root / "PF_Ranks.xlsx"
+    with pd.ExcelWriter(pf_ranks_path, engine="openpyxl") as writer:
+        pf.to_excel(writer, sheet_name="PF_Ranks", index=False)
+        theme_park.to_excel(writer, sheet_name="theme_park", index=False)
+        codex.to_excel(writer, sheet_name="tpark_codex", index=False)
+
+    # One rank CSV per month end
+    for j, d in enumerate(dates):
+        n = scale.symbols
+        df = pd.DataFrame({
+            "symbol": symbols,
+            "ptile": ranks[:, j],
+            "cmp": rng.uniform(10, 5000, n).round(2),
+            "ff_mcap": rng.lognormal(8, 1.5, n),
+            "Percentile_52w_Index": rng.integers(1, 101, n),
+            "Percentile_Return_6months": rng.integers(1, 101, n),
+            "Percentile_Return_1year": rng.integers(1, 101, n),
+            "Total_Percentile_Score": rng.uniform(0, 100, n),
+        })
+        df.to_csv(rank_dir / f"out_{d:%d}-{MONTH_ABBR[d.month - 1]}-{d:%y}.csv", index=False)
+
+    # One pivot for the latest month, carrying every month's tv_ / bb_ / i_ / p_
+    labels = [f"{MONTH_ABBR[d.month - 1]}{d:%y}" for d in dates]
+    held = rng.random((scale.symbols, scale.fund_families)) < scale.holding_rate
+    sym_idx, fam_idx = np.nonzero(held)
+    n = len(sym_idx)
+    pivot = pd.DataFrame({
+        "Symbol": symbols[sym_idx],
+        "FundFamily": families[fam_idx],
+        "cmp": rng.uniform(10, 5000, n).round(2),
+        "ff_mcap": rng.lognormal(8, 1.5, n),
+    })
+    bb = rng.integers(-4, 5, (scale.symbols, scale.months))  # per symbol, as in the real pivots
+    for j, label in enumerate(labels):
+        pivot[f"tv_{label}"] = rng.normal(0, 80, n).round(2)
+    for j, label in enumerate(labels):
+        pivot[f"bb_{label}"] = bb[sym_idx, j]
+    for prefix in ("i_", "p_"):
+        for label in labels:
+            pivot[f"{prefix}{label}"] = rng.uniform(-1, 1, n).round(4)
+    for col, (lo, hi) in {"FundQuality": (0, 3), "BBFlags": (0, 3), "Impact": (0, 3), "RankProgression": (-2, 3)}.items():
+        pivot[col] = rng.integers(lo, hi, n)
+    pivot.to_excel(pivot_dir / f"{labels[-1]}_pivot_features.xlsx", sheet_name="Summary Data", index=False)
+
+    return Universe(root, pf_ranks_path, rank_dir, pivot_dir, docs_dir)
+
+
+# ---------------------------------------------------------------- scenarios
+
+@contextlib.contextmanager
+def _pointed_at(universe: Universe):
+    """Point the entry points' hard-coded locations at the synthetic universe"""
+    import aggregate_themes
+    import export_static
+    import mf_processor
+
+    patches = [
+        (export_static, "DOWNLOADS_PATH", universe.pf_ranks_path),
+        (export_static, "DATA_PATH_DEFAULT", universe.pf_ranks_path),
+        (export_static, "DOCS_DIR", universe.docs_dir),
+        (aggregate_themes, "DATA_PATH_DEFAULT", universe.pf_ranks_path),
+        (aggregate_themes, "OUTPUT_DIR", universe.root),
+        (mf_processor, "PIVOT_BASE_DIR", universe.pivot_dir),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+def build_context(universe: Universe) -> dict:
+    """Inputs every scenario starts from, loaded once"""
+    from app import build_theme_map, get_latest_prev_dates, theme_medians
+    from export_static import is_real_symbol
+    from mf_processor import find_latest_pivot_file, get_latest_prev_bb_cols
+    from pivot_store import load_pivot_summary
+    from snapshot_cache import read_sheet
+
+    pf = read_sheet(universe.pf_ranks_path, "PF_Ranks")
+    th = read_sheet(universe.pf_ranks_path, "theme_park")
+    latest, prev = get_latest_prev_dates(pf, th)
+    latest_median = theme_medians(th, latest).sort_values()
+    pf_syms = pf["Symbol / Rank"].astype(str).str.strip()
+    mf_df = load_pivot_summary(find_latest_pivot_file(universe.pivot_dir)[0])
+    latest_bb, prev_bb = get_latest_prev_bb_cols(mf_df)
+
+    ctx = {
+        "th": th,
+        "latest": latest,
+        "prev": prev,
+        "latest_median": latest_median,
+        "selected": latest_median.index.tolist(),
+        "pf_symbols": {s for s in pf_syms.dropna() if is_real_symbol(s)},
+        "theme_map": build_theme_map(th),
+        "mf_df": mf_df,
+        "latest_bb": latest_bb,
+        "prev_bb": prev_bb,
+    }
+    # Downstream scenarios start from the upstream ones' output, computed once here
+    ctx["theme_rows"] = _theme_rows(ctx)
+    ctx["mf_rows"] = _mf_rows(ctx)
+    ctx["combined_rows"] = _combined_rows(ctx)
+    return ctx
+
+
+def _theme_rows(ctx):
+    from app import build_theme_table
+    return build_theme_table(ctx["th"], ctx["latest"], ctx["prev"], ctx["selected"], ctx["pf_symbols"],
+                             ctx["latest_median"], show_non_portfolio=True)
+
+
+def _mf_rows(ctx):
+    from mf_processor import build_mf_theme_table
+    return build_mf_theme_table(ctx["mf_df"], ctx["latest_bb"], ctx["prev_bb"], ctx["selected"],
+                                ctx["theme_map"], ctx["pf_symbols"])
+
+
+def _combined_rows(ctx):
+    from combined_processor import build_combined_theme_table
+    return build_combined_theme_table(ctx["theme_rows"], ctx["mf_rows"], ctx["selected"])
+
+
+def _render_combined(ctx):
+    from combined_processor import render_combined_table
+    return render_combined_table(ctx["combined_rows"], latest_date_str=f"{ctx['latest']:%Y-%m-%d}")
+
+
+def _build_theme_map(ctx):
+    from app import build_theme_map
+    return build_theme_map(ctx["th"])
+
+
+def _aggregate(ctx):
+    from aggregate_themes import aggregate_by_theme_and_fund
+    return aggregate_by_theme_and_fund()[0]
+
+
+def _export_static_cold(ctx):
+    """Every tab rebuilt: the fragment cache starts empty, in memory and on disk"""
+    import fragment_cache
+    from export_static import main
+
+    fragment_cache._memo.clear()
+    saved = fragment_cache.FRAGMENT_DIR
+    with tempfile.TemporaryDirectory(prefix="fragments-") as tmp:
+        fragment_cache.FRAGMENT_DIR = Path(tmp)
+        try:
+            main()
+        finally:
+            fragment_cache.FRAGMENT_DIR = saved
+    return None
+
+
+def _export_static_warm(ctx):
+    """Unchanged inputs: every tab body comes from the fragment cache"""
+    from export_static import main
+    main()
+    return None
+
+
+# name -> scenario(ctx); the result's len() is reported as rows (as chars for HTML)
+SCENARIOS = {
+    "build_theme_map": _build_theme_map,
+    "build_theme_table": _theme_rows,
+    "build_mf_theme_table": _mf_rows,
+    "build_combined_theme_table": _combined_rows,
+    "render_combined_table": _render_combined,
+    "aggregate_by_theme_and_fund": _aggregate,
+    "export_static.main (cold)": _export_static_cold,
+    "export_static.main (warm)": _export_static_warm,
+}
+
+# Scenarios run once untimed first, so every timed run starts from a full cache
+WARM_UP = {"export_static.main (warm)"}
+
+
+def time_scenario(fn, ctx, repeat: int, warm_up: bool = False) -> dict:
+    runs, result = [], None
+    if warm_up:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(ctx)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # The entry points print progress; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn(ctx)
+        runs.append(time.perf_counter() - start)
+    return {
+        "runs": [round(r, 6) for r in runs],
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "rows": len(result) if result is not None and not isinstance(result, str) else None,
+        "chars": len(result) if isinstance(result, str) else None,
+    }
+
+
+def run_benchmarks(universe: Universe, repeat: int = 5, only=None) -> dict:
+    with _pointed_at(universe):
+        ctx = build_context(universe)
+        return {
+            name: time_scenario(fn, ctx, repeat, warm_up=name in WARM_UP)
+            for name, fn in SCENARIOS.items()
+            if not only or name in only
+        }
+
+
+# ---------------------------------------------------------------- report
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).parent, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict):
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('scale_name')}):")
+    for name, result in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("nan")
+        flag = "  ⚠ slower" if ratio > 1.2 else ""
+        print(f"   {name:30s} {old['median'] * 1000:9.1f}ms -> {result['median'] * 1000:9.1f}ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    args = sys.argv[1:]
+
+    def option(flag, default=None):
+        if flag in args:
+            return args[args.index(flag) + 1]
+        return default
+
+    scale_name = option("--scale", "small")
+    repeat = int(option("--repeat", "5"))
+    only = set(option("--only").split(",")) if option("--only") else None
+    keep = option("--keep")
+    baseline = option("--compare")
+    scale = SCALES[scale_name]
+
+    print("=" * 60)
+    print(f"BENCHMARK ({scale_name}: {scale.themes} themes, {scale.symbols} symbols, "
+          f"{scale.fund_families} fund families, {scale.months} months)")
+    print("=" * 60)
+
+    root = Path(keep) if keep else Path(tempfile.mkdtemp(prefix="themes-bench-"))
+    # Keep the snapshot cache inside the universe so real workbooks are not touched
+    os.environ["THEMES_CACHE_DIR"] = str(root / ".cache")
+    try:
+        start = time.perf_counter()
+        universe = generate_universe(root, scale)
+        generate_s = time.perf_counter() - start
+        print(f"\n   Generated universe in {generate_s:.1f}s ({root})")
+
+        results = run_benchmarks(universe, repeat, only)
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for name, result in results.items():
+        rows = f" ({result['rows']} rows)" if result["rows"] is not None else ""
+        if result["chars"] is not None:
+            rows = f" ({result['chars']} chars)"
+        print(f"   {name:30s} min {result['min'] * 1000:9.1f}ms  median {result['median'] * 1000:9.1f}ms{rows}")
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "scale_name": scale_name,
+        "scale": scale._asdict(),
+        "repeat": repeat,
+        "generate_s": round(generate_s, 3),
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    out_path = RESULTS_DIR / f"{scale_name}-{report['commit'] or 'nogit'}-{dt.datetime.now():%Y%m%d-%H%M%S}.json"
+    out_path.write_text(json.dumps(report, indent=2))
+    print(f"\n✓ Wrote {out_path}")
+
+    if baseline:
+        compare(report, json.loads(Path(baseline).read_text()))
+
+
+if __name__ == "__main__":
+    main()
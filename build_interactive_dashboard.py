@@ -7,8 +7,10 @@ Generates static HTML + JSON data files
 from pathlib import Path
 import pandas as pd
 import json
+import os
 import re
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 
 from app import (
     build_theme_map,
@@ -21,8 +23,8 @@ from export_static import (
 )
 
 from mf_processor import (
-    get_all_bb_cols_sorted,
-    get_symbol_bb_last_3,
+    build_bb_index,
+    build_mf_rows,
 )
 
 from combined_processor import (
@@ -30,6 +32,13 @@ from combined_processor import (
     render_combined_table,
 )
 
+from generate_manifest import pivot_extract
+from snapshot_cache import read_sheet
+from pivot_store import load_pivot_summary
+from rank_history import load_rank_history, rank_file_date, rank_records
+from spans import profiled, span, timed
+from theme_index import build_theme_index, symbols_of_theme
+
 # Directories
 RANK_DIR = Path("/Users/raviaranke/Desktop/code2026/data/r_outputs/eom_price")
 PIVOT_DIR = Path("/Users/raviaranke/Desktop/code2026/data/r_outputs/final")
@@ -38,23 +47,12 @@ if not PF_RANKS_PATH.exists():
     PF_RANKS_PATH = Path("/Users/raviaranke/Desktop/themes/PF_Ranks.xlsx")
 
 OUTPUT_DIR = Path("/Users/raviaranke/Desktop/themes/docs")
+SHARD_DIR = OUTPUT_DIR / "data" / "shards"
 
 
 def parse_rank_date(filename: str):
-    """Parse date from rank filename: out_13-Feb-26.csv -> (2026, 2, 13)"""
-    match = re.match(r'out_(\d+)-([A-Za-z]+)-(\d+)\.csv', filename)
-    if match:
-        day = int(match.group(1))
-        month_str = match.group(2)
-        year = int('20' + match.group(3))
-
-        month_map = {
-            'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-            'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-        }
-        month = month_map.get(month_str, 1)
-        return (year, month, day)
-    return (0, 0, 0)
+    """Parse date from rank filename: out_13-Feb-26.csv -> (2026, 2, 13); (0, 0, 0) when not recognised (same parser as the rank history cube)"""
+    return rank_file_date(filename) or (0, 0, 0)
 
 
 def parse_pivot_date(filename: str):
@@ -141,31 +139,22 @@ def format_pivot_date_display(date_tuple):
 
 
 def load_rank_data(rank_file: Path):
-    """Load rank data from CSV and return as dict by symbol"""
-    df = pd.read_csv(rank_file)
-    df['symbol'] = df['symbol'].str.strip().str.upper()
-
-    rank_dict = {}
-    for _, row in df.iterrows():
-        symbol = row['symbol']
-        rank_dict[symbol] = {
-            'ptile': int(row['ptile']) if pd.notna(row['ptile']) else None,
-            'cmp': row.get('cmp'),
-            'mcap': row.get('ff_mcap')
-        }
-    return rank_dict
+    """Load rank data for one snapshot (a column of the rank history cube) as dict by symbol"""
+    return rank_records(load_rank_history(rank_file.parent), rank_file.name)
 
 
 def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selected_themes):
     """Build theme table using rank data instead of PF_Ranks"""
+    theme_index = build_theme_index(theme_map)
     rows = []
 
     for theme in selected_themes:
         # Get symbols for this theme
-        theme_symbols = theme_map[theme_map['Theme'] == theme]['Symbol'].unique()
+        theme_symbols = symbols_of_theme(theme_index, theme)
 
         portfolio_cells = []
         other_cells = []
+        records = []
 
         # Calculate median for theme
         theme_ranks = []
@@ -207,12 +196,12 @@ def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selec
                 continue
 
             prev_rank = rank_prev.get(symbol, {}).get('ptile')
+            delta = curr_rank - prev_rank if prev_rank is not None else None
 
             # Format: SYMBOL rank (delta)
             rank_str = f"{symbol} {curr_rank}"
 
-            if prev_rank is not None:
-                delta = curr_rank - prev_rank
+            if delta is not None:
                 if delta < 0:
                     rank_str += f" <span class='delta-up'>(▲{abs(delta)})</span>"
                 elif delta > 0:
@@ -220,16 +209,20 @@ def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selec
                 else:
                     rank_str += f" <span class='delta-flat'>(—)</span>"
 
-            if symbol in pf_symbols:
+            is_portfolio = symbol in pf_symbols
+            if is_portfolio:
                 portfolio_cells.append(rank_str)
             else:
                 other_cells.append(rank_str)
+            records.append({"symbol": symbol, "rank": curr_rank, "delta": delta,
+                            "portfolio": is_portfolio, "html": rank_str})
 
         row = {
             "Theme": theme,
             "Median (Latest Δ)": median_str,
             "Portfolio": "<br/>".join(portfolio_cells),
-            "Others": "<br/>".join(other_cells)
+            "Others": "<br/>".join(other_cells),
+            "Records": records,
         }
         rows.append(row)
 
@@ -238,41 +231,15 @@ def build_theme_rank_table(theme_map, rank_current, rank_prev, pf_symbols, selec
 
 def build_mf_theme_table_from_pivot(pivot_file, theme_map, pf_symbols, selected_themes):
     """Build MF theme table from pivot file"""
-    df = pd.read_excel(pivot_file, sheet_name="Summary Data")
+    df = load_pivot_summary(pivot_file)
     df['Symbol'] = df['Symbol'].str.strip().str.upper()
 
-    bb_cols_sorted = get_all_bb_cols_sorted(df)
-
-    rows = []
-    for theme in selected_themes:
-        theme_symbols = theme_map[theme_map['Theme'] == theme]['Symbol'].unique()
-
-        portfolio_cells = []
-        other_cells = []
-
-        for symbol in theme_symbols:
-            bb_last_3 = get_symbol_bb_last_3(df, symbol, bb_cols_sorted)
-
-            if bb_last_3:
-                bb_text = f"{symbol} ({', '.join(map(str, bb_last_3))})"
-
-                if symbol in pf_symbols:
-                    portfolio_cells.append(bb_text)
-                else:
-                    other_cells.append(bb_text)
-
-        row = {
-            "Theme": theme,
-            "Portfolio": "<br/>".join(portfolio_cells),
-            "Others": "<br/>".join(other_cells)
-        }
-        rows.append(row)
-
-    return rows
+    bb_index = build_bb_index(df)
+    return build_mf_rows(bb_index, selected_themes, theme_map, pf_symbols)
 
 
-def generate_data_json(rank_current_file, rank_prev_file, pivot_file, theme_map, pf_symbols, selected_themes, output_name):
-    """Generate JSON data for a specific combination"""
+def build_combined_rows(rank_current_file, rank_prev_file, pivot_file, theme_map, pf_symbols, selected_themes):
+    """Combined rows for one (current rank, previous rank, pivot) selection"""
     # Load rank data
     rank_current = load_rank_data(rank_current_file)
     rank_prev = load_rank_data(rank_prev_file)
@@ -284,7 +251,13 @@ def generate_data_json(rank_current_file, rank_prev_file, pivot_file, theme_map,
     mf_rows = build_mf_theme_table_from_pivot(pivot_file, theme_map, pf_symbols, selected_themes)
 
     # Build combined
-    combined_rows = build_combined_theme_table(rank_rows, mf_rows, selected_themes)
+    return build_combined_theme_table(rank_rows, mf_rows, selected_themes)
+
+
+@timed
+def generate_data_json(rank_current_file, rank_prev_file, pivot_file, theme_map, pf_symbols, selected_themes, output_name):
+    """Generate JSON data for a specific combination"""
+    combined_rows = build_combined_rows(rank_current_file, rank_prev_file, pivot_file, theme_map, pf_symbols, selected_themes)
 
     # Convert to JSON-serializable format
     json_data = {
@@ -302,6 +275,93 @@ def generate_data_json(rank_current_file, rank_prev_file, pivot_file, theme_map,
     return json_data
 
 
+def auto_prev_rank(rank_files, current_index):
+    """
+    Previous rank the dashboard picks for a current rank: the file closest to
+    one month earlier (same rule as updatePrevRankSelection in theme-park.js)
+    """
+    year, month, day = rank_files[current_index][1]
+    year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    # Day overflow rolls into the next month, as JS Date does
+    target = datetime(year, month, 1) + timedelta(days=day - 1)
+
+    best_index, min_diff = current_index + 1, None
+    for i, (_, (y, m, d)) in enumerate(rank_files):
+        if i == current_index:
+            continue
+        diff = abs(datetime(y, m, d) - target)
+        if min_diff is None or diff < min_diff:
+            best_index, min_diff = i, diff
+    return rank_files[best_index] if best_index < len(rank_files) else None
+
+
+def shard_combinations(rank_files, pivot_files):
+    """
+    (current, previous, pivot) file triples the dashboard lands on: every
+    current rank with its auto-matched previous rank and pivot. Only these get
+    a shard; any other previous / pivot choice is loaded by theme-park.js from
+    the rank CSVs and pivot extract as before.
+    """
+    combos = []
+    for i, (f, date) in enumerate(rank_files):
+        prev = auto_prev_rank(rank_files, i)
+        pivot = match_pivot_to_rank(date, pivot_files)
+        if prev is not None and pivot is not None:
+            combos.append((f, prev[0], pivot))
+    return combos
+
+
+def shard_name(rank_current_file, rank_prev_file, pivot_file):
+    """out_13-Feb-26.csv, out_30-Jan-26.csv, Jan26_pivot_features.xlsx -> 13-Feb-26_30-Jan-26_Jan26.json"""
+    pivot_month = Path(pivot_file).name.split("_")[0]
+    return f"{Path(rank_current_file).stem[4:]}_{Path(rank_prev_file).stem[4:]}_{pivot_month}.json"
+
+
+def shard_payload(rank_current_file, rank_prev_file, pivot_file) -> dict:
+    """
+    What theme-park.js loads for one selection, in one compact document:
+    symbol / ptile pairs for both rank files (what it reads from the CSVs) and
+    the pivot extract rows (what it reads from the pivot); the page still
+    builds and highlights the tables itself
+    """
+    history = load_rank_history(Path(rank_current_file).parent)
+    ptiles = {
+        name: [[symbol, rec['ptile']] for symbol, rec in rank_records(history, Path(f).name).items()]
+        for name, f in (("current", rank_current_file), ("prev", rank_prev_file))
+    }
+    return {**ptiles, "pivot": pivot_extract(load_pivot_summary(pivot_file))["rows"]}
+
+
+def _write_shard(combo):
+    out_file = SHARD_DIR / shard_name(*combo)
+    tmp = out_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(shard_payload(*combo), separators=(",", ":")))
+    tmp.replace(out_file)
+    return out_file
+
+
+@timed
+def generate_data_shards(combos, jobs=None):
+    """
+    Write one compact JSON shard per (current, previous, pivot) triple, built in
+    a process pool; returns the shard index for file_mapping.json
+    """
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        out_files = list(pool.map(_write_shard, combos))
+
+    return [
+        {
+            "current_rank": cur.name,
+            "prev_rank": prev.name,
+            "pivot": pivot.name,
+            "path": f"data/shards/{out_file.name}",
+            "bytes": out_file.stat().st_size,
+        }
+        for (cur, prev, pivot), out_file in zip(combos, out_files)
+    ]
+
+
 def main():
     print("=" * 60)
     print("BUILDING INTERACTIVE DASHBOARD")
@@ -309,8 +369,8 @@ def main():
 
     # Load theme definitions
     print("\n1. Loading theme definitions from PF_Ranks.xlsx...")
-    pf = pd.read_excel(PF_RANKS_PATH, sheet_name="PF_Ranks")
-    th_codex = pd.read_excel(PF_RANKS_PATH, sheet_name="tpark_codex")
+    pf = read_sheet(PF_RANKS_PATH, "PF_Ranks")
+    th_codex = read_sheet(PF_RANKS_PATH, "tpark_codex")
 
     theme_map_codex = build_theme_map_codex(th_codex)
 
@@ -327,8 +387,9 @@ def main():
 
     # Get available files
     print("\n2. Scanning available data files...")
-    rank_files = get_available_rank_files()
-    pivot_files = get_available_pivot_files()
+    with span("scan data files"):
+        rank_files = get_available_rank_files()
+        pivot_files = get_available_pivot_files()
 
     print(f"   Found {len(rank_files)} rank files")
     print(f"   Found {len(pivot_files)} pivot files")
@@ -374,6 +435,16 @@ def main():
             "date": date
         })
 
+    # Precompute the selections the dropdowns auto-match to
+    combos = shard_combinations(rank_files, pivot_files)
+    default_combo = (latest_rank[0], prev_rank[0], matched_pivot)
+    if matched_pivot and default_combo not in combos:
+        combos.insert(0, default_combo)
+    print(f"\n5. Generating {len(combos)} data shards...")
+    shards = generate_data_shards(combos, jobs=int(os.getenv("THEMES_SHARD_JOBS", "0")) or None)
+    total_kb = sum(s["bytes"] for s in shards) / 1024
+    print(f"   ✓ Wrote {len(shards)} shards to {SHARD_DIR} ({total_kb:.0f}KB)")
+
     # Create mapping JSON for auto-matching
     mapping = {
         "rank_files": rank_options,
@@ -382,17 +453,19 @@ def main():
             "current_rank": latest_rank[0].name,
             "prev_rank": prev_rank[0].name,
             "pivot": matched_pivot.name if matched_pivot else None
-        }
+        },
+        "themes": all_themes,
+        "shards": shards
     }
 
     mapping_file = OUTPUT_DIR / "data" / "file_mapping.json"
-    with open(mapping_file, 'w') as f:
+    with span("write file_mapping.json"), open(mapping_file, 'w') as f:
         json.dump(mapping, f, indent=2)
 
     print(f"   ✓ Generated {mapping_file}")
     print(f"   ✓ Generated default data JSON")
 
-    print("\n5. Generating interactive HTML...")
+    print("\n6. Generating interactive HTML...")
     # Will create the HTML in next step
 
     print("\n" + "=" * 60)
@@ -401,4 +474,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with profiled("build_interactive_dashboard"):
+        main()
@@ -6,6 +6,7 @@ let manifest = null;
 let themeMap = null;
 let portfolioSymbols = new Set();
 let allThemes = [];
+let shardIndex = new Map();
 
 // Initialize
 document.addEventListener('DOMContentLoaded', async () => {
@@ -26,6 +27,23 @@ async function loadManifest() {
     const response = await fetch('manifest.json');
     if (!response.ok) throw new Error('Failed to load manifest');
     manifest = await response.json();
+
+    // Per-selection shards written by build_interactive_dashboard.py (optional)
+    try {
+        const mappingResponse = await fetch('data/file_mapping.json');
+        if (mappingResponse.ok) {
+            const mapping = await mappingResponse.json();
+            (mapping.shards || []).forEach(shard => {
+                shardIndex.set(shardKey(shard.current_rank, shard.prev_rank, shard.pivot), shard.path);
+            });
+        }
+    } catch (error) {
+        console.log('No shard index, loading rank and pivot files directly');
+    }
+}
+
+function shardKey(currentRank, prevRank, pivot) {
+    return `${currentRank}|${prevRank}|${pivot}`;
 }
 
 // Load theme definitions from PF_Ranks.xlsx
@@ -356,6 +374,32 @@ async function loadPivotFile(path) {
     return { bbData, impactData, fundQualityData, rankProgressionData };
 }
 
+// Load the pre-reduced per-symbol pivot extract written by generate_manifest.py
+async function loadPivotExtract(path) {
+    const response = await fetch(path);
+    if (!response.ok) throw new Error('Failed to load pivot extract');
+
+    const extract = await response.json();
+    return pivotDataFromExtractRows(extract.rows);
+}
+
+// Rows are [Symbol, last-3 bb, max Impact, max FundQuality, max RankProgression]
+function pivotDataFromExtractRows(rows) {
+    const bbData = new Map();
+    const impactData = new Map();
+    const fundQualityData = new Map();
+    const rankProgressionData = new Map();
+
+    rows.forEach(([symbol, last3, impact, fundQuality, rankProgression]) => {
+        if (last3.length > 0) bbData.set(symbol, last3);
+        if (impact !== null) impactData.set(symbol, impact);
+        if (fundQuality !== null) fundQualityData.set(symbol, fundQuality);
+        if (rankProgression !== null) rankProgressionData.set(symbol, rankProgression);
+    });
+
+    return { bbData, impactData, fundQualityData, rankProgressionData };
+}
+
 // Generate battery-style rank change indicator (returns object with number and bars)
 function generateRankChangeIndicator(delta) {
     const absDelta = Math.abs(delta);
@@ -671,30 +715,13 @@ async function loadAndRenderData() {
         document.getElementById('currentRankDisplay').textContent = currentRankFile.display;
         document.getElementById('pivotDisplay').textContent = pivotFile.display;
 
-        // Load data files
-        const [currentRankData, prevRankData, pivotData] = await Promise.all([
-            loadCSV(currentRankFile.path),
-            loadCSV(prevRankFile.path),
-            loadPivotFile(pivotFile.path)
-        ]);
+        // Load data: one precomputed shard when this selection has one, else the rank CSVs and pivot
+        const shardPath = shardIndex.get(shardKey(currentRankFile.filename, prevRankFile.filename, pivotFile.filename));
+        const selection = (shardPath && await loadShard(shardPath))
+            || await loadSelectionFiles(currentRankFile, prevRankFile, pivotFile);
 
-        const { bbData, impactData, fundQualityData, rankProgressionData } = pivotData;
-
-        // Convert to maps
-        const rankCurrent = new Map();
-        const rankPrev = new Map();
-
-        currentRankData.forEach(row => {
-            if (row.symbol) {
-                rankCurrent.set(String(row.symbol).trim().toUpperCase(), row.ptile);
-            }
-        });
-
-        prevRankData.forEach(row => {
-            if (row.symbol) {
-                rankPrev.set(String(row.symbol).trim().toUpperCase(), row.ptile);
-            }
-        });
+        const { rankCurrent, rankPrev } = selection;
+        const { bbData, impactData, fundQualityData, rankProgressionData } = selection.pivotData;
 
         // Get flags from checkboxes
         const enableHighlight = document.getElementById('highlightToggle').checked;
@@ -725,6 +752,50 @@ async function loadAndRenderData() {
     }
 }
 
+// Load one selection's shard: [symbol, ptile] pairs per rank file plus pivot extract rows (null if unavailable)
+async function loadShard(path) {
+    try {
+        const response = await fetch(path);
+        if (!response.ok) return null;
+        const shard = await response.json();
+        return {
+            rankCurrent: new Map(shard.current),
+            rankPrev: new Map(shard.prev),
+            pivotData: pivotDataFromExtractRows(shard.pivot)
+        };
+    } catch (error) {
+        console.log(`Could not load shard ${path}, loading files directly`);
+        return null;
+    }
+}
+
+// Load one selection from the rank CSVs and the pivot extract (or XLSX)
+async function loadSelectionFiles(currentRankFile, prevRankFile, pivotFile) {
+    const [currentRankData, prevRankData, pivotData] = await Promise.all([
+        loadCSV(currentRankFile.path),
+        loadCSV(prevRankFile.path),
+        pivotFile.extract_path ? loadPivotExtract(pivotFile.extract_path) : loadPivotFile(pivotFile.path)
+    ]);
+
+    // Convert to maps
+    const rankCurrent = new Map();
+    const rankPrev = new Map();
+
+    currentRankData.forEach(row => {
+        if (row.symbol) {
+            rankCurrent.set(String(row.symbol).trim().toUpperCase(), row.ptile);
+        }
+    });
+
+    prevRankData.forEach(row => {
+        if (row.symbol) {
+            rankPrev.set(String(row.symbol).trim().toUpperCase(), row.ptile);
+        }
+    });
+
+    return { rankCurrent, rankPrev, pivotData };
+}
+
 // Check if any portfolio symbols are missing from dashboard
 function checkMissingPortfolioSymbols(combinedRows, rankCurrent) {
     // Get all symbols shown in dashboard
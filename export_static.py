@@ -1,3 +1,5 @@
+import functools
+import os
 from pathlib import Path
 
 import pandas as pd
@@ -9,23 +11,47 @@ from app import (
     build_theme_table,
     get_latest_prev_dates,
     normalize_theme_name,
-    render_table,
+    ranks_body_key,
+    RANKS_SOURCES,
     theme_medians,
     portfolio_themes,
 )
 
 from mf_processor import (
+    find_latest_pivot_file,
     load_mf_data,
     get_latest_prev_bb_cols,
     build_mf_theme_table,
-    render_mf_theme_table,
 )
 
 from combined_processor import (
     build_combined_theme_table,
-    render_combined_table,
+    iter_combined_table,
 )
 
+from fragment_cache import (
+    cached_rows,
+    fingerprint,
+    frame_hash,
+    has_fragment,
+    iter_fragment,
+    tee_fragment,
+)
+from html_stream import write_fragments
+from snapshot_cache import file_hash, read_sheet
+from spans import profiled, span
+
+# Latest PF_Ranks download (DATA_PATH_DEFAULT when missing) and the site it writes
+DOWNLOADS_PATH = Path("/Users/raviaranke/Downloads/PF_Ranks.xlsx")
+DOCS_DIR = Path("/Users/raviaranke/Desktop/themes/docs")
+
+# Sources each cached tab is built from (builders, renderers and the modules
+# they read through), part of its fingerprint; Ranks uses app.RANKS_SOURCES
+HERE = Path(__file__).parent
+MF_SOURCES = (HERE / "mf_processor.py", HERE / "theme_index.py", HERE / "pivot_store.py")
+COMBINED_SOURCES = (HERE / "combined_processor.py",)
+CODEX_SOURCES = RANKS_SOURCES + (HERE / "combined_processor.py",)
+
 
 def is_real_symbol(val: str) -> bool:
     s = str(val).strip()
@@ -44,13 +70,12 @@ def is_real_symbol(val: str) -> bool:
 def main():
     # ========== RANKS TAB DATA ==========
     # Use latest PF_Ranks from Downloads folder
-    downloads_path = Path("/Users/raviaranke/Downloads/PF_Ranks.xlsx")
-    if downloads_path.exists():
-        path = downloads_path
+    if DOWNLOADS_PATH.exists():
+        path = DOWNLOADS_PATH
     else:
         path = Path(DATA_PATH_DEFAULT)
-    pf = pd.read_excel(path, sheet_name="PF_Ranks")
-    th = pd.read_excel(path, sheet_name="theme_park")
+    pf = read_sheet(path, "PF_Ranks")
+    th = read_sheet(path, "theme_park")
 
     latest, prev = get_latest_prev_dates(pf, th)
 
@@ -65,24 +90,68 @@ def main():
     # Include all themes when exporting (includes non-portfolio)
     selected = all_themes
 
-    rows = build_theme_table(
-        th,
-        latest,
-        prev,
-        selected,
-        pf_symbols,
-        latest_median,
-        show_non_portfolio=True,
-    )
-
-    ranks_html_body = render_table(rows, True, latest, font_size=12, date_font_size=12)
+    # The page's tab bodies (and the rows behind them) are cached under a
+    # fingerprint of the inputs they read, so only what changed is rebuilt:
+    # rank rows depend on the workbook, MF rows on the pivot file plus the
+    # theme membership, portfolio and theme set (not the ranks)
+    workbook_hash = file_hash(path)
+    ranks_key = ranks_body_key(workbook_hash, selected, True)
+
+    def ranks_rows():
+        return cached_rows(fingerprint("rows", ranks_key, sorted(pf_symbols)), lambda: build_theme_table(
+            th,
+            latest,
+            prev,
+            selected,
+            pf_symbols,
+            latest_median,
+            show_non_portfolio=True,
+        ))
 
     # ========== MF MOVES TAB DATA ==========
+    pivot_file = None
     mf_pivot_date = None
     mf_pivot_date_formatted = None
+
+    @functools.cache
+    def mf_data():
+        """Pivot frame and its latest / previous bb_ columns, loaded on first use"""
+        mf_df, _ = load_mf_data(pivot_file)
+        return (mf_df,) + tuple(get_latest_prev_bb_cols(mf_df))
+
+    def mf_rows_for(themes, tmap):
+        """
+        (cache key, latest_bb, MF rows in themes order); rows is None when the
+        pivot has no bb_ columns. Rows are cached per theme set, so a new theme
+        order (new ranks) reuses them.
+        """
+        theme_set = sorted(set(themes), key=str)
+        key = fingerprint("mf-rows", file_hash(pivot_file), theme_set, frame_hash(tmap), sorted(pf_symbols),
+                          code=MF_SOURCES)
+
+        def build():
+            mf_df, latest_bb, prev_bb = mf_data()
+            if not latest_bb:
+                return latest_bb, None
+            rows = build_mf_theme_table(mf_df, latest_bb, prev_bb, theme_set, tmap, pf_symbols)
+            return latest_bb, {r["Theme"]: r for r in rows}
+
+        latest_bb, by_theme = cached_rows(key, build)
+        if by_theme is None:
+            return key, latest_bb, None
+        return key, latest_bb, [by_theme[t] for t in themes]
+
+    def combined_body_for(rank_key, rank_rows, mf_key, mf_rows, themes, latest_date_str):
+        """Combined tab body stream: from the cache, or rendered while index.html is written"""
+        key = fingerprint("combined", rank_key, mf_key, list(themes), latest_date_str, code=COMBINED_SOURCES)
+        if has_fragment(key):
+            return iter_fragment(key)
+        combined_rows = build_combined_theme_table(rank_rows(), mf_rows, themes)
+        return tee_fragment(key, iter_combined_table(combined_rows, latest_date_str=latest_date_str))
+
     try:
-        mf_df, mf_pivot_date = load_mf_data()
-        latest_bb, prev_bb = get_latest_prev_bb_cols(mf_df)
+        pivot_file, mf_pivot_date = find_latest_pivot_file()
+        print(f"Using pivot file: {pivot_file.name} ({mf_pivot_date})")
 
         # Convert pivot date from "Jan26" to "2026-01" format
         if mf_pivot_date:
@@ -99,79 +168,67 @@ def main():
                 month_num = month_map.get(month_str[:3], '01')
                 mf_pivot_date_formatted = f"{year}-{month_num}"
 
-        if latest_bb:
-            # Use same theme structure as Ranks tab
-            mf_rows = build_mf_theme_table(
-                mf_df,
-                latest_bb,
-                prev_bb,
-                selected,  # Same themes in same order as Ranks
-                theme_map,
-                pf_symbols
-            )
-            mf_html_body = render_mf_theme_table(mf_rows, latest_date_str=latest_bb.replace("bb_", "").replace("25", " 2025"))
-
+        # Use same theme structure as Ranks tab (same themes in same order)
+        mf_key, latest_bb, mf_rows = mf_rows_for(selected, theme_map)
+        if mf_rows is not None:
             # ========== COMBINED TAB DATA ==========
-            combined_rows = build_combined_theme_table(rows, mf_rows, selected)
-            combined_html_body = render_combined_table(combined_rows, latest_date_str=f"{latest:%Y-%m-%d}")
+            combined_body = combined_body_for(
+                ranks_key, ranks_rows, mf_key, mf_rows, selected, f"{latest:%Y-%m-%d}"
+            )
         else:
-            mf_html_body = "<p>No MF data available</p>"
-            combined_html_body = "<p>No MF data available for combined view</p>"
+            combined_body = ["<p>No MF data available for combined view</p>"]
     except Exception as e:
         print(f"Warning: Could not load MF data: {e}")
-        mf_html_body = "<p>MF data not available</p>"
-        combined_html_body = "<p>MF data not available for combined view</p>"
+        combined_body = ["<p>MF data not available for combined view</p>"]
 
     # ========== CODEX COMBINED TAB DATA ==========
     try:
-        th_codex = pd.read_excel(path, sheet_name="tpark_codex")
+        th_codex = read_sheet(path, "tpark_codex")
         theme_map_codex = build_theme_map_codex(th_codex)
 
         latest_codex, prev_codex = get_latest_prev_dates(pf, th_codex)
         latest_median_codex = theme_medians(th_codex, latest_codex).sort_values()
         all_themes_codex = latest_median_codex.index.tolist()
         selected_codex = all_themes_codex
+        codex_key = fingerprint("codex", workbook_hash, code=CODEX_SOURCES)
 
-        rows_codex = build_theme_table(
-            th_codex,
-            latest_codex,
-            prev_codex,
-            selected_codex,
-            pf_symbols,
-            latest_median_codex,
-            show_non_portfolio=True,
-        )
-
-        if latest_bb:
-            mf_rows_codex = build_mf_theme_table(
-                mf_df,
-                latest_bb,
-                prev_bb,
+        def rows_codex():
+            return cached_rows(fingerprint("rows", codex_key, sorted(pf_symbols)), lambda: build_theme_table(
+                th_codex,
+                latest_codex,
+                prev_codex,
                 selected_codex,
-                theme_map_codex,
-                pf_symbols
+                pf_symbols,
+                latest_median_codex,
+                show_non_portfolio=True,
+            ))
+
+        if pivot_file is None:
+            raise FileNotFoundError("No pivot file")
+        mf_codex_key, _, mf_rows_codex = mf_rows_for(selected_codex, theme_map_codex)
+        if mf_rows_codex is not None:
+            combined_codex_body = combined_body_for(
+                codex_key, rows_codex, mf_codex_key, mf_rows_codex, selected_codex,
+                f"{latest_codex:%Y-%m-%d}",
             )
-            combined_codex_rows = build_combined_theme_table(rows_codex, mf_rows_codex, selected_codex)
-            combined_codex_html_body = render_combined_table(combined_codex_rows, latest_date_str=f"{latest_codex:%Y-%m-%d}")
         else:
-            combined_codex_html_body = "<p>No MF data available for codex combined view</p>"
+            combined_codex_body = ["<p>No MF data available for codex combined view</p>"]
 
         has_codex = True
     except Exception as e:
         print(f"Warning: Could not load Codex data: {e}")
-        combined_codex_html_body = "<p>Codex data not available</p>"
+        combined_codex_body = ["<p>Codex data not available</p>"]
         has_codex = False
 
     # ========== GENERATE TABBED HTML ==========
     # Make Codex tab the default active tab if available
     codex_tab_button = '<button class="tab active" onclick="switchTab(event, \'codex-combined\')">🎯 Theme (Codex)</button>' if has_codex else ''
-    codex_tab_content = f'<div id="codex-combined" class="tab-content active">{combined_codex_html_body}</div>' if has_codex else ''
 
     # Adjust combined tab to not be active by default when codex is available
     combined_tab_class = '' if has_codex else 'active'
     combined_content_class = '' if has_codex else 'active'
 
-    full_html = f"""<!doctype html>
+    page_head = f"""<!doctype html>
 <html>
   <head>
     <meta charset="utf-8" />
@@ -477,11 +534,15 @@ def main():
       </div>
 
       <!-- Codex Tab Content (shown first) -->
-      {codex_tab_content}
+      """
+
+    combined_open = f"""
 
       <!-- Handmade Combined Tab Content -->
       <div id="combined" class="tab-content {combined_content_class}">
-        {combined_html_body}
+        """
+
+    page_tail = f"""
       </div>
     </div>
 
@@ -508,11 +569,36 @@ def main():
 </html>
 """
 
-    docs = Path("/Users/raviaranke/Desktop/themes/docs")
+    def page():
+        # The tab bodies render (or stream from the cache) as they are written;
+        # their spans separate that from writing the rest of the page
+        yield page_head
+        if has_codex:
+            yield '<div id="codex-combined" class="tab-content active">'
+            with span("render codex combined body"):
+                yield from combined_codex_body
+            yield '</div>'
+        yield combined_open
+        with span("render combined body"):
+            yield from combined_body
+        yield page_tail
+
+    docs = DOCS_DIR
     docs.mkdir(exist_ok=True)
-    (docs / "index.html").write_text(full_html)
-    print("Wrote", docs / "index.html")
+    # Cached bodies are rendered while the page streams out, so write a temp
+    # file and only replace index.html once the whole page was written
+    out_path = docs / "index.html"
+    tmp = out_path.with_suffix(".html.tmp")
+    try:
+        with span("write index.html"), open(tmp, "w") as f:
+            write_fragments(page(), f)
+        os.replace(tmp, out_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    print("Wrote", out_path)
 
 
 if __name__ == "__main__":
-    main()
+    with profiled("export_static"):
+        main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+HTML Fragment Cache
+Rendered table bodies (and the rows they are rendered from) keyed by a
+fingerprint of everything they are built from (input content hashes,
+selection, renderer source), kept in memory and under CACHE_DIR/fragments so
+the Streamlit app and the static exporter share them; the directory is pruned
+least recently used first once it outgrows DISK_CAP_BYTES
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+import pandas as pd
+
+from html_stream import CHUNK_CHARS
+from snapshot_cache import CACHE_DIR, file_hash
+
+FRAGMENT_DIR = CACHE_DIR / "fragments"
+
+# In-memory fragments kept per process (oldest dropped first)
+MEMO_SIZE = 32
+
+# On-disk fragments and rows are pruned to this many bytes, least recently used first
+DISK_CAP_BYTES = 256 * 1024 * 1024
+
+_memo = {}
+
+
+def fingerprint(*parts, code=()) -> str:
+    """sha1 over the parts (input hashes, render parameters) and the source files in code"""
+    payload = json.dumps([list(parts), [file_hash(p) for p in code]], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Content hash of a frame (labels and values), e.g. one sheet of the workbook"""
+    h = hashlib.sha1(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _remember(key: str, value):
+    _memo.pop(key, None)
+    _memo[key] = value
+    while len(_memo) > MEMO_SIZE:
+        _memo.pop(next(iter(_memo)))
+
+
+def _touch(path):
+    """Mark a disk entry as used (its mtime orders eviction)"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _evict(keep):
+    """Delete the least recently used entries until the directory fits DISK_CAP_BYTES"""
+    entries = []
+    for entry in os.scandir(FRAGMENT_DIR):
+        if entry.name.endswith((".html", ".pkl")):
+            st = entry.stat()
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= DISK_CAP_BYTES:
+            break
+        if path == str(keep):
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # already evicted by another process
+        total -= size
+
+
+def _store(path, write):
+    """Best effort: an unwritable cache only costs the next process a rebuild"""
+    try:
+        FRAGMENT_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        write(tmp)
+        os.replace(tmp, path)
+        _evict(keep=path)
+    except OSError:
+        pass
+
+
+def fragment_path(key: str):
+    return FRAGMENT_DIR / f"{key}.html"
+
+
+def cached_fragment(key: str, build) -> str:
+    """The fragment stored under key, calling build() to render it on a miss"""
+    html = _memo.get(key)
+    if html is not None:
+        return html
+
+    path = fragment_path(key)
+    if path.exists():
+        html = path.read_text(encoding="utf-8")
+        _touch(path)
+    else:
+        html = build()
+        _store(path, lambda tmp: tmp.write_text(html, encoding="utf-8"))
+
+    _remember(key, html)
+    return html
+
+
+def has_fragment(key: str) -> bool:
+    if key in _memo:
+        return True
+    path = fragment_path(key)
+    if not path.exists():
+        return False
+    _touch(path)
+    return True
+
+
+def iter_fragment(key: str):
+    """A cached fragment as chunks (for html_stream.write_fragments)"""
+    html = _memo.get(key)
+    if html is not None:
+        yield html
+        return
+    with open(fragment_path(key), encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(CHUNK_CHARS), ""):
+            yield chunk
+
+
+def tee_fragment(key: str, fragments):
+    """
+    Pass fragments through while saving them under key, so a streamed body is
+    cached without being held in memory; nothing is saved if the stream fails
+    """
+    path = fragment_path(key)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        FRAGMENT_DIR.mkdir(parents=True, exist_ok=True)
+        out = open(tmp, "w", encoding="utf-8")
+    except OSError:
+        yield from fragments
+        return
+
+    try:
+        for fragment in fragments:
+            out.write(fragment)
+            yield fragment
+    except BaseException:
+        out.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    out.close()
+    os.replace(tmp, path)
+    try:
+        _evict(keep=path)
+    except OSError:
+        pass
+
+
+def cached_rows(key: str, build):
+    """Table rows stored under key (pickled), calling build() on a miss"""
+    memo_key = f"rows:{key}"
+    if memo_key in _memo:
+        return _memo[memo_key]
+
+    path = FRAGMENT_DIR / f"{key}.pkl"
+    rows = None
+    if path.exists():
+        try:
+            rows = pickle.loads(path.read_bytes())
+            _touch(path)
+        except Exception:
+            # Truncated, or pickled against classes that have since changed
+            path.unlink(missing_ok=True)
+            rows = None
+    if rows is None:
+        rows = build()
+        _store(path, lambda tmp: tmp.write_bytes(pickle.dumps(rows)))
+
+    _remember(memo_key, rows)
+    return rows
@@ -7,28 +7,33 @@ from pathlib import Path
 import json
 import re
 
+import pandas as pd
+
+from pivot_store import load_pivot_summary
+from rank_history import rank_file_date
+
 # Data directories
 DATA_DIR = Path("/Users/raviaranke/Desktop/themes/docs/data")
 RANK_DIR = DATA_DIR / "eom_price"
 PIVOT_DIR = DATA_DIR / "final"
 OUTPUT_DIR = Path("/Users/raviaranke/Desktop/themes/docs")
 
+# Per-symbol maxima the dashboard reads from each pivot
+EXTRACT_MAX_COLS = ["Impact", "FundQuality", "RankProgression"]
 
-def parse_rank_date(filename: str):
-    """Parse date from rank filename: out_13-Feb-26.csv -> (2026, 2, 13)"""
-    match = re.match(r'out_(\d+)-([A-Za-z]+)-(\d+)\.csv', filename)
-    if match:
-        day = int(match.group(1))
-        month_str = match.group(2)
-        year = int('20' + match.group(3))
+MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
 
-        month_map = {
-            'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
-            'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
-        }
-        month = month_map.get(month_str, 1)
-        return {"year": year, "month": month, "day": day}
-    return None
+
+def parse_rank_date(filename: str):
+    """Parse date from rank filename: out_13-Feb-26.csv -> (2026, 2, 13), as the rank history cube does"""
+    date = rank_file_date(filename)
+    if date is None:
+        return None
+    year, month, day = date
+    return {"year": year, "month": month, "day": day}
 
 
 def parse_pivot_date(filename: str):
@@ -47,6 +52,83 @@ def parse_pivot_date(filename: str):
     return None
 
 
+def extract_path_for(pivot_path: Path) -> Path:
+    """Jan26_pivot_features.xlsx -> Jan26_pivot_extract.json"""
+    return pivot_path.with_name(pivot_path.stem.replace("_pivot_features", "_pivot_extract") + ".json")
+
+
+def _bb_sort_key(col: str) -> int:
+    """bb_Dec25 -> 2025 * 12 + 12 (0 when unparseable), as theme-park.js sorts them"""
+    match = re.match(r'bb_([A-Za-z]+)(\d+)', col)
+    if not match:
+        return 0
+    return int('20' + match.group(2)) * 12 + MONTHS.get(match.group(1)[:3], 0)
+
+
+def pivot_extract(df: pd.DataFrame) -> dict:
+    """
+    One row per symbol with what the dashboard reads from a pivot:
+    [Symbol, last-3 bb values (oldest first, gaps dropped), max Impact,
+    max FundQuality, max RankProgression]
+
+    The bb values come from the symbol's last row having any of them, as
+    loadPivotFile did. Missing values are null.
+    """
+    bb_cols = sorted([c for c in df.columns if str(c).startswith('bb_') and c != 'bb_'], key=_bb_sort_key)[-3:]
+    symbols = df['Symbol'].astype('string').str.strip().str.upper()
+    df = df[symbols.notna() & (symbols != '')].assign(Symbol=symbols)
+
+    bb = df[['Symbol'] + bb_cols]
+    bb = bb[bb[bb_cols].notna().any(axis=1)].drop_duplicates('Symbol', keep='last').set_index('Symbol')
+    max_cols = [c for c in EXTRACT_MAX_COLS if c in df.columns]
+    maxima = df.groupby('Symbol', sort=True)[max_cols].max().reindex(columns=EXTRACT_MAX_COLS)
+
+    last3 = {
+        symbol: [int(v) for v in values if not pd.isna(v)]
+        for symbol, values in zip(bb.index, bb.itertuples(index=False))
+    }
+    rows = [
+        [symbol, last3.get(symbol, [])] + [None if pd.isna(v) else int(v) for v in values]
+        for symbol, values in zip(maxima.index, maxima.itertuples(index=False))
+    ]
+
+    return {
+        "bb_cols": bb_cols,
+        "columns": ["Symbol", "bb"] + EXTRACT_MAX_COLS,
+        "rows": rows,
+    }
+
+
+def _source_stamp(pivot_path: Path) -> list:
+    """[size, mtime_ns] of the pivot the extract was built from"""
+    st = pivot_path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _extract_is_fresh(out_path: Path, stamp: list) -> bool:
+    try:
+        return json.loads(out_path.read_text()).get("source") == stamp
+    except (OSError, ValueError):
+        return False
+
+
+def write_pivot_extract(pivot_path: Path) -> Path:
+    """
+    Write the pivot's extract next to it, unless the one there was built from
+    this exact pivot (same size and mtime, so a replaced or restored pivot with
+    an older timestamp is picked up too)
+    """
+    out_path = extract_path_for(pivot_path)
+    stamp = _source_stamp(pivot_path)
+    if _extract_is_fresh(out_path, stamp):
+        return out_path
+    extract = {**pivot_extract(load_pivot_summary(pivot_path)), "source": stamp}
+    tmp = out_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(extract, separators=(",", ":")))
+    tmp.replace(out_path)
+    return out_path
+
+
 def main():
     print("=" * 60)
     print("GENERATING DATA MANIFEST")
@@ -78,16 +160,18 @@ def main():
             continue
         date = parse_pivot_date(f.name)
         if date:
+            extract = write_pivot_extract(f)
             pivot_files.append({
                 "filename": f.name,
                 "path": f"data/final/{f.name}",
+                "extract_path": f"data/final/{extract.name}",
                 "date": date,
                 "display": f"{date['year']:04d}-{date['month']:02d}"
             })
 
     # Sort by date (newest first)
     pivot_files.sort(key=lambda x: (x['date']['year'], x['date']['month']), reverse=True)
-    print(f"   Found {len(pivot_files)} pivot files")
+    print(f"   Found {len(pivot_files)} pivot files (per-symbol extracts written alongside)")
 
     # Create manifest
     manifest = {
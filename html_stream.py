@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+HTML Streaming
+Writes the fragments the table renderers yield (iter_table, iter_mf_theme_table,
+iter_combined_table) to a sink as they are produced, so a page is never held
+in memory as one string
+"""
+
+import io
+
+# Fragments are coalesced to about this many characters per write / chunk
+CHUNK_CHARS = 64 * 1024
+
+
+def chunked(fragments, size: int = CHUNK_CHARS):
+    """Coalesce small fragments (one per table row) into ~size character chunks"""
+    buf, buffered = [], 0
+    for fragment in fragments:
+        buf.append(fragment)
+        buffered += len(fragment)
+        if buffered >= size:
+            yield "".join(buf)
+            buf, buffered = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def _is_binary(sink) -> bool:
+    if isinstance(sink, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    return "b" in getattr(sink, "mode", "")
+
+
+def write_fragments(fragments, sink) -> int:
+    """
+    Write fragments to a text sink (open(..., "w"), StringIO) or a binary one
+    (open(..., "wb"), BytesIO, a response stream), UTF-8 encoded for the latter.
+    Returns the number of characters written.
+    """
+    binary = _is_binary(sink)
+    written = 0
+    for chunk in chunked(fragments):
+        sink.write(chunk.encode("utf-8") if binary else chunk)
+        written += len(chunk)
+    return written
@@ -4,15 +4,24 @@ Processes latest *_pivot_features.xlsx to show mutual fund buy/sell movements BY
 """
 
 from pathlib import Path
+from typing import NamedTuple
+import numpy as np
 import pandas as pd
 import re
 from datetime import datetime
 
+from pivot_store import load_pivot_summary
+from spans import timed
+from theme_index import build_theme_index, symbols_of_theme
+
+# Where find_latest_pivot_file looks when no directory is given
+PIVOT_BASE_DIR = Path("/Users/raviaranke/Desktop/themes")
+
 
 def find_latest_pivot_file(base_dir: Path = None):
     """Find the latest pivot_features.xlsx file based on date prefix"""
     if base_dir is None:
-        base_dir = Path("/Users/raviaranke/Desktop/themes")
+        base_dir = PIVOT_BASE_DIR
 
     # Find all files matching pattern *_pivot_features.xlsx
     pivot_files = list(base_dir.glob("*_pivot_features.xlsx"))
@@ -47,6 +56,7 @@ def find_latest_pivot_file(base_dir: Path = None):
     return latest_file, date_label
 
 
+@timed
 def load_mf_data(path: Path = None):
     """Load mutual fund data from latest pivot file"""
     if path is None:
@@ -57,7 +67,7 @@ def load_mf_data(path: Path = None):
         match = re.match(r'([A-Za-z]+\d+)_pivot_features\.xlsx', path.name)
         date_label = match.group(1) if match else "Unknown"
 
-    df = pd.read_excel(path, sheet_name="Summary Data")
+    df = load_pivot_summary(path)
     return df, date_label
 
 
@@ -100,121 +110,122 @@ def get_all_bb_cols_sorted(df: pd.DataFrame):
     return sorted(bb_cols, key=parse_date)
 
 
-def get_symbol_bb_aggregated(df: pd.DataFrame, symbol: str, latest_col: str, prev_col: str):
-    """Get BB value for a symbol (per-symbol, same across all fund families)"""
-    symbol_df = df[df['Symbol'] == symbol]
-
-    if len(symbol_df) == 0:
-        return None, None
-
-    # BB values are per-symbol (same across all fund families), so just take first value
-    latest_val = symbol_df[latest_col].iloc[0] if latest_col in symbol_df.columns and len(symbol_df) > 0 else None
-    prev_val = symbol_df[prev_col].iloc[0] if prev_col and prev_col in symbol_df.columns and len(symbol_df) > 0 else None
-
-    return latest_val, prev_val
-
-
-def get_symbol_bb_last_3(df: pd.DataFrame, symbol: str, bb_cols_sorted: list):
-    """Get last 3 BB values for a symbol"""
-    symbol_df = df[df['Symbol'] == symbol]
+class BBIndex(NamedTuple):
+    """
+    Per-symbol BB values as a dense matrix
+    - cols: bb_ columns in chronological order
+    - values: int8 matrix (symbols x cols); missing cells hold 0
+    - present: bool matrix marking cells that had a value
+    - row_of: symbol -> matrix row (first occurrence in the pivot)
+    """
+    cols: list
+    values: np.ndarray
+    present: np.ndarray
+    row_of: dict
 
-    if len(symbol_df) == 0:
-        return []
 
-    # Get last 3 columns
-    last_3_cols = bb_cols_sorted[-3:] if len(bb_cols_sorted) >= 3 else bb_cols_sorted
+def build_bb_index(df: pd.DataFrame, bb_cols_sorted: list = None) -> BBIndex:
+    """Dedup the pivot by Symbol once so per-symbol BB lookups are O(1)"""
+    if bb_cols_sorted is None:
+        bb_cols_sorted = get_all_bb_cols_sorted(df)
+    cols = [c for c in bb_cols_sorted if c in df.columns]
 
-    values = []
-    for col in last_3_cols:
-        if col in symbol_df.columns and len(symbol_df) > 0:
-            val = symbol_df[col].iloc[0]
-            if pd.notna(val):
-                values.append(int(val))
+    # BB values are per-symbol (same across all fund families), so the first row is enough
+    first = df.drop_duplicates("Symbol", keep="first")
+    raw = first[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    present = ~np.isnan(raw)
+    filled = np.where(present, raw, 0)
+    dtype = np.int8 if (filled.size == 0 or (filled.min() >= -128 and filled.max() <= 127)) else np.int16
+    values = np.trunc(filled).astype(dtype)
 
-    return values
+    row_of = {sym: i for i, sym in enumerate(first["Symbol"].tolist())}
+    return BBIndex(cols, values, present, row_of)
 
 
-def build_mf_theme_table(mf_df: pd.DataFrame, latest_col: str, prev_col: str,
-                         selected_themes: list, theme_map: pd.DataFrame,
-                         portfolio_symbols: set):
-    """
-    Build MF table matching the theme structure from Ranks tab
-    Shows last 3 BB values by theme (comma-separated in brackets)
+def build_mf_rows(bb_index: BBIndex, selected_themes: list, theme_map: pd.DataFrame,
+                  portfolio_symbols: set):
     """
+    Build MF rows (last 3 BB values per symbol, split into portfolio / others) for each theme
+    Shared by the Streamlit apps and the static builders
 
-    if latest_col is None:
-        return []
-
-    # Get all BB columns sorted chronologically
-    bb_cols_sorted = get_all_bb_cols_sorted(mf_df)
+    Each row also carries "Records": one dict per symbol in display order
+    ({"symbol", "bb", "portfolio", "html"}) for the combined view to join on.
+    """
+    theme_index = build_theme_index(theme_map)
+    last_values = bb_index.values[:, -3:]
+    last_present = bb_index.present[:, -3:]
 
     rows = []
-
     for theme in selected_themes:
-        # Get all symbols for this theme
-        theme_symbols = theme_map[theme_map['Theme'] == theme]['Symbol'].unique()
-
         portfolio_cells = []
         other_cells = []
+        records = []
+
+        for symbol in symbols_of_theme(theme_index, theme):
+            row = bb_index.row_of.get(symbol)
+            if row is None or not last_present[row].any():
+                continue
 
-        for symbol in theme_symbols:
-            # Get last 3 BB values
-            bb_last_3 = get_symbol_bb_last_3(mf_df, symbol, bb_cols_sorted)
+            bb_last_3 = [int(v) for v, ok in zip(last_values[row], last_present[row]) if ok]
 
-            if bb_last_3:
-                # Build display string: "SYMBOL (value1, value2, value3)" with spaces after commas
-                bb_text = f"{symbol} ({', '.join(map(str, bb_last_3))})"
+            # Build display string: "SYMBOL (value1, value2, value3)" with spaces after commas
+            bb_text = f"{symbol} ({', '.join(map(str, bb_last_3))})"
 
-                # Separate portfolio vs others
-                if symbol in portfolio_symbols:
-                    portfolio_cells.append(bb_text)
-                else:
-                    other_cells.append(bb_text)
+            # Separate portfolio vs others
+            is_portfolio = symbol in portfolio_symbols
+            if is_portfolio:
+                portfolio_cells.append(bb_text)
+            else:
+                other_cells.append(bb_text)
+            records.append({"symbol": symbol, "bb": bb_last_3, "portfolio": is_portfolio, "html": bb_text})
 
         row = {
             "Theme": theme,
             "Portfolio": "<br/>".join(portfolio_cells),
-            "Others": "<br/>".join(other_cells)
+            "Others": "<br/>".join(other_cells),
+            "Records": records,
         }
         rows.append(row)
 
     return rows
 
 
-def render_mf_theme_table(rows, latest_date_str: str = "Dec 2025"):
-    """Render MF theme table as HTML - matching Ranks tab layout"""
+@timed
+def build_mf_theme_table(mf_df: pd.DataFrame, latest_col: str, prev_col: str,
+                         selected_themes: list, theme_map: pd.DataFrame,
+                         portfolio_symbols: set):
+    """
+    Build MF table matching the theme structure from Ranks tab
+    Shows last 3 BB values by theme (comma-separated in brackets)
+    """
 
-    cols = ["Theme", "Portfolio", "Others"]
+    if latest_col is None:
+        return []
 
-    colgroup = (
-        "<colgroup>"
-        "<col style='width:14%'>"
-        "<col style='width:43%'>"
-        "<col style='width:43%'>"
-        "</colgroup>"
-    )
+    bb_index = build_bb_index(mf_df)
+    return build_mf_rows(bb_index, selected_themes, theme_map, portfolio_symbols)
 
-    head_cells = "".join(f"<th>{c}</th>" for c in cols)
-    body_rows = []
 
-    for r in rows:
-        theme = r.get("Theme", "")
-        portfolio = r.get("Portfolio", "")
-        others = r.get("Others", "")
-
-        cells = [
-            f"<td class='col-theme'>{theme}</td>",
-            f"<td class='col-bb'>{portfolio}</td>",
-            f"<td class='col-bb'>{others}</td>",
-        ]
-        body_rows.append("<tr>" + "".join(cells) + "</tr>")
-
-    html = (
+_MF_HEAD = (
+    "<table class='tp-table'>"
+    "<colgroup><col style='width:14%'><col style='width:43%'><col style='width:43%'></colgroup>"
+    "<thead><tr><th>Theme</th><th>Portfolio</th><th>Others</th></tr></thead><tbody>"
+)
+_MF_ROW = "<tr><td class='col-theme'>{}</td><td class='col-bb'>{}</td><td class='col-bb'>{}</td></tr>"
+
+
+def iter_mf_theme_table(rows, latest_date_str: str = "Dec 2025"):
+    """render_mf_theme_table as fragments (one per row), for html_stream.write_fragments"""
+    yield (
         f"<div style='margin:4px 0 8px 0;color:#666;font-size:12px;'>Mutual Fund BB Signals - {latest_date_str}</div>"
-        "<table class='tp-table'>"
-        f"{colgroup}"
-        f"<thead><tr>{head_cells}</tr></thead>"
-        f"<tbody>{''.join(body_rows)}</tbody>"
-        "</table>"
+        + _MF_HEAD
     )
-    return html
+    for r in rows:
+        yield _MF_ROW.format(r.get("Theme", ""), r.get("Portfolio", ""), r.get("Others", ""))
+    yield "</tbody></table>"
+
+
+@timed
+def render_mf_theme_table(rows, latest_date_str: str = "Dec 2025"):
+    """Render MF theme table as HTML - matching Ranks tab layout"""
+    return "".join(iter_mf_theme_table(rows, latest_date_str))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Pivot Features Store
+Materializes the 'Summary Data' sheet of *_pivot_features.xlsx into a typed Parquet file
+next to the workbook, and loads it in preference to re-parsing the XLSX
+
+Needs pyarrow (requirements.txt); without it the store is never written and
+every load parses the XLSX
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from spans import timed
+
+SUMMARY_SHEET = "Summary Data"
+STORE_SUFFIX = ".parquet"
+# Parquet schema metadata key holding the size / mtime of the XLSX the store was built from
+SOURCE_KEY = b"themes_source"
+
+CATEGORY_COLS = ["Symbol", "FundFamily"]
+SCORE_COLS = ["FundQuality", "BBFlags", "Impact", "RankProgression"]
+
+# Directories scanned by the converter CLI when none are given
+DEFAULT_PIVOT_DIRS = [
+    Path("/Users/raviaranke/Desktop/themes"),
+    Path(__file__).parent / "data" / "final",
+    Path(__file__).parent / "docs" / "data" / "final",
+]
+
+
+def store_path_for(pivot_path: Path) -> Path:
+    """Jan26_pivot_features.xlsx -> Jan26_pivot_features.parquet"""
+    return Path(pivot_path).with_suffix(STORE_SUFFIX)
+
+
+def _small_int_dtype(s: pd.Series) -> str:
+    """Smallest integer dtype holding the column; nullable when it has gaps"""
+    lo, hi = s.min(), s.max()
+    if pd.isna(lo) or (lo >= np.iinfo(np.int8).min and hi <= np.iinfo(np.int8).max):
+        width = "8"
+    elif lo >= np.iinfo(np.int16).min and hi <= np.iinfo(np.int16).max:
+        width = "16"
+    else:
+        width = "32"
+    return f"Int{width}" if s.isna().any() else f"int{width}"
+
+
+def typed_pivot(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compact dtypes for a Summary Data frame:
+    - Symbol / FundFamily as categoricals
+    - tv_ / i_ / p_ stay float64 (float32 loses paise above ~1e5)
+    - bb_ and the score columns (Impact, FundQuality, ...) as int8 (nullable where needed)
+    """
+    df = df.copy()
+    for col in df.columns:
+        name = str(col)
+        if name in CATEGORY_COLS:
+            df[col] = df[col].astype("category")
+        elif name.startswith("bb_") or name in SCORE_COLS:
+            s = pd.to_numeric(df[col], errors="coerce")
+            df[col] = s.round().astype(_small_int_dtype(s))
+        elif name.startswith(("tv_", "i_", "p_")):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def _source_stamp(pivot_path: Path) -> dict:
+    stat = Path(pivot_path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _write_store(df: pd.DataFrame, pivot_path: Path, out_path: Path):
+    """Write the store through a tmp file, stamped with the source XLSX's size / mtime"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCE_KEY] = json.dumps(_source_stamp(pivot_path)).encode("utf-8")
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    pq.write_table(table.replace_schema_metadata(metadata), tmp)
+    tmp.replace(out_path)
+
+
+def convert_pivot(pivot_path: Path, out_path: Path = None) -> Path:
+    """Convert one *_pivot_features.xlsx into its typed Parquet store"""
+    pivot_path = Path(pivot_path)
+    out_path = Path(out_path) if out_path else store_path_for(pivot_path)
+    df = typed_pivot(pd.read_excel(pivot_path, sheet_name=SUMMARY_SHEET))
+    _write_store(df, pivot_path, out_path)
+    return out_path
+
+
+def _store_is_fresh(pivot_path: Path, store_path: Path) -> bool:
+    """
+    The store matches the XLSX's current size and mtime. Compared for equality,
+    so a pivot replaced by a copy with an older mtime (cp -p, rsync, git
+    checkout) is not served from the old store.
+    """
+    if not store_path.exists():
+        return False
+    if not pivot_path.exists():
+        return True
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(store_path).metadata or {}
+        return json.loads(metadata[SOURCE_KEY]) == _source_stamp(pivot_path)
+    except (ImportError, OSError, KeyError, ValueError):
+        return False
+
+
+@timed
+def load_pivot_summary(pivot_path: Path) -> pd.DataFrame:
+    """
+    Load the Summary Data sheet of a pivot file
+
+    Reads the typed Parquet store when it was built from the XLSX as it is now.
+    Otherwise parses the XLSX and materializes the store for next time
+    (best effort: skipped when pyarrow is missing or the directory is read-only).
+    """
+    pivot_path = Path(pivot_path)
+    store_path = store_path_for(pivot_path)
+
+    if _store_is_fresh(pivot_path, store_path):
+        return pd.read_parquet(store_path)
+
+    df = typed_pivot(pd.read_excel(pivot_path, sheet_name=SUMMARY_SHEET))
+    try:
+        _write_store(df, pivot_path, store_path)
+    except (ImportError, OSError):
+        pass
+    return df
+
+
+def main():
+    dirs = [Path(p) for p in sys.argv[1:]] or [d for d in DEFAULT_PIVOT_DIRS if d.exists()]
+
+    print("=" * 60)
+    print("CONVERTING PIVOT FILES")
+    print("=" * 60)
+
+    converted = 0
+    for d in dirs:
+        print(f"\n{d}")
+        for f in sorted(d.glob("*_pivot_features.xlsx")):
+            # Skip temp files
+            if f.name.startswith("~$") or not re.match(r'[A-Za-z]+\d+_pivot_features\.xlsx', f.name):
+                continue
+            out = store_path_for(f)
+            if _store_is_fresh(f, out):
+                print(f"   = {out.name} (up to date)")
+                continue
+            convert_pivot(f, out)
+            size_in = f.stat().st_size / (1024 * 1024)
+            size_out = out.stat().st_size / (1024 * 1024)
+            print(f"   ✓ {out.name} ({size_in:.1f}MB -> {size_out:.1f}MB)")
+            converted += 1
+
+    print(f"\n✓ Converted {converted} pivot files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Rank History Cube
+Ingests every out_DD-Mon-YY.csv in an eom_price directory into one dense
+symbol x date structured array (rank_history.npy, memory-mappable) with a JSON
+sidecar holding the symbol / file labels, so any current / previous pair is a
+column slice instead of two CSV parses
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+CUBE_FILE = "rank_history.npy"
+META_FILE = "rank_history.json"
+
+# ptile is 1..100; -1 marks a symbol whose row has no ptile
+PTILE_MISSING = -1
+
+PERCENTILE_COLS = [
+    "Percentile_52w_Index",
+    "Percentile_Return_6months",
+    "Percentile_Return_1year",
+    "Total_Percentile_Score",
+]
+
+# One cell per (symbol, snapshot); "present" is False when the symbol is not in that file
+RANK_DTYPE = np.dtype(
+    [("present", "?"), ("ptile", "i2"), ("cmp", "f8"), ("ff_mcap", "f8")]
+    + [(col, "f4") for col in PERCENTILE_COLS]
+)
+
+# Directories scanned by the builder CLI when none are given
+DEFAULT_RANK_DIRS = [
+    Path("/Users/raviaranke/Desktop/code2026/data/r_outputs/eom_price"),
+    Path(__file__).parent / "data" / "eom_price",
+    Path(__file__).parent / "docs" / "data" / "eom_price",
+]
+
+MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
+
+
+class RankHistory(NamedTuple):
+    symbols: list     # row labels (upper-cased)
+    files: list       # column labels (file names), oldest first
+    dates: list       # (year, month, day) per column
+    data: np.ndarray  # RANK_DTYPE, shape (len(symbols), len(files))
+    row_of: dict      # symbol -> row
+    col_of: dict      # file name -> column
+
+
+def rank_file_date(filename: str):
+    """
+    out_13-Feb-26.csv -> (2026, 2, 13), matching the month on its first three
+    letters (out_30-Sept-25.csv is September); None when the name or month is
+    not recognised. Every rank file list uses this, so they agree with the cube.
+    """
+    match = re.match(r'out_(\d+)-([A-Za-z]+)-(\d+)\.csv', filename)
+    if not match:
+        return None
+    month = MONTHS.get(match.group(2)[:3].title())
+    if month is None:
+        return None
+    return (int('20' + match.group(3)), month, int(match.group(1)))
+
+
+def _rank_files(rank_dir: Path):
+    files = [(f, rank_file_date(f.name)) for f in Path(rank_dir).glob("out_*.csv")]
+    return sorted([(f, d) for f, d in files if d], key=lambda x: x[1])
+
+
+def _stamps(files):
+    return {f.name: [f.stat().st_size, f.stat().st_mtime_ns] for f, _ in files}
+
+
+def rank_stamps(rank_dir: Path) -> dict:
+    """{file name: [size, mtime_ns]} of the rank CSVs the cube for rank_dir is built from"""
+    return _stamps(_rank_files(rank_dir))
+
+
+def build_rank_history(rank_dir: Path) -> RankHistory:
+    """Read every rank CSV once into the symbol x date cube"""
+    files = _rank_files(rank_dir)
+    for f in sorted(Path(rank_dir).glob("out_*.csv")):
+        if rank_file_date(f.name) is None:
+            print(f"Warning: skipping {f.name} (unrecognised date)")
+
+    frames = []
+    for j, (f, _) in enumerate(files):
+        df = pd.read_csv(f)
+        df["symbol"] = df["symbol"].str.strip().str.upper()
+        # A repeated symbol keeps its last row, as the dict-building loaders did
+        df = df.dropna(subset=["symbol"]).drop_duplicates("symbol", keep="last")
+        cols = ["symbol", "ptile", "cmp", "ff_mcap"] + [c for c in PERCENTILE_COLS if c in df.columns]
+        frames.append(df[cols].assign(col=j))
+
+    long = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["symbol", "col"])
+    symbols = sorted(long["symbol"].unique())
+    row_of = {s: i for i, s in enumerate(symbols)}
+
+    data = np.zeros((len(symbols), len(files)), dtype=RANK_DTYPE)
+    data["ptile"] = PTILE_MISSING
+    for name in RANK_DTYPE.names[2:]:
+        data[name] = np.nan
+
+    rows = long["symbol"].map(row_of).to_numpy()
+    cols = long["col"].to_numpy()
+    data["present"][rows, cols] = True
+    ptile = pd.to_numeric(long["ptile"], errors="coerce")
+    data["ptile"][rows, cols] = ptile.fillna(PTILE_MISSING).astype("int16").to_numpy()
+    for name in RANK_DTYPE.names[2:]:
+        if name in long.columns:
+            data[name][rows, cols] = pd.to_numeric(long[name], errors="coerce").to_numpy()
+
+    return RankHistory(
+        symbols=symbols,
+        files=[f.name for f, _ in files],
+        dates=[d for _, d in files],
+        data=data,
+        row_of=row_of,
+        col_of={f.name: j for j, (f, _) in enumerate(files)},
+    )
+
+
+def save_rank_history(history: RankHistory, rank_dir: Path, stamps: dict = None):
+    rank_dir = Path(rank_dir)
+    cube_path, meta_path = rank_dir / CUBE_FILE, rank_dir / META_FILE
+    if stamps is None:
+        stamps = _stamps(_rank_files(rank_dir))
+
+    tmp = cube_path.with_suffix(".tmp.npy")
+    np.save(tmp, history.data)
+    tmp.replace(cube_path)
+    meta = {
+        "symbols": history.symbols,
+        "files": history.files,
+        "dates": history.dates,
+        "stamps": stamps,
+    }
+    tmp = meta_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(meta))
+    tmp.replace(meta_path)
+
+
+def load_rank_history(rank_dir: Path) -> RankHistory:
+    """
+    Load the cube for rank_dir, memory-mapped
+
+    Rebuilt when any rank CSV was added, removed or modified since it was written
+    (and saved again, best effort: skipped when the directory is read-only).
+    """
+    rank_dir = Path(rank_dir)
+    cube_path, meta_path = rank_dir / CUBE_FILE, rank_dir / META_FILE
+    stamps = rank_stamps(rank_dir)
+
+    if cube_path.exists() and meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta.get("stamps") == stamps:
+            return RankHistory(
+                symbols=meta["symbols"],
+                files=meta["files"],
+                dates=[tuple(d) for d in meta["dates"]],
+                data=np.load(cube_path, mmap_mode="r"),
+                row_of={s: i for i, s in enumerate(meta["symbols"])},
+                col_of={f: j for j, f in enumerate(meta["files"])},
+            )
+
+    history = build_rank_history(rank_dir)
+    try:
+        save_rank_history(history, rank_dir, stamps)
+    except OSError:
+        pass
+    return history
+
+
+def rank_slice(history: RankHistory, filename: str) -> np.ndarray:
+    """One snapshot as a structured column (indexed like history.symbols)"""
+    return history.data[:, history.col_of[filename]]
+
+
+def rank_pair(history: RankHistory, current_file: str, prev_file: str):
+    """(current, previous) snapshot columns"""
+    return rank_slice(history, current_file), rank_slice(history, prev_file)
+
+
+def rank_records(history: RankHistory, filename: str) -> dict:
+    """
+    {symbol: {'ptile', 'cmp', 'mcap'}} for one snapshot - the shape the rank
+    table builders take (ptile None where the CSV row had none)
+    """
+    col = rank_slice(history, filename)
+    rows = np.flatnonzero(col["present"])
+    ptile, cmp, mcap = col["ptile"][rows], col["cmp"][rows], col["ff_mcap"][rows]
+    return {
+        history.symbols[i]: {
+            'ptile': int(p) if p != PTILE_MISSING else None,
+            'cmp': float(c),
+            'mcap': float(m),
+        }
+        for i, p, c, m in zip(rows, ptile, cmp, mcap)
+    }
+
+
+def main():
+    dirs = [Path(p) for p in sys.argv[1:]] or [d for d in DEFAULT_RANK_DIRS if d.exists()]
+
+    print("=" * 60)
+    print("BUILDING RANK HISTORY")
+    print("=" * 60)
+
+    for d in dirs:
+        history = build_rank_history(d)
+        save_rank_history(history, d)
+        size = (d / CUBE_FILE).stat().st_size / 1024
+        print(f"   ✓ {d / CUBE_FILE}: {len(history.symbols)} symbols x {len(history.files)} snapshots ({size:.0f}KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot cache for PF_Ranks.xlsx sheets
+Parses each sheet through openpyxl once and serves later reads from a columnar copy
+keyed on the workbook's content hash
+"""
+
+import datetime as dt
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from spans import timed
+
+CACHE_DIR = Path(os.getenv("THEMES_CACHE_DIR", Path(__file__).parent / ".cache"))
+SHEET_CACHE_DIR = CACHE_DIR / "sheets"
+HASH_INDEX_FILE = CACHE_DIR / "workbook_hashes.json"
+
+# Sheets every entry point reads from PF_Ranks.xlsx
+CACHED_SHEETS = ("PF_Ranks", "theme_park", "tpark_codex")
+
+_hash_memo = {}
+
+
+def _load_hash_index():
+    if HASH_INDEX_FILE.exists():
+        try:
+            return json.loads(HASH_INDEX_FILE.read_text())
+        except ValueError:
+            return {}
+    return {}
+
+
+def _save_hash_index(index):
+    HASH_INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = HASH_INDEX_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index, indent=2))
+    os.replace(tmp, HASH_INDEX_FILE)
+
+
+def file_hash(path) -> str:
+    """
+    Content hash (sha1) of a file
+
+    The hash is only recomputed when the file's size or mtime changes, so an
+    unchanged workbook costs a single stat() call.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    key = str(path)
+
+    memo = _hash_memo.get(key)
+    if memo and memo[0] == stamp:
+        return memo[1]
+
+    index = _load_hash_index()
+    entry = index.get(key)
+    if entry and entry.get("stamp") == stamp:
+        digest = entry["sha1"]
+    else:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        index[key] = {"stamp": stamp, "sha1": digest}
+        _save_hash_index(index)
+
+    _hash_memo[key] = (stamp, digest)
+    return digest
+
+
+def _encode_label(label):
+    """Column labels include datetimes (rank dates), which Parquet cannot store as names"""
+    if isinstance(label, (pd.Timestamp, dt.datetime)):
+        return {"t": "datetime", "v": label.isoformat()}
+    if isinstance(label, dt.date):
+        return {"t": "date", "v": label.isoformat()}
+    if isinstance(label, bool):
+        return {"t": "str", "v": str(label)}
+    if isinstance(label, int):
+        return {"t": "int", "v": label}
+    if isinstance(label, float):
+        return {"t": "float", "v": label}
+    return {"t": "str", "v": str(label)}
+
+
+def _decode_label(entry):
+    t, v = entry["t"], entry["v"]
+    if t == "datetime":
+        return dt.datetime.fromisoformat(v)
+    if t == "date":
+        return dt.date.fromisoformat(v)
+    return v
+
+
+def _cache_paths(digest: str, sheet_name: str):
+    stem = f"{digest[:20]}_{sheet_name}"
+    return (
+        SHEET_CACHE_DIR / f"{stem}.parquet",
+        SHEET_CACHE_DIR / f"{stem}.pkl",
+        SHEET_CACHE_DIR / f"{stem}.json",
+    )
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+def _prune_superseded(source: str, digest: str):
+    """Drop the snapshots of earlier versions (other digests) of the workbook at source"""
+    for meta_path in SHEET_CACHE_DIR.glob("*.json"):
+        if meta_path.name.startswith(digest[:20]):
+            continue
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            continue
+        if meta.get("source") != source:
+            continue
+        # Meta first, so a partial prune never leaves meta pointing at missing data
+        meta_path.unlink(missing_ok=True)
+        for data_path in _cache_paths(meta_path.stem[:20], meta.get("sheet", ""))[:2]:
+            data_path.unlink(missing_ok=True)
+
+
+def _write_snapshot(df: pd.DataFrame, digest: str, sheet_name: str, source: str = None):
+    """
+    Data is written first and the meta file last, each through a tmp file and
+    os.replace, so a meta file only ever describes complete data
+    """
+    parquet_path, pickle_path, meta_path = _cache_paths(digest, sheet_name)
+    SHEET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    labels = [_encode_label(c) for c in df.columns]
+    flat = df.copy()
+    flat.columns = [f"c{i}" for i in range(len(df.columns))]
+
+    fmt = "parquet"
+    tmp = _tmp_path(parquet_path)
+    try:
+        flat.to_parquet(tmp, index=False)
+        os.replace(tmp, parquet_path)
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        # pyarrow missing, or a mixed-type column (e.g. dates and notes in one column)
+        tmp.unlink(missing_ok=True)
+        parquet_path.unlink(missing_ok=True)
+        tmp = _tmp_path(pickle_path)
+        flat.to_pickle(tmp)
+        os.replace(tmp, pickle_path)
+        fmt = "pickle"
+
+    meta = {"sheet": sheet_name, "format": fmt, "columns": labels, "source": source}
+    tmp = _tmp_path(meta_path)
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, meta_path)
+
+    if source:
+        _prune_superseded(source, digest)
+
+
+def _read_snapshot(digest: str, sheet_name: str):
+    parquet_path, pickle_path, meta_path = _cache_paths(digest, sheet_name)
+    if not meta_path.exists():
+        return None
+
+    meta = json.loads(meta_path.read_text())
+    if meta["format"] == "parquet" and parquet_path.exists():
+        df = pd.read_parquet(parquet_path)
+        # Parquet stores missing strings as None; keep NaN so astype(str) still yields "nan"
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].where(df[col].notna(), float("nan"))
+    elif meta["format"] == "pickle" and pickle_path.exists():
+        df = pd.read_pickle(pickle_path)
+    else:
+        return None
+
+    df.columns = [_decode_label(c) for c in meta["columns"]]
+    return df
+
+
+@timed
+def read_sheet(path, sheet_name: str) -> pd.DataFrame:
+    """
+    Drop-in replacement for pd.read_excel(path, sheet_name=...)
+
+    Serves the sheet from the snapshot cache when the workbook is unchanged,
+    otherwise parses it once and stores the snapshot for later reads.
+    """
+    digest = file_hash(path)
+    df = _read_snapshot(digest, sheet_name)
+    if df is None:
+        df = pd.read_excel(path, sheet_name=sheet_name)
+        _write_snapshot(df, digest, sheet_name, source=str(Path(path).resolve()))
+    return df
+
+
+def warm_cache(path, sheets=CACHED_SHEETS):
+    """Snapshot every cached sheet present in the workbook"""
+    available = set(pd.ExcelFile(path).sheet_names)
+    for sheet in sheets:
+        if sheet in available:
+            read_sheet(path, sheet)
+    return [s for s in sheets if s in available]
+
+
+def main():
+    from app import DATA_PATH_DEFAULT
+
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DATA_PATH_DEFAULT
+    print(f"Snapshotting {path}...")
+    sheets = warm_cache(path)
+    print(f"✓ Cached sheets: {', '.join(sheets)}")
+    print(f"✓ Cache directory: {SHEET_CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Step Timing
+Spans (context manager / decorator) recording wall time, CPU time, peak RSS and
+row counts per step. Off unless THEMES_PROFILE names a report directory; each
+entry point then writes <script>-<timestamp>.json there on exit, plus a Chrome
+trace (chrome://tracing, ui.perfetto.dev) when THEMES_TRACE is set
+
+Usage: THEMES_PROFILE=profiles THEMES_TRACE=1 python export_static.py
+"""
+
+import datetime as dt
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_ENV = "THEMES_PROFILE"
+TRACE_ENV = "THEMES_TRACE"
+
+_origin = time.perf_counter()
+_records = []
+_local = threading.local()
+
+
+class SpanRecord(NamedTuple):
+    name: str
+    depth: int           # nesting level (0 for the entry point)
+    start_s: float       # since the module was imported
+    wall_s: float
+    cpu_s: float         # process CPU time, all threads
+    peak_rss_mb: float   # process peak so far, at the end of the span (None without resource)
+    rows: int            # set by the step (None when it has no row count)
+    thread: int
+
+
+def enabled() -> bool:
+    return bool(os.getenv(PROFILE_ENV))
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KB on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def span(name: str, rows: int = None):
+    """
+    Time the enclosed block as one step. Yields a dict; set its "rows" to
+    record how many rows the step produced.
+    """
+    info = {"rows": rows}
+    if not enabled():
+        yield info
+        return
+
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    start, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield info
+    finally:
+        end = time.perf_counter()
+        _local.depth = depth
+        _records.append(SpanRecord(
+            name=name,
+            depth=depth,
+            start_s=round(start - _origin, 6),
+            wall_s=round(end - start, 6),
+            cpu_s=round(time.process_time() - cpu, 6),
+            peak_rss_mb=peak_rss_mb(),
+            rows=info["rows"],
+            thread=threading.get_ident(),
+        ))
+
+
+def _row_count(result):
+    """len() of a frame / series / list result (HTML strings, tuples and dicts have none)"""
+    if isinstance(result, (str, bytes, tuple, dict)) or not hasattr(result, "__len__"):
+        return None
+    return len(result)
+
+
+def timed(fn=None, *, name: str = None):
+    """
+    Decorator form of span, named module.function unless name is given.
+    The row count is taken from the result when it is a frame, series or list.
+    """
+    def decorate(func):
+        module = func.__module__
+        if module == "__main__":
+            module = Path(sys.argv[0]).stem
+        label = name or f"{module}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with span(label) as info:
+                result = func(*args, **kwargs)
+                info["rows"] = _row_count(result)
+            return result
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
+
+
+def build_report(script: str, records: list) -> dict:
+    """Spans in start order plus per-name totals (calls, wall, CPU, rows)"""
+    totals = {}
+    for r in records:
+        t = totals.setdefault(r.name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": None})
+        t["calls"] += 1
+        t["wall_s"] = round(t["wall_s"] + r.wall_s, 6)
+        t["cpu_s"] = round(t["cpu_s"] + r.cpu_s, 6)
+        if r.rows is not None:
+            t["rows"] = (t["rows"] or 0) + r.rows
+    return {
+        "script": script,
+        "pid": os.getpid(),
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "peak_rss_mb": peak_rss_mb(),
+        "spans": [r._asdict() for r in sorted(records, key=lambda r: r.start_s)],
+        "totals": dict(sorted(totals.items(), key=lambda kv: -kv[1]["wall_s"])),
+    }
+
+
+def chrome_trace(records: list) -> dict:
+    """Complete ("X") events in microseconds, one track per thread"""
+    pid = os.getpid()
+    return {
+        "traceEvents": [
+            {
+                "name": r.name,
+                "ph": "X",
+                "ts": round(r.start_s * 1e6),
+                "dur": round(r.wall_s * 1e6),
+                "pid": pid,
+                "tid": r.thread,
+                "args": {"cpu_s": r.cpu_s, "peak_rss_mb": r.peak_rss_mb, "rows": r.rows},
+            }
+            for r in sorted(records, key=lambda r: r.start_s)
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+
+def write_report(script: str):
+    """Write the spans recorded so far (nothing unless THEMES_PROFILE is set)"""
+    if not enabled() or not _records:
+        return None
+    out_dir = Path(os.getenv(PROFILE_ENV))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{script}-{dt.datetime.now():%Y%m%d-%H%M%S}"
+
+    report = build_report(script, _records)
+    path = out_dir / f"{stem}.json"
+    path.write_text(json.dumps(report, indent=2))
+    print(f"\nProfile: {path}")
+    for step, t in list(report["totals"].items())[:10]:
+        rows = f"  {t['rows']} rows" if t["rows"] is not None else ""
+        print(f"   {step:45s} {t['wall_s'] * 1000:9.1f}ms  cpu {t['cpu_s'] * 1000:9.1f}ms  x{t['calls']}{rows}")
+
+    if os.getenv(TRACE_ENV):
+        trace_path = out_dir / f"{stem}.trace.json"
+        trace_path.write_text(json.dumps(chrome_trace(_records)))
+        print(f"Trace: {trace_path}")
+    return path
+
+
+@contextmanager
+def profiled(script: str):
+    """Entry point wrapper: one root span around the run, report written on exit"""
+    try:
+        with span(script):
+            yield
+    finally:
+        write_report(script)
+        _records.clear()
@@ -2,6 +2,9 @@
 import pandas as pd
 from pathlib import Path
 
+from spans import profiled, timed
+from stage_common import build_final_2col, write_artifacts
+
 BASE = Path('/Users/raviaranke/Desktop/themes')
 IN_FULL = BASE / 'stage21_source_informed_first_principles_full.csv'
 IN_META = BASE / 'stage22_trendlyne_review_metadata.csv'
@@ -141,28 +144,10 @@ def append_source_tag(src: str, tag: str) -> str:
     return '|'.join(parts)
 
 
-def sort_themes(df: pd.DataFrame) -> list[str]:
-    present = sorted(df['Theme'].dropna().unique().tolist())
-    if IN_ORDER.exists():
-        order_df = pd.read_csv(IN_ORDER)
-        order_map = {t: i for i, t in enumerate(order_df['Theme'].dropna().tolist())}
-        return sorted(present, key=lambda t: (order_map.get(t, 10_000), t))
-    return present
-
-
-def build_final_2col(df: pd.DataFrame) -> pd.DataFrame:
-    rows = []
-    for theme in sort_themes(df):
-        syms = sorted(df.loc[df['Theme'] == theme, 'Symbol'].dropna().astype(str).unique().tolist())
-        for sym in syms:
-            rows.append({'Symbol': sym, 'Theme': theme})
-        rows.append({'Symbol': pd.NA, 'Theme': pd.NA})
-    return pd.DataFrame(rows, columns=['Symbol', 'Theme'])
-
-
-def main() -> None:
-    df = pd.read_csv(IN_FULL)
-    meta = pd.read_csv(IN_META)
+@timed
+def run(full: pd.DataFrame, meta: pd.DataFrame) -> dict:
+    """Apply OVERRIDES to the stage21 frame; returns {output path: frame or summary text}"""
+    df = full.copy()
 
     meta_cols = ['Symbol', 'company_name', 'sector', 'industry', 'brokers', 'motilal_present', 'trendlyne_post_url', 'trendlyne_stock_url', 'descriptions']
     meta = meta[meta_cols].drop_duplicates('Symbol')
@@ -226,28 +211,19 @@ def main() -> None:
     if 'needs_review' in df.columns:
         df['needs_review'] = df['needs_review'].fillna(False).astype(bool)
 
-    # Save full output
-    df.to_csv(OUT_FULL, index=False)
-
-    # Save change logs
     changes = pd.DataFrame(change_rows).sort_values(['new_theme', 'Symbol'])
-    changes.to_csv(OUT_CHANGES, index=False)
-    changes.to_csv(OUT_EVIDENCE, index=False)
 
-    # Save 2-col final with blank separator rows after each theme
-    final_2col = build_final_2col(df)
-    final_2col.to_csv(OUT_FINAL_2COL, index=False)
+    # 2-col final with blank separator rows after each theme
+    final_2col = build_final_2col(df[['Symbol', 'Theme']], IN_ORDER)
 
-    # Save high-confidence and review-queue files
+    # High-confidence and review-queue files
     high_conf = df[~df['needs_review']][['Symbol', 'Theme']].sort_values(['Theme', 'Symbol'])
-    high_conf.to_csv(OUT_HIGH_CONF, index=False)
 
     review = df[df['needs_review']].copy()
     if 'review_priority' in review.columns:
         review = review.sort_values(['review_priority', 'Symbol'], ascending=[False, True])
     else:
         review = review.sort_values(['Symbol'])
-    review.to_csv(OUT_REVIEW, index=False)
 
     # Summary
     theme_sizes = df.groupby('Theme')['Symbol'].nunique().sort_values(ascending=False)
@@ -255,7 +231,7 @@ def main() -> None:
     summary = []
     summary.append('# Stage22 Reports Overlay Summary')
     summary.append('')
-    summary.append(f'- Input rows: {len(pd.read_csv(IN_FULL))}')
+    summary.append(f'- Input rows: {len(full)}')
     summary.append(f'- Output rows: {len(df)}')
     summary.append(f'- Symbols changed: {len(changes)}')
     summary.append(f'- Themes in output: {df["Theme"].nunique()}')
@@ -270,19 +246,29 @@ def main() -> None:
     summary.append('- Motilal Oswal signal via Trendlyne broker attribution (`motilal_present=True`).')
     summary.append('- Moneycontrol direct scraping was not available in this runtime due access-denied responses; trendlyne-based broker report aggregation was used for this pass.')
 
-    OUT_SUMMARY.write_text('\n'.join(summary), encoding='utf-8')
+    return {
+        OUT_FULL: df,
+        OUT_CHANGES: changes,
+        OUT_EVIDENCE: changes,
+        OUT_FINAL_2COL: final_2col,
+        OUT_HIGH_CONF: high_conf,
+        OUT_REVIEW: review,
+        OUT_SUMMARY: '\n'.join(summary),
+    }
+
+
+def main() -> None:
+    artifacts = run(pd.read_csv(IN_FULL), pd.read_csv(IN_META))
+    write_artifacts(artifacts)
 
-    print(f'Wrote: {OUT_FULL}')
-    print(f'Wrote: {OUT_CHANGES}')
-    print(f'Wrote: {OUT_EVIDENCE}')
-    print(f'Wrote: {OUT_FINAL_2COL}')
-    print(f'Wrote: {OUT_HIGH_CONF}')
-    print(f'Wrote: {OUT_REVIEW}')
-    print(f'Wrote: {OUT_SUMMARY}')
-    print(f'Changed symbols: {len(changes)}')
+    df = artifacts[OUT_FULL]
+    theme_sizes = df.groupby('Theme')['Symbol'].nunique().sort_values(ascending=False)
+    lo_count = int(df['Theme'].astype(str).str.startswith('LO-').sum())
+    print(f'Changed symbols: {len(artifacts[OUT_CHANGES])}')
     print(f'LO remaining: {lo_count}')
     print(f'Max theme size: {int(theme_sizes.max()) if len(theme_sizes) else 0}')
 
 
 if __name__ == '__main__':
-    main()
+    with profiled('stage22'):
+        main()
@@ -2,6 +2,9 @@
 import pandas as pd
 from pathlib import Path
 
+from spans import profiled, timed
+from stage_common import build_final_2col, write_artifacts
+
 BASE = Path('/Users/raviaranke/Desktop/themes')
 IN_FULL = BASE / 'stage22_reports_overlay_full.csv'
 IN_ORDER = BASE / 'theme_order_reference.csv'
@@ -136,26 +139,9 @@ SECONDARY = {
 }
 
 
-def sort_themes(present_themes: list[str]) -> list[str]:
-    if IN_ORDER.exists():
-        order_df = pd.read_csv(IN_ORDER)
-        order_map = {t: i for i, t in enumerate(order_df['Theme'].dropna().tolist())}
-        return sorted(present_themes, key=lambda t: (order_map.get(t, 10_000), t))
-    return sorted(present_themes)
-
-
-def build_final_2col(theme_rows: pd.DataFrame) -> pd.DataFrame:
-    out = []
-    for theme in sort_themes(theme_rows['Theme'].dropna().unique().tolist()):
-        syms = sorted(theme_rows.loc[theme_rows['Theme'] == theme, 'Symbol'].dropna().astype(str).unique().tolist())
-        for sym in syms:
-            out.append({'Symbol': sym, 'Theme': theme})
-        out.append({'Symbol': pd.NA, 'Theme': pd.NA})
-    return pd.DataFrame(out, columns=['Symbol', 'Theme'])
-
-
-def main() -> None:
-    base = pd.read_csv(IN_FULL)
+@timed
+def run(base: pd.DataFrame) -> dict:
+    """Add SECONDARY memberships to the stage22 frame; returns {output path: frame or summary text}"""
     symbol_to_theme = dict(zip(base['Symbol'], base['Theme']))
     all_themes = set(base['Theme'])
 
@@ -180,7 +166,6 @@ def main() -> None:
         })
 
     add_df = pd.DataFrame(additions).sort_values(['SecondaryTheme', 'Symbol'])
-    add_df.to_csv(OUT_ADDITIONS, index=False)
 
     primary_rows = base[['Symbol', 'Theme']].copy()
     primary_rows['membership_type'] = 'primary'
@@ -193,10 +178,8 @@ def main() -> None:
 
     multi = pd.concat([primary_rows, secondary_rows], ignore_index=True)
     multi = multi.drop_duplicates(['Symbol', 'Theme']).sort_values(['Theme', 'membership_type', 'Symbol'])
-    multi.to_csv(OUT_MULTI_FULL, index=False)
 
-    final_2col = build_final_2col(multi[['Symbol', 'Theme']])
-    final_2col.to_csv(OUT_FINAL_2COL, index=False)
+    final_2col = build_final_2col(multi[['Symbol', 'Theme']], IN_ORDER)
 
     memberships = multi.groupby('Symbol')['Theme'].nunique()
     theme_sizes = multi.groupby('Theme')['Symbol'].nunique().sort_values(ascending=False)
@@ -218,16 +201,26 @@ def main() -> None:
         '- Secondary theme added only when a distinct causal/coverage lens exists beyond the primary theme.',
         '- Kept max two themes per symbol in this pass.',
     ]
-    OUT_SUMMARY.write_text('\n'.join(summary), encoding='utf-8')
+    return {
+        OUT_ADDITIONS: add_df,
+        OUT_MULTI_FULL: multi,
+        OUT_FINAL_2COL: final_2col,
+        OUT_SUMMARY: '\n'.join(summary),
+    }
+
 
-    print(f'Wrote: {OUT_ADDITIONS}')
-    print(f'Wrote: {OUT_MULTI_FULL}')
-    print(f'Wrote: {OUT_FINAL_2COL}')
-    print(f'Wrote: {OUT_SUMMARY}')
-    print(f'Secondary rows: {len(secondary_rows)}')
+def main() -> None:
+    artifacts = run(pd.read_csv(IN_FULL))
+    write_artifacts(artifacts)
+
+    multi = artifacts[OUT_MULTI_FULL]
+    memberships = multi.groupby('Symbol')['Theme'].nunique()
+    theme_sizes = multi.groupby('Theme')['Symbol'].nunique()
+    print(f'Secondary rows: {len(artifacts[OUT_ADDITIONS])}')
     print(f'Symbols with 2 themes: {int((memberships >= 2).sum())}')
     print(f'Max theme size: {int(theme_sizes.max())}')
 
 
 if __name__ == '__main__':
-    main()
+    with profiled('stage23'):
+        main()
@@ -2,6 +2,9 @@
 import pandas as pd
 from pathlib import Path
 
+from spans import profiled, timed
+from stage_common import build_final_2col, write_artifacts
+
 BASE = Path('/Users/raviaranke/Desktop/themes')
 IN_MULTI = BASE / 'stage23_multi_theme_membership_full.csv'
 IN_ORDER = BASE / 'theme_order_reference.csv'
@@ -41,26 +44,9 @@ ADDITIONS = {
 }
 
 
-def sort_themes(themes: list[str]) -> list[str]:
-    if IN_ORDER.exists():
-        order_df = pd.read_csv(IN_ORDER)
-        order_map = {t: i for i, t in enumerate(order_df['Theme'].dropna().tolist())}
-        return sorted(themes, key=lambda t: (order_map.get(t, 10_000), t))
-    return sorted(themes)
-
-
-def build_final_2col(df: pd.DataFrame) -> pd.DataFrame:
-    out = []
-    for theme in sort_themes(df['Theme'].dropna().unique().tolist()):
-        syms = sorted(df.loc[df['Theme'] == theme, 'Symbol'].dropna().astype(str).unique().tolist())
-        for sym in syms:
-            out.append({'Symbol': sym, 'Theme': theme})
-        out.append({'Symbol': pd.NA, 'Theme': pd.NA})
-    return pd.DataFrame(out, columns=['Symbol', 'Theme'])
-
-
-def main() -> None:
-    multi = pd.read_csv(IN_MULTI)
+@timed
+def run(multi: pd.DataFrame) -> dict:
+    """Add ADDITIONS to the stage23 membership; returns {output path: frame or summary text}"""
     symbol_set = set(multi['Symbol'])
     theme_set = set(multi['Theme'])
 
@@ -97,14 +83,11 @@ def main() -> None:
 
     add_df = pd.DataFrame(rows)
     add_df = add_df.sort_values(['Theme', 'Symbol'])
-    add_df.to_csv(OUT_ADDITIONS, index=False)
 
     out = pd.concat([multi, add_df], ignore_index=True)
     out = out.drop_duplicates(['Symbol', 'Theme']).sort_values(['Theme', 'membership_type', 'Symbol'])
-    out.to_csv(OUT_MULTI, index=False)
 
-    final_2col = build_final_2col(out[['Symbol', 'Theme']])
-    final_2col.to_csv(OUT_FINAL_2COL, index=False)
+    final_2col = build_final_2col(out[['Symbol', 'Theme']], IN_ORDER)
 
     # Diagnostics
     sizes = out.groupby('Theme')['Symbol'].nunique().sort_values()
@@ -130,17 +113,27 @@ def main() -> None:
     for theme in sparse_before.index:
         lines.append(f'- {theme}: {int(sparse_before[theme])} -> {int(sparse_after.get(theme, sparse_before[theme]))}')
 
-    OUT_SUMMARY.write_text('\n'.join(lines), encoding='utf-8')
+    return {
+        OUT_ADDITIONS: add_df,
+        OUT_MULTI: out,
+        OUT_FINAL_2COL: final_2col,
+        OUT_SUMMARY: '\n'.join(lines),
+    }
+
 
-    print(f'Wrote: {OUT_ADDITIONS}')
-    print(f'Wrote: {OUT_MULTI}')
-    print(f'Wrote: {OUT_FINAL_2COL}')
-    print(f'Wrote: {OUT_SUMMARY}')
-    print(f'Added rows: {len(add_df)}')
+def main() -> None:
+    artifacts = run(pd.read_csv(IN_MULTI))
+    write_artifacts(artifacts)
+
+    out = artifacts[OUT_MULTI]
+    sizes = out.groupby('Theme')['Symbol'].nunique()
+    sym_counts = out.groupby('Symbol')['Theme'].nunique()
+    print(f'Added rows: {len(artifacts[OUT_ADDITIONS])}')
     print(f'Themes <=2 after: {int((sizes <= 2).sum())}')
     print(f'Min theme size after: {int(sizes.min())}')
     print(f'Max themes per symbol: {int(sym_counts.max())}')
 
 
 if __name__ == '__main__':
-    main()
+    with profiled('stage24'):
+        main()
@@ -2,6 +2,9 @@
 import pandas as pd
 from pathlib import Path
 
+from spans import profiled, timed
+from stage_common import build_final_2col, write_artifacts
+
 BASE = Path('/Users/raviaranke/Desktop/themes')
 IN_MULTI = BASE / 'stage24_multi_theme_membership_full.csv'
 IN_BASE = BASE / 'stage22_reports_overlay_full.csv'
@@ -15,28 +18,13 @@ OUT_FINAL_2COL = BASE / 'theme_park_codex_final_2col.csv'
 MCAP_THRESHOLD = 1000.0
 
 
-def sort_themes(themes: list[str]) -> list[str]:
-    if IN_ORDER.exists():
-        order_df = pd.read_csv(IN_ORDER)
-        order_map = {t: i for i, t in enumerate(order_df['Theme'].dropna().tolist())}
-        return sorted(themes, key=lambda t: (order_map.get(t, 10_000), t))
-    return sorted(themes)
-
-
-def build_final_2col(df: pd.DataFrame) -> pd.DataFrame:
-    out = []
-    for theme in sort_themes(df['Theme'].dropna().unique().tolist()):
-        sub = df[df['Theme'] == theme].copy()
-        sub = sub.sort_values(['mcap_cr', 'Symbol'], ascending=[False, True])
-        for _, r in sub.iterrows():
-            out.append({'Symbol': r['Symbol'], 'Theme': theme})
-        out.append({'Symbol': pd.NA, 'Theme': pd.NA})
-    return pd.DataFrame(out, columns=['Symbol', 'Theme'])
-
-
-def main() -> None:
-    multi = pd.read_csv(IN_MULTI)
-    base = pd.read_csv(IN_BASE)[['Symbol', 'ff_mcap_med_x']].drop_duplicates('Symbol').rename(columns={'ff_mcap_med_x': 'mcap_cr'})
+@timed
+def run(multi: pd.DataFrame, base: pd.DataFrame) -> dict:
+    """
+    Drop stage24 memberships below MCAP_THRESHOLD (mcap from the stage22 frame);
+    returns {output path: frame or summary text}
+    """
+    base = base[['Symbol', 'ff_mcap_med_x']].drop_duplicates('Symbol').rename(columns={'ff_mcap_med_x': 'mcap_cr'})
 
     merged = multi.merge(base, on='Symbol', how='left')
     if merged['mcap_cr'].isna().any():
@@ -51,11 +39,7 @@ def main() -> None:
     kept = merged[merged['mcap_cr'] >= MCAP_THRESHOLD].copy()
     kept = kept.sort_values(['Theme', 'mcap_cr', 'Symbol'], ascending=[True, False, True])
 
-    kept.to_csv(OUT_MULTI, index=False)
-    removed_syms.to_csv(OUT_REMOVED, index=False)
-
-    final_2col = build_final_2col(kept[['Symbol', 'Theme', 'mcap_cr']])
-    final_2col.to_csv(OUT_FINAL_2COL, index=False)
+    final_2col = build_final_2col(kept[['Symbol', 'Theme', 'mcap_cr']], IN_ORDER)
 
     # Diagnostics
     theme_sizes_before = merged.groupby('Theme')['Symbol'].nunique()
@@ -100,15 +84,22 @@ def main() -> None:
         for t in dropped_themes:
             lines.append(f'- {t}')
 
-    OUT_SUMMARY.write_text('\n'.join(lines), encoding='utf-8')
+    return {
+        OUT_MULTI: kept,
+        OUT_REMOVED: removed_syms,
+        OUT_FINAL_2COL: final_2col,
+        OUT_SUMMARY: '\n'.join(lines),
+    }
+
+
+def main() -> None:
+    artifacts = run(pd.read_csv(IN_MULTI), pd.read_csv(IN_BASE))
+    write_artifacts(artifacts)
 
-    print(f'Wrote: {OUT_MULTI}')
-    print(f'Wrote: {OUT_REMOVED}')
-    print(f'Wrote: {OUT_FINAL_2COL}')
-    print(f'Wrote: {OUT_SUMMARY}')
-    print(f'Removed symbols: {len(removed_syms)}')
-    print(f'Output symbols: {kept["Symbol"].nunique()}')
+    print(f'Removed symbols: {len(artifacts[OUT_REMOVED])}')
+    print(f'Output symbols: {artifacts[OUT_MULTI]["Symbol"].nunique()}')
 
 
 if __name__ == '__main__':
-    main()
+    with profiled('stage25'):
+        main()
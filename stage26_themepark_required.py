@@ -2,6 +2,11 @@
 import pandas as pd
 from pathlib import Path
 
+from snapshot_cache import read_sheet
+from pivot_store import load_pivot_summary
+from spans import profiled, timed
+from stage_common import build_final_2col, write_artifacts
+
 BASE = Path('/Users/raviaranke/Desktop/themes')
 IN_MULTI = BASE / 'stage24_multi_theme_membership_full.csv'
 IN_BASE = BASE / 'stage22_reports_overlay_full.csv'
@@ -43,28 +48,8 @@ THEMEPARK_BACKFILL_THEME = {
 }
 
 
-def sort_themes(themes: list[str]) -> list[str]:
-    if IN_ORDER.exists():
-        order_df = pd.read_csv(IN_ORDER)
-        order_map = {t: i for i, t in enumerate(order_df['Theme'].dropna().tolist())}
-        return sorted(themes, key=lambda t: (order_map.get(t, 10_000), t))
-    return sorted(themes)
-
-
-def build_final_2col(df: pd.DataFrame) -> pd.DataFrame:
-    out = []
-    for theme in sort_themes(df['Theme'].dropna().unique().tolist()):
-        sub = df[df['Theme'] == theme].copy()
-        # sort by mcap descending, unknown mcap last
-        sub = sub.sort_values(['mcap_cr', 'Symbol'], ascending=[False, True], na_position='last')
-        for _, r in sub.iterrows():
-            out.append({'Symbol': r['Symbol'], 'Theme': theme})
-        out.append({'Symbol': pd.NA, 'Theme': pd.NA})
-    return pd.DataFrame(out, columns=['Symbol', 'Theme'])
-
-
-def load_themepark_symbols() -> pd.DataFrame:
-    tp = pd.read_excel(IN_THEMEPARK, sheet_name='theme_park')
+def themepark_symbols(tp: pd.DataFrame) -> pd.DataFrame:
+    """Symbol / ThemeRaw rows of the original theme_park sheet"""
     sym_col = [c for c in tp.columns if str(c).strip().lower() in ['symbol / rank', 'symbol', 'symbol/rank']]
     theme_col = [c for c in tp.columns if str(c).strip().lower() == 'theme']
     sym_col = sym_col[0] if sym_col else tp.columns[0]
@@ -85,14 +70,20 @@ def load_themepark_symbols() -> pd.DataFrame:
     return d.drop_duplicates(['Symbol'])
 
 
-def load_mcap_map() -> pd.DataFrame:
+@timed
+def load_themepark_symbols() -> pd.DataFrame:
+    return themepark_symbols(read_sheet(IN_THEMEPARK, 'theme_park'))
+
+
+def mcap_map_from(base: pd.DataFrame, jan26: pd.DataFrame) -> pd.DataFrame:
+    """Symbol / mcap_cr from the stage22 frame, falling back to the Jan26 pivot median"""
     # Primary mcap source from stage22 base
-    base = pd.read_csv(IN_BASE)[['Symbol', 'ff_mcap_med_x']].drop_duplicates('Symbol')
+    base = base[['Symbol', 'ff_mcap_med_x']].drop_duplicates('Symbol')
     base.columns = ['Symbol', 'mcap_primary']
     base['Symbol'] = base['Symbol'].astype(str).str.upper().str.strip()
 
     # Fallback mcap source from Jan26 features
-    j = pd.read_excel(IN_JAN26)
+    j = jan26.copy()
     j['Symbol'] = j['Symbol'].astype(str).str.upper().str.strip()
     j_m = j.groupby('Symbol', as_index=False)['ff_mcap'].median().rename(columns={'ff_mcap': 'mcap_jan26'})
 
@@ -102,14 +93,20 @@ def load_mcap_map() -> pd.DataFrame:
     return m[['Symbol', 'mcap_cr']].drop_duplicates('Symbol')
 
 
-def main() -> None:
-    multi = pd.read_csv(IN_MULTI)
-    multi['Symbol'] = multi['Symbol'].astype(str).str.upper().str.strip()
+@timed
+def load_mcap_map() -> pd.DataFrame:
+    return mcap_map_from(pd.read_csv(IN_BASE), load_pivot_summary(IN_JAN26))
 
-    themepark = load_themepark_symbols()
-    required_symbols = set(themepark['Symbol'])
 
-    mcap_map = load_mcap_map()
+@timed
+def run(multi: pd.DataFrame, themepark: pd.DataFrame, mcap_map: pd.DataFrame) -> dict:
+    """
+    Backfill and force-keep theme_park symbols, drop the rest below
+    MCAP_THRESHOLD; returns {output path: frame or summary text}
+    """
+    multi = multi.copy()
+    multi['Symbol'] = multi['Symbol'].astype(str).str.upper().str.strip()
+    required_symbols = set(themepark['Symbol'])
 
     # Backfill symbols that are present in theme_park but missing from modeled universe.
     existing_symbols = set(multi['Symbol'])
@@ -129,10 +126,9 @@ def main() -> None:
         })
 
     backfill = pd.DataFrame(backfill_rows)
-    if not backfill.empty:
-        backfill.to_csv(OUT_BACKFILL, index=False)
-    else:
-        pd.DataFrame(columns=['Symbol', 'Theme', 'membership_type', 'primary_theme', 'secondary_rationale']).to_csv(OUT_BACKFILL, index=False)
+    backfill_out = backfill
+    if backfill.empty:
+        backfill_out = pd.DataFrame(columns=['Symbol', 'Theme', 'membership_type', 'primary_theme', 'secondary_rationale'])
 
     combined = pd.concat([multi, backfill], ignore_index=True)
     combined = combined.drop_duplicates(['Symbol', 'Theme'])
@@ -152,13 +148,10 @@ def main() -> None:
 
     # Sort within theme by mcap desc.
     kept = kept.sort_values(['Theme', 'mcap_cr', 'Symbol'], ascending=[True, False, True], na_position='last')
-    kept.to_csv(OUT_MULTI, index=False)
 
     removed_symbols = removed[['Symbol', 'mcap_cr']].drop_duplicates().sort_values(['mcap_cr', 'Symbol'], na_position='first')
-    removed_symbols.to_csv(OUT_REMOVED, index=False)
 
-    final_2col = build_final_2col(kept[['Symbol', 'Theme', 'mcap_cr']])
-    final_2col.to_csv(OUT_FINAL_2COL, index=False)
+    final_2col = build_final_2col(kept[['Symbol', 'Theme', 'mcap_cr']], IN_ORDER)
 
     # Summary
     lines = [
@@ -178,15 +171,26 @@ def main() -> None:
         '- DREDGECORP is now retained (forced by theme_park membership despite sub-1000 Cr mcap).',
     ]
 
-    OUT_SUMMARY.write_text('\n'.join(lines), encoding='utf-8')
+    return {
+        OUT_MULTI: kept,
+        OUT_BACKFILL: backfill_out,
+        OUT_REMOVED: removed_symbols,
+        OUT_FINAL_2COL: final_2col,
+        OUT_SUMMARY: '\n'.join(lines),
+    }
 
-    print(f'Wrote: {OUT_MULTI}')
-    print(f'Wrote: {OUT_BACKFILL}')
-    print(f'Wrote: {OUT_REMOVED}')
-    print(f'Wrote: {OUT_FINAL_2COL}')
-    print(f'Wrote: {OUT_SUMMARY}')
-    print(f'Required symbols: {len(required_symbols)} | Missing pre-backfill: {len(missing_required)} | Backfilled: {len(backfill)}')
+
+def main() -> None:
+    multi = pd.read_csv(IN_MULTI)
+    themepark = load_themepark_symbols()
+    artifacts = run(multi, themepark, load_mcap_map())
+    write_artifacts(artifacts)
+
+    required_symbols = set(themepark['Symbol'])
+    missing_required = required_symbols - set(multi['Symbol'].astype(str).str.upper().str.strip())
+    print(f'Required symbols: {len(required_symbols)} | Missing pre-backfill: {len(missing_required)} | Backfilled: {len(artifacts[OUT_BACKFILL])}')
 
 
 if __name__ == '__main__':
-    main()
+    with profiled('stage26'):
+        main()
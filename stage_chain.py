@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+In-Process Stage Chain
+Runs stage22 -> stage26 in one process, handing each stage's frame straight
+to the next instead of writing and re-parsing the intermediate CSVs. Only the
+final artifacts are written, unless --audit asks for every stage's outputs
+
+Usage: python stage_chain.py [--audit]
+"""
+
+import sys
+
+import pandas as pd
+
+import stage22_reports_overlay as s22
+import stage23_secondary_theme_overlay as s23
+import stage24_sparse_theme_fill as s24
+import stage25_mcap_filter_sort as s25
+import stage26_themepark_required as s26
+from pivot_store import load_pivot_summary
+from snapshot_cache import read_sheet
+from spans import profiled, timed
+from stage_common import write_artifacts
+
+# Outputs nothing downstream reads: the stage22 codex exports and everything stage26 writes
+FINAL_ARTIFACTS = [
+    s22.OUT_HIGH_CONF,
+    s22.OUT_REVIEW,
+    s26.OUT_MULTI,
+    s26.OUT_BACKFILL,
+    s26.OUT_REMOVED,
+    s26.OUT_FINAL_2COL,
+    s26.OUT_SUMMARY,
+]
+
+
+@timed
+def run_chain(full: pd.DataFrame, meta: pd.DataFrame, themepark: pd.DataFrame, jan26: pd.DataFrame,
+              audit: bool = False) -> dict:
+    """
+    {output path: frame or summary text} for the whole chain, from the stage21
+    frame, the review metadata, the theme_park sheet and the Jan26 pivot summary
+
+    stage25 only feeds its own audit files (stage26 starts again from the
+    stage24 membership), so it runs in audit mode only.
+    """
+    a22 = s22.run(full, meta)
+    base = a22[s22.OUT_FULL]
+    a23 = s23.run(base)
+    a24 = s24.run(a23[s23.OUT_MULTI_FULL])
+    a25 = s25.run(a24[s24.OUT_MULTI], base) if audit else {}
+    a26 = s26.run(a24[s24.OUT_MULTI], s26.themepark_symbols(themepark), s26.mcap_map_from(base, jan26))
+
+    # Later stages win for the shared codex file, as when the scripts run in order
+    artifacts = {}
+    for stage_artifacts in (a22, a23, a24, a25, a26):
+        artifacts.update(stage_artifacts)
+    return artifacts
+
+
+def main():
+    audit = '--audit' in sys.argv[1:]
+
+    print("=" * 60)
+    print("STAGE CHAIN" + (" (audit)" if audit else ""))
+    print("=" * 60)
+
+    artifacts = run_chain(
+        pd.read_csv(s22.IN_FULL),
+        pd.read_csv(s22.IN_META),
+        read_sheet(s26.IN_THEMEPARK, 'theme_park'),
+        load_pivot_summary(s26.IN_JAN26),
+        audit=audit,
+    )
+    write_artifacts(artifacts, None if audit else FINAL_ARTIFACTS)
+
+    print(f"\n✓ Wrote {len(artifacts) if audit else len(FINAL_ARTIFACTS)} files")
+
+
+if __name__ == "__main__":
+    with profiled("stage_chain"):
+        main()
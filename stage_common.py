@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Stage Helpers
+Shared by the stage22-26 scripts: theme ordering, the 2-column codex export,
+and writing each stage's run() outputs ({path: DataFrame or markdown text})
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from spans import timed
+
+# Rank for themes missing from theme_order_reference.csv (they follow, by name)
+UNLISTED_THEME_RANK = 10_000
+
+_order_memo = {}
+
+
+def theme_order(order_path: Path) -> dict:
+    """
+    {theme: rank} from theme_order_reference.csv ({} when it does not exist)
+
+    Read once per process; re-read only when the file's size or mtime changes.
+    """
+    order_path = Path(order_path)
+    if not order_path.exists():
+        return {}
+    stat = order_path.stat()
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    memo = _order_memo.get(order_path)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    order_df = pd.read_csv(order_path)
+    order_map = {t: i for i, t in enumerate(order_df['Theme'].dropna().tolist())}
+    _order_memo[order_path] = (stamp, order_map)
+    return order_map
+
+
+def build_final_2col(df: pd.DataFrame, order_path: Path) -> pd.DataFrame:
+    """
+    Symbol / Theme codex with a blank separator row after each theme
+
+    Themes follow theme_order_reference.csv. Inside a theme, symbols are by
+    mcap_cr descending (unknown last) when the frame has it, otherwise unique
+    and alphabetical. One sort over the whole frame, then the separators are
+    inserted at the theme boundaries.
+    """
+    df = df[df['Theme'].notna()]
+    if 'mcap_cr' in df.columns:
+        df = df[['Symbol', 'Theme', 'mcap_cr']]
+        keys, ascending = ['_rank', 'Theme', 'mcap_cr', 'Symbol'], [True, True, False, True]
+    else:
+        df = df[df['Symbol'].notna()][['Symbol', 'Theme']]
+        df = df.assign(Symbol=df['Symbol'].astype(str)).drop_duplicates()
+        keys, ascending = ['_rank', 'Theme', 'Symbol'], [True, True, True]
+
+    order_map = theme_order(order_path)
+    df = df.assign(_rank=df['Theme'].map(order_map).fillna(UNLISTED_THEME_RANK))
+    df = df.sort_values(keys, ascending=ascending, na_position='last')
+
+    themes = df['Theme'].to_numpy(dtype=object)
+    ends = np.append(np.flatnonzero(themes[1:] != themes[:-1]) + 1, len(themes)) if len(themes) else []
+    return pd.DataFrame({
+        'Symbol': np.insert(df['Symbol'].to_numpy(dtype=object), ends, pd.NA),
+        'Theme': np.insert(themes, ends, pd.NA),
+    }, columns=['Symbol', 'Theme'])
+
+
+@timed
+def write_artifacts(artifacts: dict, paths=None):
+    """Write artifacts (only those in paths when given), printing each path"""
+    for path, value in artifacts.items():
+        if paths is not None and path not in paths:
+            continue
+        if isinstance(value, pd.DataFrame):
+            value.to_csv(path, index=False)
+        else:
+            Path(path).write_text(value, encoding='utf-8')
+        print(f'Wrote: {path}')
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Stage Pipeline Runner
+Runs stage22 -> stage26 as a DAG: each stage declares its inputs / outputs,
+is skipped when the content hashes of its script and inputs match the last
+successful run, and stages with no path between them run in parallel
+
+Usage: python stage_pipeline.py [--force] [--dry-run] [--jobs N] [stage ...]
+(named stages are rerun regardless of their fingerprint; --force reruns all)
+"""
+
+import json
+import subprocess
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+
+import stage22_reports_overlay as s22
+import stage23_secondary_theme_overlay as s23
+import stage24_sparse_theme_fill as s24
+import stage25_mcap_filter_sort as s25
+import stage26_themepark_required as s26
+from snapshot_cache import file_hash
+
+HERE = Path(__file__).parent
+STATE_FILE = s22.BASE / 'stage_pipeline_state.json'
+
+
+class Stage(NamedTuple):
+    name: str
+    script: Path
+    inputs: list    # data files read (a missing optional input hashes as None)
+    outputs: list   # files written
+    code: tuple = ()  # local modules the script imports
+
+
+STAGES = [
+    Stage('stage22', HERE / 'stage22_reports_overlay.py',
+          [s22.IN_FULL, s22.IN_META, s22.IN_ORDER],
+          [s22.OUT_FULL, s22.OUT_CHANGES, s22.OUT_EVIDENCE, s22.OUT_SUMMARY,
+           s22.OUT_FINAL_2COL, s22.OUT_HIGH_CONF, s22.OUT_REVIEW],
+          (HERE / 'stage_common.py', HERE / 'spans.py')),
+    Stage('stage23', HERE / 'stage23_secondary_theme_overlay.py',
+          [s23.IN_FULL, s23.IN_ORDER],
+          [s23.OUT_ADDITIONS, s23.OUT_MULTI_FULL, s23.OUT_SUMMARY, s23.OUT_FINAL_2COL],
+          (HERE / 'stage_common.py', HERE / 'spans.py')),
+    Stage('stage24', HERE / 'stage24_sparse_theme_fill.py',
+          [s24.IN_MULTI, s24.IN_ORDER],
+          [s24.OUT_ADDITIONS, s24.OUT_MULTI, s24.OUT_SUMMARY, s24.OUT_FINAL_2COL],
+          (HERE / 'stage_common.py', HERE / 'spans.py')),
+    Stage('stage25', HERE / 'stage25_mcap_filter_sort.py',
+          [s25.IN_MULTI, s25.IN_BASE, s25.IN_ORDER],
+          [s25.OUT_MULTI, s25.OUT_REMOVED, s25.OUT_SUMMARY, s25.OUT_FINAL_2COL],
+          (HERE / 'stage_common.py', HERE / 'spans.py')),
+    Stage('stage26', HERE / 'stage26_themepark_required.py',
+          [s26.IN_MULTI, s26.IN_BASE, s26.IN_JAN26, s26.IN_THEMEPARK, s26.IN_ORDER],
+          [s26.OUT_MULTI, s26.OUT_BACKFILL, s26.OUT_REMOVED, s26.OUT_SUMMARY, s26.OUT_FINAL_2COL],
+          (HERE / 'stage_common.py', HERE / 'spans.py', HERE / 'snapshot_cache.py', HERE / 'pivot_store.py')),
+]
+
+
+def stage_dependencies(stages: list) -> dict:
+    """
+    {stage name: set of stage names it must wait for}
+
+    A stage waits for the producers of its inputs. Stages writing the same file
+    (every stage writes theme_park_codex_final_2col.csv) also run in declared
+    order, so the last stage listed is the one whose copy survives.
+    """
+    deps = {s.name: set() for s in stages}
+    for i, stage in enumerate(stages):
+        for earlier in stages[:i]:
+            if set(earlier.outputs) & (set(stage.inputs) | set(stage.outputs)):
+                deps[stage.name].add(earlier.name)
+    return deps
+
+
+def fingerprint(stage: Stage) -> dict:
+    """{path: sha1 or None} over the stage's script, code and inputs"""
+    paths = [stage.script] + list(stage.code) + list(stage.inputs)
+    return {str(p): file_hash(p) if Path(p).exists() else None for p in paths}
+
+
+def final_outputs(stage: Stage, stages: list) -> list:
+    """The stage's outputs no later stage overwrites"""
+    later = stages[[s.name for s in stages].index(stage.name) + 1:]
+    overwritten = {p for s in later for p in s.outputs}
+    return [p for p in stage.outputs if p not in overwritten]
+
+
+def _output_hashes(stage: Stage) -> dict:
+    outputs = final_outputs(stage, STAGES)
+    return {str(p): file_hash(p) if Path(p).exists() else None for p in outputs}
+
+
+def _load_state() -> dict:
+    if STATE_FILE.exists():
+        try:
+            return json.loads(STATE_FILE.read_text())
+        except ValueError:
+            return {}
+    return {}
+
+
+def _save_state(state: dict):
+    tmp = STATE_FILE.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state, indent=2))
+    tmp.replace(STATE_FILE)
+
+
+def is_stale(stage: Stage, state: dict) -> bool:
+    """
+    True when the stage's fingerprint changed since its last run, or a file it
+    is the final writer of was deleted or changed (e.g. stage25 rewrote the
+    shared codex after stage26 ran)
+    """
+    last = state.get(stage.name)
+    if not last or last['inputs'] != fingerprint(stage):
+        return True
+    return last['outputs'] != _output_hashes(stage)
+
+
+def _run(stage: Stage) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, str(stage.script)], capture_output=True, text=True)
+
+
+def run_pipeline(forced: set = (), dry_run: bool = False, jobs: int = 4) -> dict:
+    """
+    Run the stale stages plus the forced ones and return
+    {stage name: 'ran' / 'skipped' / 'failed' / 'blocked' / 'stale'}
+
+    A stage is only checked once all of its dependencies have finished, so an
+    upstream rerun that reproduces its outputs byte for byte still lets the
+    downstream stages skip.
+    """
+    deps = stage_dependencies(STAGES)
+    by_name = {s.name: s for s in STAGES}
+    state = _load_state()
+
+    forced = set(forced)
+    status = {}
+    pending = [s.name for s in STAGES]
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                if not deps[name] <= set(status):
+                    continue
+                pending.remove(name)
+                stage = by_name[name]
+
+                if any(status[d] in ('failed', 'blocked') for d in deps[name]):
+                    status[name] = 'blocked'
+                elif name not in forced and not is_stale(stage, state):
+                    status[name] = 'skipped'
+                    print(f"   = {name} (up to date)")
+                elif dry_run:
+                    # Downstream stages cannot be judged before this one reruns
+                    status[name] = 'stale'
+                    print(f"   ~ {name} (would run)")
+                    for later in STAGES:
+                        if name in deps[later.name]:
+                            forced.add(later.name)
+                else:
+                    print(f"   → {name} running...")
+                    running[pool.submit(_run, stage)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result = future.result()
+                if result.returncode == 0:
+                    status[name] = 'ran'
+                    state[name] = {'inputs': fingerprint(by_name[name]), 'outputs': _output_hashes(by_name[name])}
+                    _save_state(state)
+                    print(f"   ✓ {name}")
+                else:
+                    status[name] = 'failed'
+                    state.pop(name, None)
+                    _save_state(state)
+                    print(f"   ✗ {name} failed (exit {result.returncode})")
+                    print(result.stderr.strip())
+
+    return status
+
+
+def main():
+    args = sys.argv[1:]
+    force = '--force' in args
+    dry_run = '--dry-run' in args
+    jobs = 4
+    if '--jobs' in args:
+        jobs = int(args[args.index('--jobs') + 1])
+        del args[args.index('--jobs'):args.index('--jobs') + 2]
+    selected = [a for a in args if not a.startswith('--')]
+
+    unknown = set(selected) - {s.name for s in STAGES}
+    if unknown:
+        print(f"Unknown stages: {sorted(unknown)} (known: {[s.name for s in STAGES]})")
+        sys.exit(2)
+
+    print("=" * 60)
+    print("STAGE PIPELINE")
+    print("=" * 60)
+
+    forced = {s.name for s in STAGES} if force else set(selected)
+    status = run_pipeline(forced, dry_run=dry_run, jobs=jobs)
+
+    counts = {k: list(status.values()).count(k) for k in ('ran', 'skipped', 'stale', 'failed', 'blocked')}
+    print(f"\n✓ Ran {counts['ran']}, skipped {counts['skipped']}"
+          + (f", would run {counts['stale']}" if counts['stale'] else '')
+          + (f", failed {counts['failed']}, blocked {counts['blocked']}" if counts['failed'] or counts['blocked'] else ''))
+    if counts['failed'] or counts['blocked']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
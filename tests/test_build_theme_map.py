@@ -0,0 +1,116 @@
+"""
+build_theme_map against the iterrows() walk it replaced, on theme_park layouts
+with header rows, blank / NaN / 'nan' symbols, numeric theme names and
+duplicate symbols
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+
+from app import build_theme_map, normalize_theme_name  # noqa: E402
+
+
+def baseline_build_theme_map(th: pd.DataFrame) -> pd.DataFrame:
+    """The implementation before vectorization, kept as the reference"""
+    th = th.rename(columns={"Symbol / Rank": "Symbol"})
+    th["Symbol"] = th["Symbol"].astype(str).str.strip()
+
+    current_theme = None
+    rows = []
+    for _, row in th.iterrows():
+        sym = str(row["Symbol"]).strip() if pd.notna(row["Symbol"]) else None
+        theme_cell = row["Theme"]
+        if pd.isna(theme_cell) and sym:
+            current_theme = normalize_theme_name(sym)
+            continue
+        if pd.notna(theme_cell):
+            current_theme = normalize_theme_name(str(theme_cell).strip())
+        if sym and current_theme and sym.lower() != "nan":
+            rows.append((sym.upper(), current_theme))
+    return pd.DataFrame(rows, columns=["Symbol", "Theme"])
+
+
+def assert_same_map(th: pd.DataFrame):
+    expected = baseline_build_theme_map(th.copy())
+    actual = build_theme_map(th.copy())
+    pd.testing.assert_frame_equal(
+        actual.astype(object).reset_index(drop=True),
+        expected.astype(object).reset_index(drop=True),
+    )
+
+
+def sheet(rows):
+    return pd.DataFrame(rows, columns=["Symbol / Rank", "Theme", "Rank"])
+
+
+def test_headers_members_and_summary_rows():
+    assert_same_map(sheet([
+        ("Capital goods", None, None),
+        ("abb", "capital goods", 12),
+        (" SIEMENS ", "Capital Goods", 30),
+        ("Average Rank", None, 21),
+        ("nbfc lenders", None, None),
+        ("BAJFINANCE", "nbfc lenders", 5),
+        ("Average Rank", None, 5),
+    ]))
+
+
+def test_blank_nan_and_string_nan_symbols():
+    assert_same_map(sheet([
+        ("Defence", None, None),
+        ("HAL", "Defence", 3),
+        ("", "Defence", 4),
+        ("   ", "Defence", 4),
+        (np.nan, "Defence", 5),
+        (None, "Defence", 6),
+        ("nan", "Defence", 7),
+        ("NaN", "Defence", 8),
+        (np.nan, None, None),
+        ("BEL", "Defence", 9),
+    ]))
+
+
+def test_numeric_blank_and_nan_theme_names():
+    assert_same_map(sheet([
+        ("2024 ipos", None, None),
+        ("SWIGGY", 2024, 40),
+        ("ZOMATO", 3.5, 41),
+        ("PAYTM", "", 42),
+        ("NYKAA", "  ", 43),
+        ("DELHIVERY", "nan", 44),
+        ("POLICYBZR", "ev  AND it", 45),
+    ]))
+
+
+def test_duplicate_symbols_across_and_within_themes():
+    assert_same_map(sheet([
+        ("Power", None, None),
+        ("NTPC", "Power", 1),
+        ("NTPC", "Power", 1),
+        ("Psu", None, None),
+        ("NTPC", "psu", 2),
+        ("ntpc", "PSU", 2),
+    ]))
+
+
+def test_empty_sheet():
+    assert_same_map(sheet([]))
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_layouts(seed):
+    rng = np.random.default_rng(seed)
+    symbols = ["TCS", "infy", " WIPRO", "HDFCBANK ", "", "  ", "nan", "NaN", np.nan, None, 1234, "TCS"]
+    themes = ["it services", "Banks", "nbfc", "EV", 2024, 3.5, "", " ", "nan", np.nan, None]
+
+    rows = []
+    for _ in range(rng.integers(0, 60)):
+        if rng.random() < 0.2:
+            # Header row: theme name in the Symbol column, Theme empty
+            rows.append((themes[rng.integers(len(themes))], None, None))
+        else:
+            rows.append((symbols[rng.integers(len(symbols))], themes[rng.integers(len(themes))], rng.integers(1, 100)))
+    assert_same_map(sheet(rows))
@@ -0,0 +1,180 @@
+"""
+build_theme_table against the per-theme iterrows() loop it replaced, on
+theme_park layouts with unnormalized theme names, missing and non-numeric
+ranks, symbols without a previous rank, repeated symbols and tied ranks
+
+The one intended difference: symbols tied on the same rank keep sheet order
+(the loop's default sort_values was unstable, so its tie order was
+unspecified). The reference below sorts with kind="stable" to state that.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+
+from app import _rank_delta_text, build_theme_table, normalize_theme_name, theme_medians  # noqa: E402
+
+LATEST = pd.Timestamp("2026-01-31")
+PREV = pd.Timestamp("2025-12-31")
+
+
+def baseline_build_theme_table(th, latest, prev, selected_themes, portfolio_symbol_set, latest_median,
+                               show_non_portfolio):
+    """The implementation before vectorization (ties in sheet order), kept as the reference"""
+    th_latest = th.rename(columns={"Symbol / Rank": "Symbol"})
+    th_latest = th_latest[["Symbol", "Theme", latest]].copy()
+    th_latest["Theme"] = th_latest["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
+    th_latest = th_latest[th_latest["Theme"].notna()].rename(columns={latest: "Rank"})
+    th_latest["Rank"] = pd.to_numeric(th_latest["Rank"], errors="coerce")
+    th_latest["Symbol"] = th_latest["Symbol"].astype(str).str.strip()
+
+    prev_ranks = None
+    if prev is not None:
+        prev_ranks = th.rename(columns={"Symbol / Rank": "Symbol"})
+        prev_ranks = prev_ranks[["Symbol", "Theme", prev]].copy()
+        prev_ranks["Theme"] = prev_ranks["Theme"].apply(lambda v: normalize_theme_name(v) if pd.notna(v) else v)
+        prev_ranks = prev_ranks[prev_ranks["Theme"].notna()].rename(columns={prev: "Rank"})
+        prev_ranks["Rank"] = pd.to_numeric(prev_ranks["Rank"], errors="coerce")
+        prev_ranks["Symbol"] = prev_ranks["Symbol"].astype(str).str.strip()
+
+    prev_median = theme_medians(th, prev) if prev is not None else pd.Series(dtype=float)
+
+    rows = []
+    for theme in selected_themes:
+        latest_rows = th_latest[th_latest["Theme"] == theme].dropna(subset=["Rank"])
+        latest_rows = latest_rows.sort_values("Rank", ascending=True, kind="stable")
+        prev_rows = None
+        if prev_ranks is not None:
+            prev_rows = prev_ranks[prev_ranks["Theme"] == theme].dropna(subset=["Rank"])
+            prev_rows = prev_rows.set_index("Symbol")["Rank"].to_dict()
+
+        portfolio_cells = []
+        other_cells = []
+        for _, r in latest_rows.iterrows():
+            sym = r["Symbol"]
+            latest_rank = int(r["Rank"])
+            prev_rank = None if prev_rows is None else prev_rows.get(sym)
+            if pd.notna(prev_rank):
+                delta = latest_rank - int(prev_rank)
+                arrow = "▲" if delta < 0 else "▼" if delta > 0 else "•"
+                klass = "delta-up" if delta < 0 else "delta-down" if delta > 0 else "delta-flat"
+                delta_text = f"<span class='{klass}'>({arrow}{abs(delta)})</span>"
+            else:
+                delta_text = "<span class='delta-unk'>(?)</span>"
+            label = f"{sym} {latest_rank} {delta_text}"
+            if sym in portfolio_symbol_set:
+                portfolio_cells.append(label)
+            else:
+                other_cells.append(label)
+
+        latest_med = float(latest_median.get(theme, float("nan")))
+        prev_med = float(prev_median.get(theme, float("nan"))) if prev is not None else float("nan")
+        delta_text = _rank_delta_text(prev_med, latest_med)
+        if pd.notna(latest_med) and pd.notna(prev_med):
+            delta_val = latest_med - prev_med
+            klass = "delta-up" if delta_val < 0 else "delta-down" if delta_val > 0 else "delta-flat"
+            med_cell = f"{latest_med:.0f} <span class='{klass}'>({delta_text})</span>"
+        else:
+            med_cell = ""
+        row = {
+            "Theme": theme,
+            "Median (Latest Δ)": med_cell,
+            "Portfolio": "<br/>".join(portfolio_cells),
+        }
+        if show_non_portfolio:
+            row["Others"] = "<br/>".join(other_cells)
+        rows.append(row)
+    return rows
+
+
+def sheet(rows):
+    return pd.DataFrame(rows, columns=["Symbol / Rank", "Theme", LATEST, PREV])
+
+
+def assert_same_rows(th, portfolio, prev=PREV, selected=None, show_non_portfolio=True):
+    latest_median = theme_medians(th, LATEST).sort_values()
+    if selected is None:
+        selected = latest_median.index.tolist()
+    args = (LATEST, prev, selected, portfolio, latest_median, show_non_portfolio)
+    expected = baseline_build_theme_table(th.copy(), *args)
+    actual = build_theme_table(th.copy(), *args)
+    # Records is extra per-symbol data for the combined view; the rendered cells must match
+    assert [{k: v for k, v in row.items() if k != "Records"} for row in actual] == expected
+
+
+def test_deltas_medians_and_portfolio_split():
+    th = sheet([
+        ("HAL", "defence", 18, 20),
+        ("BEL", "Defence", 5, 5),
+        ("BDL", "DEFENCE ", 40, 31),
+        ("NTPC", "power", 12, np.nan),
+        ("TATAPOWER", "Power", 60, 48),
+        ("ADANIPOWER", "power", 7, 9),
+    ])
+    for show in (True, False):
+        assert_same_rows(th, {"HAL", "NTPC"}, show_non_portfolio=show)
+
+
+def test_ties_keep_sheet_order():
+    th = sheet([
+        ("HAL", "Defence", 18, 20),
+        ("DATAPATTNS", "Defence", 18, 15),
+        ("BEL", "Defence", 18, 18),
+        ("MAZDOCK", "Defence", 3, 18),
+    ])
+    assert_same_rows(th, {"BEL"})
+    row = build_theme_table(th, LATEST, PREV, ["Defence"], set(), theme_medians(th, LATEST), True)[0]
+    assert [r["symbol"] for r in row["Records"]] == ["MAZDOCK", "HAL", "DATAPATTNS", "BEL"]
+
+
+def test_missing_and_non_numeric_ranks_and_themes():
+    th = sheet([
+        ("INFY", "it services", 10, 12),
+        ("TCS", "IT services", "n/a", 8),
+        ("WIPRO", "It Services", 30, "-"),
+        ("HCLTECH", np.nan, 4, 4),
+        ("  LTIM ", "it services", 22, 22),
+        ("MPHASIS", "it services", np.nan, np.nan),
+    ])
+    assert_same_rows(th, {"LTIM", "TCS"})
+
+
+def test_repeated_symbols_and_no_previous_date():
+    th = sheet([
+        ("NTPC", "Power", 12, 14),
+        ("NTPC", "Power", 15, 11),
+        ("NTPC", "psu", 12, 30),
+        ("POWERGRID", "PSU", 25, 25),
+    ])
+    assert_same_rows(th, {"NTPC"})
+    assert_same_rows(th, {"NTPC"}, prev=None)
+
+
+def test_selected_subset_and_unknown_theme():
+    th = sheet([
+        ("INFY", "IT", 10, 12),
+        ("NTPC", "Power", 12, 14),
+    ])
+    assert_same_rows(th, set(), selected=["Power", "No Such Theme"])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_sheets(seed):
+    rng = np.random.default_rng(seed)
+    symbols = [f"SYM{i}" for i in range(40)]
+    themes = ["banks", "Banks", "it", "EV and auto", "ev AND Auto", "Capital Goods", np.nan]
+    ranks = list(range(1, 30)) + [np.nan, "n/a"]
+
+    rows = [
+        (
+            symbols[rng.integers(len(symbols))],
+            themes[rng.integers(len(themes))],
+            ranks[rng.integers(len(ranks))],
+            ranks[rng.integers(len(ranks))],
+        )
+        for _ in range(rng.integers(1, 80))
+    ]
+    portfolio = set(rng.choice(symbols, 8, replace=False))
+    assert_same_rows(sheet(rows), portfolio, show_non_portfolio=bool(seed % 2))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Theme Median History
+Per-theme median, count, IQR and portfolio-only median of ptile for every rank
+snapshot, computed in one groupby over the rank history cube and stored as a
+compact table next to it
+
+A standalone report for looking at theme trends (load_theme_history); the
+dashboards do not read it. It is rebuilt only when a rank CSV or PF_Ranks.xlsx
+changed since it was written.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app import DATA_PATH_DEFAULT, build_theme_map_codex
+from export_static import is_real_symbol
+from rank_history import DEFAULT_RANK_DIRS, PTILE_MISSING, load_rank_history, rank_stamps
+from snapshot_cache import file_hash, read_sheet
+
+HISTORY_FILE = "theme_median_history.parquet"
+# Parquet schema metadata key holding the rank CSV stamps / workbook hash the table was built from
+SOURCE_KEY = b"themes_source"
+
+
+def theme_median_history(history, theme_map: pd.DataFrame, pf_symbols: set) -> pd.DataFrame:
+    """
+    One row per (Theme, snapshot): Median, Count, IQR, PF_Median
+
+    Each theme counts a symbol once (as the rank table builders do) and skips
+    snapshots where the symbol has no ptile.
+    """
+    members = theme_map[["Theme", "Symbol"]].drop_duplicates()
+    members = members[members["Symbol"].isin(history.row_of)]
+    rows = members["Symbol"].map(history.row_of).to_numpy()
+
+    # members x snapshots, flattened to long form
+    ptile = np.asarray(history.data["ptile"])[rows].astype("float32")
+    ptile[ptile == PTILE_MISSING] = np.nan
+    n_dates = len(history.files)
+
+    long = pd.DataFrame({
+        "Theme": np.repeat(members["Theme"].to_numpy(), n_dates),
+        "Snapshot": np.tile(np.arange(n_dates), len(members)),
+        "Ptile": ptile.ravel(),
+        "IsPortfolio": np.repeat(members["Symbol"].isin(pf_symbols).to_numpy(), n_dates),
+    }).dropna(subset=["Ptile"])
+
+    grouped = long.groupby(["Theme", "Snapshot"])["Ptile"]
+    table = pd.DataFrame({
+        "Median": grouped.median(),
+        "Count": grouped.size(),
+        "IQR": grouped.quantile(0.75) - grouped.quantile(0.25),
+    })
+    table["PF_Median"] = long[long["IsPortfolio"]].groupby(["Theme", "Snapshot"])["Ptile"].median()
+    table = table.reset_index()
+
+    snapshot = table.pop("Snapshot").to_numpy()
+    table.insert(1, "Date", pd.to_datetime([f"{y:04d}-{m:02d}-{d:02d}" for y, m, d in history.dates])[snapshot])
+    table.insert(2, "File", np.asarray(history.files)[snapshot])
+
+    # Compact dtypes: ptile stats fit float32, counts int16
+    table["Theme"] = table["Theme"].astype("category")
+    table["File"] = table["File"].astype("category")
+    table[["Median", "IQR", "PF_Median"]] = table[["Median", "IQR", "PF_Median"]].astype("float32")
+    table["Count"] = table["Count"].astype("int16")
+    return table.sort_values(["Theme", "Date"], ignore_index=True)
+
+
+def _source_stamp(rank_dir: Path, pf_ranks_path: Path) -> dict:
+    return {"ranks": rank_stamps(rank_dir), "workbook": file_hash(pf_ranks_path)}
+
+
+def _history_is_fresh(out_path: Path, stamp: dict) -> bool:
+    if not out_path.exists():
+        return False
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(out_path).metadata or {}
+        return json.loads(metadata[SOURCE_KEY]) == stamp
+    except (ImportError, OSError, KeyError, ValueError):
+        return False
+
+
+def _write_history(table: pd.DataFrame, out_path: Path, stamp: dict):
+    """Write the table through a tmp file, stamped with its sources"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    metadata = dict(arrow.schema.metadata or {})
+    metadata[SOURCE_KEY] = json.dumps(stamp).encode("utf-8")
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    pq.write_table(arrow.replace_schema_metadata(metadata), tmp)
+    tmp.replace(out_path)
+
+
+def build_theme_history(rank_dir: Path, pf_ranks_path: Path = DATA_PATH_DEFAULT, force: bool = False) -> Path:
+    """
+    Compute the table for rank_dir (themes from tpark_codex) and write it next
+    to the cube, unless the one there was built from the same rank CSVs and workbook
+    """
+    out_path = Path(rank_dir) / HISTORY_FILE
+    stamp = _source_stamp(rank_dir, pf_ranks_path)
+    if not force and _history_is_fresh(out_path, stamp):
+        return out_path
+
+    history = load_rank_history(rank_dir)
+
+    pf = read_sheet(pf_ranks_path, "PF_Ranks")
+    theme_map = build_theme_map_codex(read_sheet(pf_ranks_path, "tpark_codex"))
+    pf_syms = pf["Symbol / Rank"].astype(str).str.strip().str.upper()
+    pf_symbols = {s for s in pf_syms.dropna() if is_real_symbol(s)}
+
+    table = theme_median_history(history, theme_map, pf_symbols)
+    _write_history(table, out_path, stamp)
+    return out_path
+
+
+def load_theme_history(rank_dir: Path) -> pd.DataFrame:
+    return pd.read_parquet(Path(rank_dir) / HISTORY_FILE)
+
+
+def main():
+    dirs = [Path(p) for p in sys.argv[1:]] or [d for d in DEFAULT_RANK_DIRS if d.exists()]
+
+    print("=" * 60)
+    print("BUILDING THEME MEDIAN HISTORY")
+    print("=" * 60)
+
+    for d in dirs:
+        out_path = build_theme_history(d)
+        table = pd.read_parquet(out_path)
+        print(f"   ✓ {out_path}: {table['Theme'].nunique()} themes x {table['Date'].nunique()} snapshots ({len(table)} rows)")
+
+
+if __name__ == "__main__":
+    main()
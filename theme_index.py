@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Theme Membership Index
+Theme <-> symbol membership in CSR form (both directions), so "symbols of
+theme" and portfolio intersections cost O(members) instead of a scan of the
+theme map
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class ThemeIndex(NamedTuple):
+    themes: np.ndarray         # theme id -> name (first-appearance order)
+    symbols: np.ndarray        # symbol id -> symbol
+    theme_id: dict             # name -> theme id
+    symbol_id: dict            # symbol -> symbol id
+    theme_indptr: np.ndarray   # CSR over themes: members of theme t are theme_members[indptr[t]:indptr[t+1]]
+    theme_members: np.ndarray  # symbol ids, in theme map row order
+    symbol_indptr: np.ndarray  # CSR over symbols (the transpose)
+    symbol_themes: np.ndarray  # theme ids, in theme map row order
+
+
+def build_theme_index(theme_map: pd.DataFrame) -> ThemeIndex:
+    """
+    Index a Symbol / Theme frame (build_theme_map or build_theme_map_codex).
+    A repeated (theme, symbol) pair keeps its first row.
+    """
+    theme_codes, themes = pd.factorize(theme_map["Theme"])
+    symbol_codes, symbols = pd.factorize(theme_map["Symbol"])
+
+    valid = np.flatnonzero((theme_codes >= 0) & (symbol_codes >= 0))
+    pair = theme_codes[valid].astype(np.int64) * max(len(symbols), 1) + symbol_codes[valid]
+    _, first = np.unique(pair, return_index=True)
+    keep = valid[np.sort(first)]
+
+    t, s = theme_codes[keep], symbol_codes[keep]
+    by_theme = np.argsort(t, kind="stable")
+    by_symbol = np.argsort(s, kind="stable")
+
+    return ThemeIndex(
+        themes=np.asarray(themes, dtype=object),
+        symbols=np.asarray(symbols, dtype=object),
+        theme_id={name: i for i, name in enumerate(themes)},
+        symbol_id={sym: i for i, sym in enumerate(symbols)},
+        theme_indptr=np.concatenate([[0], np.cumsum(np.bincount(t, minlength=len(themes)))]).astype(np.int32),
+        theme_members=s[by_theme].astype(np.int32),
+        symbol_indptr=np.concatenate([[0], np.cumsum(np.bincount(s, minlength=len(symbols)))]).astype(np.int32),
+        symbol_themes=t[by_symbol].astype(np.int32),
+    )
+
+
+def symbols_of_theme(index: ThemeIndex, theme) -> np.ndarray:
+    """Member symbols of a theme, in theme map order (empty for an unknown theme)"""
+    t = index.theme_id.get(theme)
+    if t is None:
+        return index.symbols[:0]
+    return index.symbols[index.theme_members[index.theme_indptr[t]:index.theme_indptr[t + 1]]]
+
+
+def themes_with_symbols(index: ThemeIndex, symbols) -> list:
+    """Sorted themes having at least one of the given symbols (e.g. the portfolio)"""
+    hit = np.zeros(len(index.themes), dtype=bool)
+    for symbol in symbols:
+        s = index.symbol_id.get(symbol)
+        if s is not None:
+            hit[index.symbol_themes[index.symbol_indptr[s]:index.symbol_indptr[s + 1]]] = True
+    return sorted(index.themes[hit])
+